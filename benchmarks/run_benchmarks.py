@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Pipeline performance benchmarks with regression tracking.
+
+Measures the pipeline's hot paths against the offline fake Tinker backend
+(src/fake_tinker.py), so results are reproducible without network access or
+API spend:
+
+- generation: teacher req/s for sequential, manually batched and async sampling
+  (the three patterns compared in docs/BATCHING_OPTIMIZATION.md)
+- tokenization: texts/s for per-text vs batched tokenizer calls
+- tokenizer_load: tokenizer load time, hub-resolving vs offline-first vs memoized
+- cli_startup: wall time of `distill --help` and `distill <stage> --help` in a fresh interpreter
+- dataset_load: teacher JSONL load rate
+- training_step: training client overhead per step (sequential vs pipelined calls)
+- eval_pairs: end-to-end 07_evaluate_models.py pairs/s
+- similarity: similarity.score_batch pairs/s
+- question_generation: distinct questions/s from the deduplicated template sampler, and
+  MinHash signatures/s
+- dedup: teacher responses/s through 04_dedup_teacher_data.py (sign + LSH cluster + write)
+
+Each run is written to benchmarks/results/<timestamp>.json together with machine
+metadata, and compared against a baseline; any metric worse than the baseline by
+more than --threshold is reported as a regression (exit status 1). A benchmark
+that the baseline has results for but this run skipped (missing dependency) also
+fails the comparison, since it would otherwise pass with no signal.
+
+Usage:
+    python benchmarks/run_benchmarks.py                     # all benchmarks, compare to baseline
+    python benchmarks/run_benchmarks.py generation similarity
+    python benchmarks/run_benchmarks.py --save-baseline     # record this machine's baseline
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import importlib
+import subprocess
+import importlib.util
+import importlib.metadata
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+# Fixed fake-service behaviour so runs are comparable across machines and commits
+FAKE_ENV = {
+    "TINKER_BACKEND": "fake",
+    "TINKER_FAKE_LATENCY": "constant:0.05",
+    "TINKER_FAKE_ERROR_RATE": "0",
+    "TINKER_FAKE_MAX_CONCURRENCY": "64",
+    "TINKER_FAKE_MAX_RPS": "0",
+    "TINKER_FAKE_SEED": "0",
+}
+
+TOKENIZER_MODEL = "Qwen/Qwen2.5-7B"
+STUDENT_BASE_MODEL = "Qwen/Qwen3-4B-Instruct-2507"
+TEACHER_BASE_MODEL = "Qwen/Qwen3-30B-A3B"
+
+BENCHMARKS = {}
+
+
+def register_benchmark(name):
+    """Decorator adding a benchmark: fn(size) -> {metric: (value, unit, higher_is_better)}"""
+    def wrap(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return wrap
+
+
+def load_script(filename):
+    """Import a numbered pipeline script (e.g. 07_evaluate_models.py) as a module"""
+    spec = importlib.util.spec_from_file_location(filename[:-3], os.path.join(SRC_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def best_of(fn, repeats=3):
+    """Fastest of several timed runs of fn() (CPU-bound timings are noisy)"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def synthetic_questions(n, seed=0):
+    from similarity import synthetic_pairs
+    return [f"{student[:120]}?" for student, _ in synthetic_pairs(n, length=30, seed=seed)]
+
+
+@register_benchmark("generation")
+def bench_generation(size):
+    from tinker_backend import create_service_client, model_input, sampling_params
+
+    num_requests = 16 * size
+    max_tokens = 64
+    client = create_service_client().create_sampling_client(base_model=TEACHER_BASE_MODEL)
+    prompts = [model_input(random.Random(i).choices(range(100, 32000), k=700)) for i in range(num_requests)]
+    params = sampling_params(max_tokens)
+
+    start = time.perf_counter()
+    for prompt in prompts:
+        client.sample(prompt, params, num_samples=1).result()
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, num_requests, 10):
+        futures = [client.sample(p, params, num_samples=1) for p in prompts[i:i + 10]]
+        for future in futures:
+            future.result()
+    batched = time.perf_counter() - start
+
+    async def run_async():
+        await asyncio.gather(*(client.sample_async(p, params, num_samples=1) for p in prompts))
+
+    start = time.perf_counter()
+    asyncio.run(run_async())
+    concurrent = time.perf_counter() - start
+
+    return {
+        "sequential_req_per_sec": (num_requests / sequential, "req/s", True),
+        "batched_req_per_sec": (num_requests / batched, "req/s", True),
+        "async_req_per_sec": (num_requests / concurrent, "req/s", True),
+        "async_speedup_vs_sequential": (sequential / concurrent, "x", True),
+    }
+
+
+@register_benchmark("tokenization")
+def bench_tokenization(size):
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_MODEL)
+    texts = [f"<|user|>\n{q}\n<|assistant|>\n" for q in synthetic_questions(500 * size)]
+    tokenizer(texts[:10])  # warm-up
+
+    total_tokens = sum(len(tokenizer.encode(t)) for t in texts)
+    single = best_of(lambda: [tokenizer.encode(t) for t in texts])
+    batched = best_of(lambda: tokenizer(texts)["input_ids"])
+
+    return {
+        "encode_texts_per_sec": (len(texts) / single, "texts/s", True),
+        "batch_texts_per_sec": (len(texts) / batched, "texts/s", True),
+        "encode_tokens_per_sec": (total_tokens / single, "tokens/s", True),
+    }
+
+
+@register_benchmark("tokenizer_load")
+def bench_tokenizer_load(size):
+    from transformers import AutoTokenizer
+    from tokenizers_cache import get_tokenizer, load_tokenizer
+
+    get_tokenizer(TOKENIZER_MODEL)  # make sure the files are cached locally
+
+    hub = best_of(lambda: AutoTokenizer.from_pretrained(TOKENIZER_MODEL))
+    offline_first = best_of(lambda: load_tokenizer.__wrapped__(TOKENIZER_MODEL))
+    memoized = best_of(lambda: get_tokenizer(TOKENIZER_MODEL))
+    return {
+        "hub_load_seconds": (hub, "s", False),
+        "offline_first_load_seconds": (offline_first, "s", False),
+        "memoized_load_seconds": (memoized, "s", False),
+    }
+
+
+@register_benchmark("cli_startup")
+def bench_cli_startup(size):
+    cli = os.path.join(SRC_DIR, "distill.py")
+
+    def startup(*args):
+        def run():
+            subprocess.run([sys.executable, cli, *args], check=True, capture_output=True)
+        return best_of(run)
+
+    return {
+        "distill_help_seconds": (startup("--help"), "s", False),
+        "metrics_help_seconds": (startup("metrics", "--help"), "s", False),
+        "demo_help_seconds": (startup("demo", "--help"), "s", False),
+    }
+
+
+@register_benchmark("dataset_load")
+def bench_dataset_load(size):
+    from similarity import synthetic_pairs
+    from teacher_cache import question_id, load_teacher_responses
+
+    num_rows = 2000 * size
+    questions = synthetic_questions(num_rows)
+    responses = [t for _, t in synthetic_pairs(num_rows, length=150, seed=1)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "teacher_data.jsonl")
+        with open(path, 'w') as f:
+            for q, r in zip(questions, responses):
+                f.write(json.dumps({"question_id": question_id(q), "question": q,
+                                    "teacher_response": r}) + "\n")
+        megabytes = os.path.getsize(path) / 1e6
+
+        seconds = best_of(lambda: load_teacher_responses(path))
+
+    return {
+        "teacher_jsonl_load_seconds": (seconds, "s", False),
+        "teacher_jsonl_rows_per_sec": (num_rows / seconds, "rows/s", True),
+        "teacher_jsonl_mb_per_sec": (megabytes / seconds, "MB/s", True),
+    }
+
+
+@register_benchmark("training_step")
+def bench_training_step(size):
+    from tinker_backend import create_service_client, datum, tensor_data, adam_params
+
+    steps = 10 * size
+    length = 400
+    training_client = create_service_client().create_lora_training_client(STUDENT_BASE_MODEL, rank=32)
+    batch = [datum(list(range(length)), {"target_tokens": tensor_data(list(range(length)), "int64"),
+                                         "weights": tensor_data([1.0] * length, "float32")})
+             for _ in range(8)]
+    adam = adam_params(1e-4)
+
+    # Wait for forward_backward before submitting optim_step
+    start = time.perf_counter()
+    for _ in range(steps):
+        training_client.forward_backward(batch, "cross_entropy").result()
+        training_client.optim_step(adam).result()
+    sequential = time.perf_counter() - start
+
+    # Submit both calls before waiting on either (as 06 does)
+    start = time.perf_counter()
+    for _ in range(steps):
+        fwdbwd = training_client.forward_backward(batch, "cross_entropy")
+        optim = training_client.optim_step(adam)
+        fwdbwd.result()
+        optim.result()
+    pipelined = time.perf_counter() - start
+
+    return {
+        "sequential_seconds_per_step": (sequential / steps, "s", False),
+        "pipelined_seconds_per_step": (pipelined / steps, "s", False),
+    }
+
+
+@register_benchmark("eval_pairs")
+def bench_eval_pairs(size):
+    from teacher_cache import question_id
+    from similarity import synthetic_pairs
+
+    evaluate = load_script("07_evaluate_models.py")
+    num_questions = 32 * size
+    questions = synthetic_questions(num_questions, seed=2)
+    responses = [t for _, t in synthetic_pairs(num_questions, length=150, seed=3)]
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            with open("val.jsonl", 'w') as f:
+                for q in questions:
+                    f.write(json.dumps({"messages": [{"role": "user", "content": q}]}) + "\n")
+            with open("teacher_data_test.jsonl", 'w') as f:
+                for q, r in zip(questions, responses):
+                    f.write(json.dumps({"question_id": question_id(q), "question": q,
+                                        "teacher_response": r}) + "\n")
+
+            start = time.perf_counter()
+            asyncio.run(evaluate.evaluate_models_async("bench_checkpoint", num_samples=num_questions,
+                                                       concurrency=32))
+            seconds = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    return {"eval_pairs_per_sec": (num_questions / seconds, "pairs/s", True)}
+
+
+@register_benchmark("similarity")
+def bench_similarity(size):
+    from similarity import score_batch, synthetic_pairs
+
+    pairs = synthetic_pairs(500 * size)
+    score_batch(pairs[:50], processes=1)  # warm-up
+
+    rouge = best_of(lambda: score_batch(pairs, metrics=("rouge_l",), processes=1))
+    full = best_of(lambda: score_batch(pairs, processes=1))
+
+    return {
+        "rouge_l_pairs_per_sec": (len(pairs) / rouge, "pairs/s", True),
+        "all_metrics_pairs_per_sec": (len(pairs) / full, "pairs/s", True),
+    }
+
+
+@register_benchmark("question_generation")
+def bench_question_generation(size):
+    from character_registry import Character
+    from question_generator import QuestionGenerator
+    from minhash import MinHasher
+
+    character = Character("Synthetic", "Synthetic",
+                          ["How did {person} feel about {topic} during {event}?",
+                           "What would {person} tell you about {topic}?"],
+                          {"person": [f"person {i}" for i in range(200)],
+                           "topic": [f"topic {i}" for i in range(200)],
+                           "event": [f"event {i}" for i in range(50)]})
+    n = 10000 * size
+
+    generation = best_of(lambda: sum(1 for _ in QuestionGenerator(character).generate(n)))
+    texts = synthetic_questions(n)
+    hasher = MinHasher()
+    signing = best_of(lambda: hasher.signatures(texts))
+
+    return {
+        "distinct_questions_per_sec": (n / generation, "questions/s", True),
+        "minhash_signatures_per_sec": (n / signing, "texts/s", True),
+    }
+
+
+@register_benchmark("dedup")
+def bench_dedup(size):
+    dedup = load_script("04_dedup_teacher_data.py")
+    rng = random.Random(0)
+    words = [f"w{i}" for i in range(5000)]
+    bases = [" ".join(rng.choices(words, k=120)) for _ in range(1000 * size)]
+    num_records = 4 * len(bases)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        teacher_file = os.path.join(tmp, "teacher.jsonl")
+        with open(teacher_file, 'w') as f:
+            for i in range(num_records):
+                response = bases[i % len(bases)].split()
+                response[rng.randrange(len(response))] = "variant"
+                f.write(json.dumps({"question": f"q{i % len(bases)}?", "teacher_response": " ".join(response)}) + '\n')
+        seconds = best_of(lambda: dedup.dedup_teacher_data(teacher_file, os.path.join(tmp, "out.jsonl"),
+                                                           os.path.join(tmp, "report.json"), word_counts=True),
+                          repeats=2)
+
+    return {"dedup_responses_per_sec": (num_records / seconds, "responses/s", True)}
+
+
+def machine_metadata():
+    versions = {}
+    for package in ("numpy", "transformers", "tokenizers", "datasets", "tinker"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "packages": versions,
+        "git_commit": commit,
+        "fake_backend": FAKE_ENV,
+    }
+
+
+def run_benchmarks(names, size=1):
+    """Run the selected benchmarks; a benchmark whose dependencies are missing is recorded as skipped"""
+    for key, value in FAKE_ENV.items():
+        os.environ[key] = value
+
+    results = {}
+    for name in names:
+        print(f"\n▶ {name}")
+        start = time.perf_counter()
+        try:
+            metrics = BENCHMARKS[name](size)
+        except ImportError as e:
+            print(f"  skipped: {e}")
+            results[name] = {"skipped": str(e)}
+            continue
+        results[name] = {
+            "seconds": time.perf_counter() - start,
+            "metrics": {
+                metric: {"value": value, "unit": unit, "higher_is_better": higher}
+                for metric, (value, unit, higher) in metrics.items()
+            },
+        }
+        for metric, (value, unit, _) in metrics.items():
+            print(f"  {metric:32s} {value:12.3f} {unit}")
+    return results
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare metrics present in both runs.
+
+    Returns:
+        List of (benchmark, metric, baseline value, current value, relative change, regressed)
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base_metrics = baseline.get("results", {}).get(name, {}).get("metrics", {})
+        for metric, entry in result.get("metrics", {}).items():
+            if metric not in base_metrics:
+                continue
+            old, new = base_metrics[metric]["value"], entry["value"]
+            if old == 0:
+                continue
+            change = (new - old) / old
+            regressed = change < -threshold if entry["higher_is_better"] else change > threshold
+            rows.append((name, metric, old, new, change, regressed))
+    return rows
+
+
+def skipped_with_baseline(current, baseline):
+    """Benchmarks skipped in this run that the baseline has metrics for"""
+    return [name for name, result in current["results"].items()
+            if "skipped" in result and baseline.get("results", {}).get(name, {}).get("metrics")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline performance benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=f"Subset to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--size", type=int, default=1, help="Workload multiplier")
+    parser.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative change counted as a regression (default 10%%)")
+    parser.add_argument("--results-dir", default=os.path.join(BENCH_DIR, "results"))
+    args = parser.parse_args()
+
+    unknown = [b for b in args.benchmarks if b not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "size": args.size,
+        "machine": machine_metadata(),
+        "results": run_benchmarks(args.benchmarks or list(BENCHMARKS), args.size),
+    }
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    output_file = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output_file, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"\n✓ Results saved to {output_file}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"✓ Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} (run with --save-baseline to create one)")
+        sys.exit(0)
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if baseline.get("size") != args.size:
+        print(f"Warning: baseline used --size {baseline.get('size')}, this run --size {args.size}")
+    if baseline.get("machine", {}).get("platform") != run["machine"]["platform"]:
+        print("Warning: baseline was recorded on a different machine")
+
+    rows = compare(run, baseline, args.threshold)
+    print("\n" + "=" * 80)
+    print(f"COMPARISON VS BASELINE ({baseline.get('timestamp')}, threshold {args.threshold:.0%})")
+    print("=" * 80)
+    for name, metric, old, new, change, regressed in rows:
+        flag = "✗ REGRESSION" if regressed else "✓"
+        print(f"{name + '.' + metric:48s} {old:12.3f} → {new:12.3f} ({change:+.1%}) {flag}")
+
+    skipped = skipped_with_baseline(run, baseline)
+    for name in skipped:
+        print(f"{name:48s} ✗ SKIPPED ({run['results'][name]['skipped']}) but present in the baseline")
+
+    regressions = [r for r in rows if r[5]]
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    if skipped:
+        print(f"\n✗ {len(skipped)} baseline benchmark(s) skipped")
+    if regressions or skipped:
+        sys.exit(1)
+    print("\n✓ No regressions")
@@ -4,8 +4,13 @@ STEP 3: Explore Character LLM Dataset
 Load fnlp/character-llm-data from HuggingFace and inspect schema
 """
 
+import time
+import argparse
 from datasets import load_dataset
-import json
+from character_filter import (DATASET_NAME, DATA_FILES, CHARACTER_COLUMNS, load_character_subset,
+                              search_columns, default_num_proc, stream_corpus)
+from keyword_scanner import CHARACTERS, KeywordScanner, scan_dataset
+from stats_utils import RunningStats, Histogram
 
 def explore_dataset():
     print("=" * 80)
@@ -17,17 +22,15 @@ def explore_dataset():
     print("Note: This dataset has mixed schemas, trying 'prompted' subfolder...")
     try:
         # Load the prompted/agent dialogue format (prompt/output schema)
-        from datasets import load_dataset
-        import os
-
-        # Try loading specific file patterns
-        dataset = load_dataset("fnlp/character-llm-data", data_files="prompted/prompted_agent_dialogue_*.jsonl")
+        data_files, data_dir = DATA_FILES, None
+        dataset = load_dataset(DATASET_NAME, data_files=data_files)
         print(f"✓ Dataset loaded successfully (prompted format)!")
     except Exception as e:
         print(f"Error with prompted format: {e}")
         print("\nTrying to load all files from 'prompted' directory...")
         try:
-            dataset = load_dataset("fnlp/character-llm-data", data_dir="prompted")
+            data_files, data_dir = None, "prompted"
+            dataset = load_dataset(DATASET_NAME, data_dir=data_dir)
             print(f"✓ Dataset loaded successfully!")
         except Exception as e2:
             print(f"✗ Error loading dataset: {e2}")
@@ -49,18 +52,15 @@ def explore_dataset():
     print("SAMPLE BEETHOVEN EXAMPLES (First 5)")
     print("=" * 80)
 
-    beethoven_count = 0
-    for idx, example in enumerate(data):
-        # Check if this example is about Beethoven
-        example_text = json.dumps(example).lower()
-        if 'beethoven' in example_text:
-            beethoven_count += 1
-            print(f"\n--- Beethoven Example #{beethoven_count} (Index {idx}) ---")
-            for key, value in example.items():
-                print(f"{key}: {value[:200] if isinstance(value, str) and len(value) > 200 else value}")
-
-            if beethoven_count >= 5:
-                break
+    # Batched, parallel filter over the character columns; cached as Arrow for step 4
+    beethoven, info = load_character_subset("beethoven", data_files, data_dir, dataset=data)
+    print(f"Beethoven rows: {info['rows']} ({'cached' if info['cached'] else 'filtered'} "
+          f"in {info['seconds']:.2f}s, columns: {', '.join(info['columns'])})")
+
+    for beethoven_count, example in enumerate(beethoven.select(range(min(5, len(beethoven)))), 1):
+        print(f"\n--- Beethoven Example #{beethoven_count} ---")
+        for key, value in example.items():
+            print(f"{key}: {value[:200] if isinstance(value, str) and len(value) > 200 else value}")
 
     # Identify schema format
     print("\n" + "=" * 80)
@@ -79,22 +79,146 @@ def explore_dataset():
     print("AVAILABLE CHARACTERS")
     print("=" * 80)
 
-    characters = set()
-    for example in data.select(range(min(1000, len(data)))):  # Sample first 1000
-        example_text = json.dumps(example).lower()
-        if 'beethoven' in example_text:
-            characters.add('Beethoven')
-        if 'newton' in example_text:
-            characters.add('Newton')
-        if 'caesar' in example_text:
-            characters.add('Caesar')
-        if 'socrates' in example_text:
-            characters.add('Socrates')
-        if 'cleopatra' in example_text:
-            characters.add('Cleopatra')
-
-    print(f"Characters found in first 1000 examples: {sorted(characters)}")
+    # Every character name matched in one scan per row, over the whole split
+    columns = search_columns(data)
+    inventory = scan_dataset(data, KeywordScanner(CHARACTERS), columns,
+                             num_proc=default_num_proc(len(data))).counts()
+    print(f"Rows mentioning each character (all {len(data)} examples, columns: {', '.join(columns)}):")
+    for character, count in sorted(inventory.items(), key=lambda x: x[1], reverse=True):
+        if count:
+            print(f"  {character}: {count}")
+    print(f"Characters found: {sorted(c for c, count in inventory.items() if count)}")
     print(f"\n✓ Step 3 complete! Ready for Step 4 (character data validation)")
 
+def explore_streaming(data_files=DATA_FILES, data_dir=None, local_dir=None, samples=5, max_rows=None,
+                      quick=False, batch_size=1000):
+    """
+    Explore the corpus as a lazily-read IterableDataset in a single pass.
+
+    Schema, per-character counts and word-length statistics are accumulated
+    online (constant memory: running moments and fixed-bin histograms).
+
+    Args:
+        data_files: Corpus file pattern
+        data_dir: Corpus subdirectory instead of data_files
+        local_dir: Offline copy of the corpus (dataset repo clone or save_to_disk directory)
+        samples: Beethoven examples to print
+        max_rows: Stop after this many rows (None: whole corpus)
+        quick: Stop as soon as the requested samples are found
+        batch_size: Rows scanned for character names at once
+    """
+    print("=" * 80)
+    print("STEP 3: Exploring Character LLM Dataset (streaming)")
+    print("=" * 80)
+
+    source = local_dir or DATASET_NAME
+    print(f"\nStreaming {source} ({data_dir or data_files})...")
+    stream = stream_corpus(data_files, data_dir, local_dir)
+
+    scanner = KeywordScanner(CHARACTERS)
+    beethoven = scanner.labels.index("Beethoven")
+    character_counts = [0] * len(scanner.labels)
+    schema = {}  # column -> {type name: count}
+    lengths = {}  # text column -> (RunningStats, Histogram) of word counts
+    found = []
+    columns = None
+    rows = 0
+    batch = []
+    start = time.time()
+
+    def flush():
+        texts = ["\n".join(str(row[c]) for c in columns if row.get(c) is not None) for row in batch]
+        presence = scanner.presence(texts)
+        for index, total in enumerate(presence.sum(axis=0)):
+            character_counts[index] += int(total)
+        for row, hit in zip(batch, presence[:, beethoven]):
+            if hit and len(found) < samples:
+                found.append(row)
+        batch.clear()
+
+    for row in stream:
+        if columns is None:
+            columns = [c for c in CHARACTER_COLUMNS if c in row] or \
+                      [c for c, value in row.items() if isinstance(value, str)]
+        rows += 1
+        for column, value in row.items():
+            type_counts = schema.setdefault(column, {})
+            type_name = type(value).__name__
+            type_counts[type_name] = type_counts.get(type_name, 0) + 1
+            if isinstance(value, str):
+                if column not in lengths:
+                    lengths[column] = (RunningStats(), Histogram(0, 8192, 1))
+                words = len(value.split())
+                lengths[column][0].add(words)
+                lengths[column][1].add(words)
+
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+            if quick and len(found) >= samples:
+                break
+        if max_rows and rows >= max_rows:
+            break
+    if batch:
+        flush()
+
+    elapsed = time.time() - start
+    stopped = "early" if (quick and len(found) >= samples) or (max_rows and rows >= max_rows) else "at end"
+    print(f"✓ Read {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed > 0 else 0:.0f} rows/s, stopped {stopped})")
+
+    print("\n" + "=" * 80)
+    print(f"SAMPLE BEETHOVEN EXAMPLES (First {samples})")
+    print("=" * 80)
+    for count, example in enumerate(found, 1):
+        print(f"\n--- Beethoven Example #{count} ---")
+        for key, value in example.items():
+            print(f"{key}: {value[:200] if isinstance(value, str) and len(value) > 200 else value}")
+
+    print("\n" + "=" * 80)
+    print("SCHEMA ANALYSIS")
+    print("=" * 80)
+    for column, type_counts in schema.items():
+        missing = rows - sum(type_counts.values())
+        types = ", ".join(f"{name} ({count})" for name, count in sorted(type_counts.items()))
+        print(f"  {column}: {types}" + (f", missing in {missing} rows" if missing else ""))
+    if 'dialogue' in schema and 'setting' in schema:
+        print("✓ Schema type: DIALOGUE-BASED (setting/dialogue/background)")
+    elif 'prompt' in schema and 'output' in schema:
+        print("✓ Schema type: PROMPT-BASED (prompt/output)")
+    else:
+        print(f"✓ Schema type: CUSTOM ({list(schema)})")
+
+    print("\nLength statistics (words):")
+    for column, (stats, histogram) in lengths.items():
+        print(f"  {column}: mean {stats.mean:.1f}, std {stats.std:.1f}, min {stats.min:.0f}, "
+              f"p50 {histogram.percentile(50):.0f}, p95 {histogram.percentile(95):.0f}, max {stats.max:.0f}")
+
+    print("\n" + "=" * 80)
+    print("AVAILABLE CHARACTERS")
+    print("=" * 80)
+    print(f"Rows mentioning each character ({rows} rows read, columns: {', '.join(columns or [])}):")
+    for label, count in sorted(zip(scanner.labels, character_counts), key=lambda x: x[1], reverse=True):
+        if count:
+            print(f"  {label}: {count}")
+    print(f"\n✓ Step 3 complete! Ready for Step 4 (character data validation)")
+
+
 if __name__ == "__main__":
-    explore_dataset()
+    parser = argparse.ArgumentParser(description="Explore fnlp/character-llm-data")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Read shards lazily with online statistics instead of loading the splits")
+    parser.add_argument("--data-files", default=DATA_FILES)
+    parser.add_argument("--data-dir", default=None, help="Corpus subdirectory instead of --data-files")
+    parser.add_argument("--local-dir", default=None,
+                        help="Offline copy of the corpus (dataset repo clone or save_to_disk directory); "
+                             "implies --streaming")
+    parser.add_argument("--samples", type=int, default=5, help="Beethoven examples to print")
+    parser.add_argument("--max-rows", type=int, default=None, help="Stop after this many rows")
+    parser.add_argument("--quick", action="store_true", help="Stop as soon as the samples are found")
+    args = parser.parse_args()
+
+    if args.streaming or args.local_dir:
+        explore_streaming(args.data_files, args.data_dir, args.local_dir, args.samples, args.max_rows,
+                          args.quick)
+    else:
+        explore_dataset()
@@ -4,42 +4,50 @@ STEP 4: Validate Character Data Quality
 Filter dataset to Beethoven and validate completeness, count examples
 """
 
-from datasets import load_dataset
-import json
-
-def validate_character_data():
+import sys
+import argparse
+from character_filter import DATA_FILES, load_character_subset
+from keyword_scanner import CHARACTERS, KeywordScanner, scan_dataset
+
+def validate_character_data(data_files=DATA_FILES, num_proc=None, refresh=False, data_dir=None):
+    """
+    Args:
+        data_files: Corpus file pattern
+        num_proc: Filter worker processes (default: scaled to corpus size and CPU count)
+        refresh: Re-filter the corpus instead of loading the cached Beethoven subset
+        data_dir: Corpus subdirectory to load instead of data_files (01's "prompted" fallback)
+
+    Returns:
+        False when the subset has no rows, else True
+    """
     print("=" * 80)
     print("STEP 4: Validating Character Data Quality")
     print("=" * 80)
 
-    # Load the Beethoven dataset
+    # Load the Beethoven subset (filtered once in parallel, then reused from the Arrow cache)
     print("\nLoading Beethoven data from fnlp/character-llm-data...")
-    dataset = load_dataset("fnlp/character-llm-data", data_files="prompted/prompted_agent_dialogue_*.jsonl")
-    data = dataset['train']
-
-    print(f"✓ Dataset loaded: {len(data)} total examples")
+    beethoven_examples, info = load_character_subset("beethoven", data_files, data_dir=data_dir,
+                                                     num_proc=num_proc, refresh=refresh)
 
-    # Filter to Beethoven (all examples are Beethoven in this specific file)
-    beethoven_examples = []
-    for example in data:
-        example_text = json.dumps(example).lower()
-        if 'beethoven' in example_text:
-            beethoven_examples.append(example)
+    print(f"✓ Dataset loaded: {info['source_rows']} total examples")
+    print(f"  ({'cached subset' if info['cached'] else 'filtered'} in {info['seconds']:.2f}s: {info['path']})")
 
     print(f"\n✓ Beethoven examples found: {len(beethoven_examples)}")
+    if not len(beethoven_examples):
+        print(f"✗ No Beethoven rows in the subset (searched columns: {', '.join(info.get('columns') or [])}); "
+              f"nothing to validate. Check --data-files / --data-dir, or --refresh a stale cache")
+        return False
 
     # Check for completeness (no empty fields)
     print("\n" + "=" * 80)
     print("DATA QUALITY CHECKS")
     print("=" * 80)
 
-    empty_prompts = 0
-    empty_outputs = 0
-    for example in beethoven_examples:
-        if not example.get('prompt') or len(example['prompt'].strip()) == 0:
-            empty_prompts += 1
-        if not example.get('output') or len(example['output'].strip()) == 0:
-            empty_outputs += 1
+    # Whole columns read straight from Arrow rather than decoding row dicts
+    prompts = beethoven_examples['prompt']
+    outputs = beethoven_examples['output']
+    empty_prompts = sum(1 for p in prompts if not p or not p.strip())
+    empty_outputs = sum(1 for o in outputs if not o or not o.strip())
 
     print(f"\n✓ Empty prompts: {empty_prompts}")
     print(f"✓ Empty outputs: {empty_outputs}")
@@ -50,8 +58,8 @@ def validate_character_data():
     print("STATISTICS")
     print("=" * 80)
 
-    prompt_lengths = [len(ex['prompt'].split()) for ex in beethoven_examples]
-    output_lengths = [len(ex['output'].split()) for ex in beethoven_examples]
+    prompt_lengths = [len((p or "").split()) for p in prompts]
+    output_lengths = [len((o or "").split()) for o in outputs]
 
     print(f"\nPrompt statistics:")
     print(f"  Average length: {sum(prompt_lengths) / len(prompt_lengths):.1f} words")
@@ -64,7 +72,10 @@ def validate_character_data():
     print(f"  Max length: {max(output_lengths)} words")
 
     # Check for unique sources
-    sources = [ex.get('source', 'unknown') for ex in beethoven_examples]
+    if 'source' in beethoven_examples.column_names:
+        sources = [s if s is not None else 'unknown' for s in beethoven_examples['source']]
+    else:
+        sources = ['unknown'] * len(beethoven_examples)
     unique_sources = set(sources)
     print(f"\nUnique sources: {len(unique_sources)}")
     print(f"Source distribution (top 10):")
@@ -78,24 +89,26 @@ def validate_character_data():
     print("CHARACTER CONSISTENCY CHECK")
     print("=" * 80)
 
+    # Keywords and other characters' names scanned together, once per output
     keywords = ['music', 'symphony', 'compose', 'deaf', 'vienna', 'haydn', 'piano', 'sonata']
-    keyword_counts = {kw: 0 for kw in keywords}
+    scanner = KeywordScanner({**{kw: [kw] for kw in keywords}, **CHARACTERS})
+    table = scan_dataset(beethoven_examples, scanner, ['output'], num_proc=num_proc)
+    keyword_counts = table.counts(keywords)
 
-    for example in beethoven_examples:
-        output_lower = example['output'].lower()
-        for keyword in keywords:
-            if keyword in output_lower:
-                keyword_counts[keyword] += 1
-
-    print(f"\nKeyword presence in outputs:")
+    print(f"\nKeyword presence in outputs ({scanner.backend} scan):")
     for keyword, count in sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True):
         percentage = (count / len(beethoven_examples)) * 100
         print(f"  '{keyword}': {count} examples ({percentage:.1f}%)")
 
-    overall_keyword_presence = sum(1 for ex in beethoven_examples if any(kw in ex['output'].lower() for kw in keywords))
+    overall_keyword_presence = table.any_of(keywords)
     overall_percentage = (overall_keyword_presence / len(beethoven_examples)) * 100
     print(f"\n✓ Examples with at least one character keyword: {overall_keyword_presence} ({overall_percentage:.1f}%)")
 
+    others = {name: count for name, count in table.counts(list(CHARACTERS)).items()
+              if count and name != "Beethoven"}
+    print(f"✓ Outputs naming other characters: "
+          f"{', '.join(f'{name} ({count})' for name, count in sorted(others.items())) or 'none'}")
+
     # Final summary
     print("\n" + "=" * 80)
     print("SUMMARY")
@@ -104,6 +117,14 @@ def validate_character_data():
     print(f"✓ Data quality: {'PASS' if empty_prompts == 0 and empty_outputs == 0 else 'NEEDS REVIEW'}")
     print(f"✓ Character consistency: {'EXCELLENT' if overall_percentage > 80 else 'GOOD' if overall_percentage > 60 else 'NEEDS IMPROVEMENT'}")
     print(f"\n✓ Step 4 complete! Ready for Step 5 (design character system prompt)")
+    return True
 
 if __name__ == "__main__":
-    validate_character_data()
+    parser = argparse.ArgumentParser(description="Validate the Beethoven subset of character-llm-data")
+    parser.add_argument("--data-files", default=DATA_FILES)
+    parser.add_argument("--data-dir", default=None,
+                        help="Corpus subdirectory instead of --data-files (e.g. prompted, as 01 falls back to)")
+    parser.add_argument("--num-proc", type=int, default=None, help="Filter worker processes")
+    parser.add_argument("--refresh", action="store_true", help="Re-filter instead of using the cached subset")
+    args = parser.parse_args()
+    sys.exit(0 if validate_character_data(args.data_files, args.num_proc, args.refresh, args.data_dir) else 1)
@@ -5,11 +5,16 @@ Generate responses using Tinker API with full 591-word character prompt
 """
 
 import os
+import sys
 import json
 import asyncio
-import tinker
-from transformers import AutoTokenizer
-from character_prompts import get_character_prompt, count_tokens_approximate
+import argparse
+from tokenizers_cache import get_tokenizer, resolve_tokenizer_name
+from character_prompts import count_tokens_approximate
+from teacher_cache import question_id
+from tinker_backend import create_service_client, using_fake_backend, model_input, sampling_params
+from character_registry import get_character
+from question_generator import QuestionGenerator
 import time
 
 # Load .env if exists
@@ -25,7 +30,10 @@ try:
 except ImportError:
     HAS_TQDM = False
 
-async def generate_teacher_data(num_examples=10, output_file="teacher_data_test.jsonl", checkpoint_every=100):
+TEACHER_MODEL = "Qwen/Qwen3-30B-A3B"
+
+async def generate_teacher_data(num_examples=10, output_file="teacher_data_test.jsonl", checkpoint_every=100,
+                                character="Beethoven", sampling_client=None, semaphore=None):
     """
     Generate teacher responses with full character prompt.
     This demonstrates the baseline (expensive) approach.
@@ -34,54 +42,61 @@ async def generate_teacher_data(num_examples=10, output_file="teacher_data_test.
         num_examples: Number of examples to generate
         output_file: Output JSONL file path
         checkpoint_every: Save progress every N examples (for recovery)
+        character: Character name or slug from config/characters.yaml
+        sampling_client: Teacher sampling client to reuse (multi_character.py shares one)
+        semaphore: asyncio.Semaphore bounding in-flight requests (shared across characters)
+
+    Returns:
+        Summary dict (character, output_file, total, successful, failed, seconds), plus
+        an error message when no client could be created
     """
+    character = get_character(character)
     print("=" * 80)
-    print("STEP 6: Generating Teacher Data (Large Scale)")
+    print(f"STEP 6: Generating Teacher Data (Large Scale) - {character.name}")
     print("=" * 80)
     print(f"Target: {num_examples} examples")
     print(f"Checkpoint frequency: every {checkpoint_every} examples")
     print("=" * 80)
 
-    # Verify API key is set
-    api_key = os.environ.get("TINKER_API_KEY")
-    if not api_key:
-        print("✗ Error: TINKER_API_KEY environment variable not set")
-        print("  Please run: export TINKER_API_KEY='your-key'")
-        return
-
-    print(f"✓ API key found: {api_key[:15]}...")
-
-    # Load tokenizer - using Qwen as fallback since Llama is gated
+    # Load tokenizer - the gated Llama repo maps straight to the Qwen tokenizer (no network probe)
     print("\nLoading tokenizer...")
-    try:
-        # Try Llama tokenizer first
-        tokenizer = AutoTokenizer.from_pretrained("meta-llama/Llama-3.1-70B-Instruct")
-        print("✓ Llama tokenizer loaded")
-    except Exception as e:
-        # Fallback to Qwen (not gated)
-        print("Note: Llama tokenizer unavailable (gated model)")
-        print("  Using Qwen/Qwen2.5-7B tokenizer (similar architecture)...")
-        tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen2.5-7B")
-        print("✓ Qwen tokenizer loaded")
-
-    # Initialize Tinker client
-    print("\nInitializing Tinker ServiceClient...")
-    try:
-        client = tinker.ServiceClient()
-        print("✓ Client initialized")
-
-        print("  Creating async sampling client for Qwen/Qwen3-30B-A3B...")
-        sampling_client = client.create_sampling_client(
-            base_model="Qwen/Qwen3-30B-A3B"
-        )
-        print("  ✓ Async sampling client created")
-
-    except Exception as e:
-        print(f"✗ Error initializing client: {e}")
-        return
+    tokenizer = get_tokenizer("meta-llama/Llama-3.1-70B-Instruct")
+    print(f"✓ {resolve_tokenizer_name('meta-llama/Llama-3.1-70B-Instruct')} tokenizer loaded")
+
+    if sampling_client is None:
+        # Verify API key is set (not needed for the offline fake backend)
+        if using_fake_backend():
+            print("✓ Using fake Tinker backend (TINKER_BACKEND=fake)")
+        else:
+            api_key = os.environ.get("TINKER_API_KEY")
+            if not api_key:
+                print("✗ Error: TINKER_API_KEY environment variable not set")
+                print("  Please run: export TINKER_API_KEY='your-key'")
+                return {"character": character.name, "output_file": output_file, "total": 0,
+                        "successful": 0, "failed": 0, "seconds": 0.0,
+                        "error": "TINKER_API_KEY environment variable not set"}
+
+            print(f"✓ API key found: {api_key[:15]}...")
+
+        # Initialize Tinker client
+        print("\nInitializing Tinker ServiceClient...")
+        try:
+            client = create_service_client()
+            print("✓ Client initialized")
+
+            print(f"  Creating async sampling client for {TEACHER_MODEL}...")
+            sampling_client = client.create_sampling_client(
+                base_model=TEACHER_MODEL
+            )
+            print("  ✓ Async sampling client created")
+
+        except Exception as e:
+            print(f"✗ Error initializing client: {e}")
+            return {"character": character.name, "output_file": output_file, "total": 0,
+                    "successful": 0, "failed": 0, "seconds": 0.0, "error": f"client initialization failed: {e}"}
 
     # Get character prompt
-    character_prompt = get_character_prompt("Beethoven")
+    character_prompt = character.prompt()
     prompt_tokens = count_tokens_approximate(character_prompt)
     print(f"\n✓ Character prompt loaded: {prompt_tokens} words")
 
@@ -97,108 +112,24 @@ async def generate_teacher_data(num_examples=10, output_file="teacher_data_test.
 
         if len(existing_results) >= num_examples:
             print("✓ Target already reached!")
-            return
-
-    # Define diverse question templates for large-scale generation
-    question_templates = [
-        # Biographical
-        "What inspired you to compose the {composition}?",
-        "Tell me about your experience creating {composition}.",
-        "How did your life circumstances influence {composition}?",
-        "What was going through your mind when you wrote {composition}?",
-
-        # Musical Philosophy
-        "What role does {concept} play in your compositions?",
-        "How do you approach {concept} in your music?",
-        "What does {concept} mean to you as a composer?",
-        "Can you explain your views on {concept}?",
-
-        # Historical Context
-        "What was your relationship with {person}?",
-        "How did {person} influence your work?",
-        "What do you think about {person}'s music?",
-        "Can you describe your interactions with {person}?",
-
-        # Creative Process
-        "How did your deafness affect your {aspect}?",
-        "Can you describe your {aspect} process?",
-        "What role does {aspect} play in your creative work?",
-
-        # Personal
-        "How do you feel about {topic}?",
-        "What are your thoughts on {topic}?",
-        "Can you describe a typical day in {location}?",
-        "What advice would you give about {topic}?",
-    ]
-
-    # Substitution values for templates
-    compositions = [
-        "Ninth Symphony", "Eroica Symphony", "Fifth Symphony", "Sixth Symphony (Pastoral)",
-        "Moonlight Sonata", "Pathétique Sonata", "Appassionata Sonata", "Waldstein Sonata",
-        "Piano Concerto No. 5 (Emperor)", "Violin Concerto", "Missa Solemnis", "Fidelio",
-        "String Quartet No. 14", "Hammerklavier Sonata", "Diabelli Variations"
-    ]
-
-    concepts = [
-        "nature", "emotion", "form", "harmony", "counterpoint", "development",
-        "freedom", "heroism", "struggle", "triumph", "improvisation", "variation"
-    ]
-
-    people = [
-        "Joseph Haydn", "Wolfgang Amadeus Mozart", "Napoleon Bonaparte",
-        "Archduke Rudolf", "Prince Lichnowsky", "Count Waldstein", "Goethe",
-        "Ferdinand Ries", "Carl Czerny", "Ignaz Schuppanzigh"
-    ]
-
-    aspects = [
-        "compositional process", "approach to form", "use of orchestration",
-        "approach to development", "understanding of harmony"
-    ]
-
-    topics = [
-        "the aristocratic patronage system", "the French Revolution", "deafness",
-        "young composers", "musical education", "the role of art in society",
-        "the relationship between nature and music", "improvisation"
-    ]
-
-    locations = ["Vienna", "Bonn", "Heiligenstadt", "Baden"]
-
-    # Generate diverse questions
-    import random
-    random.seed(42)  # For reproducibility
-
-    questions = []
-    for template in question_templates:
-        if '{composition}' in template:
-            for comp in compositions:
-                questions.append(template.format(composition=comp))
-        elif '{concept}' in template:
-            for concept in concepts:
-                questions.append(template.format(concept=concept))
-        elif '{person}' in template:
-            for person in people:
-                questions.append(template.format(person=person))
-        elif '{aspect}' in template:
-            for aspect in aspects:
-                questions.append(template.format(aspect=aspect))
-        elif '{topic}' in template:
-            for topic in topics:
-                questions.append(template.format(topic=topic))
-        elif '{location}' in template:
-            for location in locations:
-                questions.append(template.format(location=location))
-
-    # Shuffle and select needed questions
-    random.shuffle(questions)
-
-    # If we need more questions, cycle through
-    needed = num_examples - len(existing_results)
-    selected_questions = []
-    while len(selected_questions) < needed:
-        selected_questions.extend(questions)
-    selected_questions = selected_questions[:needed]
+            return {"character": character.name, "output_file": output_file, "total": len(existing_results),
+                    "successful": 0, "failed": 0, "seconds": 0.0}
 
-    print(f"\n✓ Generated {len(selected_questions)} unique questions from templates")
+    # Distinct questions sampled lazily from the character's template bank; exact and
+    # near-duplicate repeats (including questions already answered) are skipped, not cycled
+    needed = num_examples - len(existing_results)
+    generator = QuestionGenerator(character, seed=42)
+    selected_questions = list(generator.generate(needed, exclude=[r['question'] for r in existing_results]))
+
+    print(f"\n✓ Generated {len(selected_questions)} unique questions from templates "
+          f"({generator.space_size()} combinations, {generator.stats['near_duplicates']} near-duplicates skipped)")
+    if len(selected_questions) < needed:
+        print(f"  Warning: template bank exhausted ({len(selected_questions)} of {needed} needed); "
+              f"add templates or slot values to config/characters.yaml")
+    if not selected_questions:
+        print("✗ No new questions to ask")
+        return {"character": character.name, "output_file": output_file, "total": len(existing_results),
+                "successful": 0, "failed": 0, "seconds": 0.0}
 
     # Generate teacher responses with ASYNC (following cookbook pattern)
     print(f"\nGenerating {len(selected_questions)} teacher responses (async)...")
@@ -211,25 +142,30 @@ async def generate_teacher_data(num_examples=10, output_file="teacher_data_test.
 
     # Define async sample function
     async def sample_one(question):
-        full_prompt = f"{character_prompt}\n\nUser: {question}\nBeethoven:"
+        full_prompt = character.teacher_prompt(character_prompt, question)
         input_ids = tokenizer.encode(full_prompt, add_special_tokens=True)
-        prompt_input = tinker.types.ModelInput.from_ints(input_ids)
-
-        sampling_params = tinker.types.SamplingParams(
-            max_tokens=300,
-            temperature=0.7
-        )
-
-        result_obj = await sampling_client.sample_async(
-            prompt=prompt_input,
-            sampling_params=sampling_params,
-            num_samples=1
-        )
+        prompt_input = model_input(input_ids)
+        params = sampling_params(300, temperature=0.7)
+
+        if semaphore is None:
+            result_obj = await sampling_client.sample_async(
+                prompt=prompt_input,
+                sampling_params=params,
+                num_samples=1
+            )
+        else:
+            async with semaphore:
+                result_obj = await sampling_client.sample_async(
+                    prompt=prompt_input,
+                    sampling_params=params,
+                    num_samples=1
+                )
 
         generated_tokens = result_obj.sequences[0].tokens
         teacher_response = tokenizer.decode(generated_tokens, skip_special_tokens=True)
 
         return {
+            "question_id": question_id(question),
             "question": question,
             "full_prompt": full_prompt,
             "teacher_response": teacher_response,
@@ -290,12 +226,22 @@ async def generate_teacher_data(num_examples=10, output_file="teacher_data_test.
         print(f"✓ Average prompt length: {sum(r['total_prompt_length'] for r in results) / len(results):.1f} words")
     print(f"✓ Character prompt overhead: {prompt_tokens} words per query")
     print(f"✓ Success rate: {successful/(successful+failed)*100:.1f}%")
-    print(f"✓ Total time: {total_time:.1f}s ({total_time/successful:.2f}s/example)")
+    if successful:
+        print(f"✓ Total time: {total_time:.1f}s ({total_time/successful:.2f}s/example)")
+    else:
+        print(f"✓ Total time: {total_time:.1f}s")
     print(f"\n✓ Step 6/8 complete! Ready for Step 7/10 (prepare student format)")
+    return {"character": character.name, "output_file": output_file, "total": len(results),
+            "successful": successful, "failed": failed, "seconds": total_time}
 
 
 if __name__ == "__main__":
-    import sys
-    # Generate test examples (default 10, or pass number as argument)
-    num = int(sys.argv[1]) if len(sys.argv) > 1 else 10
-    asyncio.run(generate_teacher_data(num_examples=num))
+    parser = argparse.ArgumentParser(description="Generate teacher responses with the full character prompt")
+    parser.add_argument("num_examples", nargs="?", type=int, default=10, help="Examples to generate")
+    parser.add_argument("--output", default="teacher_data_test.jsonl")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Save progress every N examples")
+    parser.add_argument("--character", default="Beethoven", help="Character from config/characters.yaml")
+    args = parser.parse_args()
+    summary = asyncio.run(generate_teacher_data(args.num_examples, args.output, args.checkpoint_every,
+                                                args.character))
+    sys.exit(1 if summary.get("error") else 0)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+STEP 6b: Deduplicate Teacher Data
+Near-duplicate teacher responses (repeated questions at temperature 0.7) waste
+training steps and skew evaluation. Responses are shingled into word 5-grams,
+MinHash-signed in vectorized NumPy and clustered with LSH banding plus
+union-find (see minhash.py). The first response of each cluster is kept.
+
+Every kept record gets:
+- cluster_id: index of the record in the input file (its cluster's representative)
+- cluster_size: how many near-duplicate responses the cluster had
+- split_group: kept records that answer the same (normalized) question share a
+  group; 05_prepare_training_data.py keeps a group on one side of the
+  train/val split, so near-duplicates cannot leak across it
+
+The input is read twice (signatures first, then kept records are written), so
+memory holds the signatures, not the responses. A JSON report records how many
+examples and tokens were removed, and what the clustering can miss: LSH only
+proposes a pair at exactly the threshold with probability
+lsh_candidate_probability (more for closer pairs), and large buckets are
+verified head + neighbour rather than all pairs (see cluster_signatures).
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+from minhash import MinHasher, cluster_signatures, lsh_params, normalize
+
+ALL_PAIRS_BUCKET = 8
+
+CHUNK_SIZE = 4096
+
+
+def iter_teacher_records(teacher_file):
+    """(index, record) for teacher records with a non-empty response"""
+    index = 0
+    with open(teacher_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get('question') and (record.get('teacher_response') or "").strip():
+                yield index, record
+                index += 1
+
+
+def _chunks(iterable, size=CHUNK_SIZE):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def dedup_teacher_data(teacher_file="teacher_data_test.jsonl", output_file="teacher_data_dedup.jsonl",
+                       report_file="dedup_report.json", threshold=0.8, num_perm=128, shingle_size=5,
+                       word_counts=False):
+    """
+    Drop near-duplicate teacher responses, keeping one representative per cluster
+
+    Args:
+        teacher_file: Teacher data from 03_generate_teacher_data.py
+        output_file: Deduplicated teacher data (input of 05_prepare_training_data.py)
+        report_file: JSON report of removed examples / tokens
+        threshold: Estimated Jaccard similarity at which responses are near-duplicates
+        num_perm: MinHash signature length
+        shingle_size: Words per shingle
+        word_counts: Count words instead of tokenizer tokens in the report
+
+    Returns:
+        Report dict
+    """
+    print("=" * 80)
+    print("STEP 6b: Deduplicating Teacher Data")
+    print("=" * 80)
+    start = time.time()
+
+    if word_counts:
+        token_unit = "words"
+        count_tokens = lambda texts: [len(text.split()) for text in texts]
+    else:
+        from tokenizers_cache import get_tokenizer
+        tokenizer = get_tokenizer()
+        token_unit = "tokens"
+        count_tokens = lambda texts: [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    # Pass 1: signatures, token counts and normalized questions
+    hasher = MinHasher(num_perm, shingle_size)
+    signatures, tokens, questions = [], [], []
+    for chunk in _chunks(iter_teacher_records(teacher_file)):
+        responses = [record['teacher_response'].strip() for _, record in chunk]
+        signatures.append(hasher.signatures(responses))
+        tokens.extend(count_tokens(responses))
+        questions.extend(normalize(record['question']) for _, record in chunk)
+    signatures = np.concatenate(signatures) if signatures else np.empty((0, num_perm), dtype=np.uint32)
+    tokens = np.asarray(tokens, dtype=np.int64)
+    print(f"✓ Signed {len(signatures)} responses ({num_perm} permutations, {shingle_size}-word shingles) "
+          f"in {time.time() - start:.1f}s")
+    if not len(signatures):
+        print("✗ No usable teacher examples")
+        return None
+
+    labels = cluster_signatures(signatures, threshold, all_pairs_bucket=ALL_PAIRS_BUCKET)
+    keep = labels == np.arange(len(labels))
+    cluster_sizes = np.bincount(labels, minlength=len(labels))
+
+    # Kept records answering the same question share a split group (first such record's index)
+    first_for_question = {}
+    split_groups = {}
+    for index in np.flatnonzero(keep).tolist():
+        split_groups[index] = first_for_question.setdefault(questions[index], index)
+
+    # Pass 2: write the kept records
+    with open(output_file, 'w') as f:
+        for index, record in iter_teacher_records(teacher_file):
+            if keep[index]:
+                record.update(cluster_id=index, cluster_size=int(cluster_sizes[index]),
+                              split_group=split_groups[index])
+                f.write(json.dumps(record) + '\n')
+
+    bands, rows = lsh_params(threshold, num_perm)
+    duplicate_clusters = cluster_sizes[keep] > 1
+    report = {
+        "input_file": teacher_file,
+        "output_file": output_file,
+        "threshold": threshold,
+        "num_perm": num_perm,
+        "shingle_size": shingle_size,
+        "lsh_bands": bands,
+        "lsh_rows": rows,
+        # Recall trade-off: chance a pair at exactly the threshold shares a band (closer pairs: higher)
+        "lsh_candidate_probability": round(1.0 - (1.0 - threshold ** rows) ** bands, 4),
+        "verification": f"all pairs in buckets of up to {ALL_PAIRS_BUCKET}, head + previous member above",
+        "examples_in": int(len(labels)),
+        "examples_out": int(keep.sum()),
+        "examples_removed": int((~keep).sum()),
+        "removed_fraction": round(float((~keep).mean()), 4),
+        "clusters_with_duplicates": int(duplicate_clusters.sum()),
+        "largest_cluster": int(cluster_sizes.max()),
+        "split_groups": len(set(split_groups.values())),
+        "token_unit": token_unit,
+        "tokens_in": int(tokens.sum()),
+        "tokens_out": int(tokens[keep].sum()),
+        "tokens_removed": int(tokens[~keep].sum()),
+        "seconds": round(time.time() - start, 2),
+    }
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"✓ {report['examples_in']} -> {report['examples_out']} examples "
+          f"({report['examples_removed']} near-duplicates removed, {report['removed_fraction']:.1%})")
+    print(f"✓ {report['clusters_with_duplicates']} clusters had duplicates (largest: {report['largest_cluster']})")
+    print(f"✓ {report['tokens_removed']} of {report['tokens_in']} response {token_unit} removed")
+    print(f"✓ {report['split_groups']} split groups -> {output_file}")
+    print(f"✓ Report saved to {report_file} ({report['seconds']:.1f}s)")
+    print(f"\n✓ Step 6b complete! Ready for Step 7/10 (prepare student format)")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove near-duplicate teacher responses (MinHash/LSH)")
+    parser.add_argument("teacher_file", nargs="?", default="teacher_data_test.jsonl")
+    parser.add_argument("--output", default="teacher_data_dedup.jsonl")
+    parser.add_argument("--report", default="dedup_report.json")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Near-duplicate Jaccard threshold")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash signature length")
+    parser.add_argument("--shingle-size", type=int, default=5, help="Words per shingle")
+    parser.add_argument("--word-counts", action="store_true",
+                        help="Report word counts instead of tokenizer tokens (no tokenizer load)")
+    args = parser.parse_args()
+    dedup_teacher_data(args.teacher_file, args.output, args.report, args.threshold, args.num_perm,
+                       args.shingle_size, args.word_counts)
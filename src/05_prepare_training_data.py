@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+STEP 7-11: Prepare Student Training Data
+Strip the character prompt from teacher data and write a 90/10 train/val split
+in the student's messages format (user question -> teacher response).
+Deduplicated teacher data (04_dedup_teacher_data.py) is split by split_group,
+so near-duplicates and repeated questions never straddle train and val. Run
+standalone, the input defaults to teacher_data_dedup.jsonl and falls back to
+the raw teacher_data_test.jsonl (with a warning) when 04 hasn't been run.
+"""
+
+import os
+import json
+import random
+import argparse
+
+DEDUP_FILE = "teacher_data_dedup.jsonl"
+RAW_FILE = "teacher_data_test.jsonl"
+
+
+def load_teacher_records(teacher_file):
+    """Teacher data records with a non-empty response"""
+    records = []
+    with open(teacher_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get('question') and (record.get('teacher_response') or "").strip():
+                records.append(record)
+    return records
+
+
+def to_messages(record):
+    """Student format: no system/character prompt, just the question and the teacher's reply"""
+    return {"messages": [
+        {"role": "user", "content": record['question']},
+        {"role": "assistant", "content": record['teacher_response'].strip()},
+    ]}
+
+
+def split_records(records, val_fraction=0.1, seed=42):
+    """
+    (train, val) records. Records carrying a split_group are assigned a whole
+    group at a time; otherwise each record is assigned on its own.
+    """
+    num_val = max(1, round(len(records) * val_fraction)) if len(records) > 1 else 0
+    if not all('split_group' in r for r in records):
+        records = list(records)
+        random.Random(seed).shuffle(records)
+        return records[num_val:], records[:num_val]
+
+    groups = {}
+    for record in records:
+        groups.setdefault(record['split_group'], []).append(record)
+    keys = list(groups)
+    random.Random(seed).shuffle(keys)
+    train, val = [], []
+    # The last group always goes to train, so a single group never empties it
+    for i, key in enumerate(keys):
+        (val if len(val) < num_val and i < len(keys) - 1 else train).extend(groups[key])
+    random.Random(seed).shuffle(train)
+    return train, val
+
+
+def write_jsonl(path, examples):
+    with open(path, 'w') as f:
+        for example in examples:
+            f.write(json.dumps(example) + '\n')
+
+
+def prepare_training_data(teacher_file="teacher_data_test.jsonl", train_file="train.jsonl",
+                          val_file="val.jsonl", val_fraction=0.1, seed=42):
+    """
+    Build train/val files for 06_train_student_model.py
+
+    Args:
+        teacher_file: Teacher data from 03_generate_teacher_data.py (or 04_dedup_teacher_data.py)
+        train_file: Training split output
+        val_file: Validation split output
+        val_fraction: Fraction of examples held out
+        seed: Shuffle seed (fixed so the split is reproducible)
+    """
+    print("=" * 80)
+    print("STEP 7-11: Preparing Student Training Data")
+    print("=" * 80)
+
+    records = load_teacher_records(teacher_file)
+    print(f"✓ Loaded {len(records)} teacher examples from {teacher_file}")
+    if not records:
+        print("✗ No usable teacher examples")
+        return None
+
+    train_records, val_records = split_records(records, val_fraction, seed)
+    train = [to_messages(r) for r in train_records]
+    val = [to_messages(r) for r in val_records]
+    if records and 'split_group' in records[0]:
+        print(f"✓ Split by group: {len({r['split_group'] for r in records})} groups "
+              f"(no question or near-duplicate shared between train and val)")
+
+    write_jsonl(train_file, train)
+    write_jsonl(val_file, val)
+    print(f"✓ Train: {len(train)} examples -> {train_file}")
+    print(f"✓ Val: {len(val)} examples -> {val_file}")
+    print(f"\n✓ Step 7-11 complete! Ready for Step 12 (train student model)")
+    return {"train": len(train), "val": len(val)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the student train/val split from teacher data")
+    parser.add_argument("teacher_file", nargs="?", default=None,
+                        help=f"Teacher data (default: {DEDUP_FILE}, else {RAW_FILE})")
+    parser.add_argument("--train-file", default="train.jsonl")
+    parser.add_argument("--val-file", default="val.jsonl")
+    parser.add_argument("--val-fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    teacher_file = args.teacher_file
+    if teacher_file is None:
+        teacher_file = DEDUP_FILE
+        if not os.path.exists(DEDUP_FILE):
+            teacher_file = RAW_FILE
+            print(f"Warning: {DEDUP_FILE} not found, splitting the un-deduplicated {RAW_FILE} "
+                  f"(run 04_dedup_teacher_data.py first for near-duplicate removal and a group-aware split)")
+    prepare_training_data(teacher_file, args.train_file, args.val_file, args.val_fraction, args.seed)
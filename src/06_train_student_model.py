@@ -10,12 +10,14 @@ import json
 import yaml
 import numpy as np
 import time
+import argparse
 from pathlib import Path
 from contextlib import contextmanager
 from dataclasses import dataclass
-from transformers import AutoTokenizer
-import tinker
-from tinker import types
+from tokenizers_cache import get_tokenizer, resolve_tokenizer_name
+from tinker_backend import create_service_client, using_fake_backend, datum, tensor_data, adam_params
+from sampler_registry import register_sampler
+from character_registry import get_character
 
 # Load .env if exists
 try:
@@ -94,20 +96,11 @@ def prepare_training_examples(data, tokenizer, max_length=2048):
         target_tokens = tokens[1:]
         shifted_weights = weights[1:]
 
-        model_input = types.ModelInput.from_ints(input_tokens)
-        training_example = types.Datum(
-            model_input=model_input,
+        training_example = datum(
+            input_tokens,
             loss_fn_inputs={
-                'weights': types.TensorData(
-                    data=shifted_weights,
-                    dtype='float32',
-                    shape=[len(shifted_weights)]
-                ),
-                'target_tokens': types.TensorData(
-                    data=target_tokens,
-                    dtype='int64',
-                    shape=[len(target_tokens)]
-                )
+                'weights': tensor_data(shifted_weights, 'float32'),
+                'target_tokens': tensor_data(target_tokens, 'int64')
             }
         )
         processed.append(training_example)
@@ -138,8 +131,20 @@ def calculate_loss(fwdbwd_result, processed_examples):
 
     return float(-total_weighted_logprobs / total_weights)
 
-def train_student_model(config_path="training_config.yaml"):
-    """Main training function"""
+def train_student_model(config_path="training_config.yaml", character=None, train_file=None, val_file=None):
+    """
+    Main training function
+
+    Args:
+        config_path: Training config (YAML)
+        character: Character from config/characters.yaml; names the experiment
+            ({slug}_prompt_distillation) and its checkpoints instead of the config's metadata
+        train_file: Training split (default: config data.train_file)
+        val_file: Validation split (default: config data.val_file)
+
+    Returns:
+        Name of the final checkpoint
+    """
     print("=" * 80)
     print("STEP 12-13: Training Student Model with Tinker API")
     print("=" * 80)
@@ -149,6 +154,16 @@ def train_student_model(config_path="training_config.yaml"):
     config = load_config(config_path)
     print(f"✓ Config loaded from {config_path}")
 
+    experiment_name = config['metadata']['experiment_name']
+    step_prefix = "beethoven"
+    if character is not None:
+        character = get_character(character)
+        experiment_name = character.checkpoint_prefix
+        step_prefix = character.slug
+        print(f"  Character: {character.name} (experiment '{experiment_name}')")
+    train_file = train_file or config['data']['train_file']
+    val_file = val_file or config['data']['val_file']
+
     # Extract config values
     base_model = config['model']['base_model']
     lora_rank = config['model']['lora_rank']
@@ -167,17 +182,19 @@ def train_student_model(config_path="training_config.yaml"):
     # Create output directories
     checkpoint_dir = Path(config['checkpointing']['output_dir'])
     log_dir = Path(config['logging']['log_dir'])
+    if character is not None:
+        # Parallel per-character runs must not interleave their loss logs
+        log_dir = log_dir / character.slug
     checkpoint_dir.mkdir(exist_ok=True)
-    log_dir.mkdir(exist_ok=True)
+    log_dir.mkdir(parents=True, exist_ok=True)
     print(f"✓ Output directories created")
 
     # Initialize Tinker client
     print("\nInitializing Tinker client...")
-    api_key = os.environ.get("TINKER_API_KEY")
-    if not api_key:
+    if not using_fake_backend() and not os.environ.get("TINKER_API_KEY"):
         raise ValueError("TINKER_API_KEY environment variable not set")
 
-    service_client = tinker.ServiceClient()
+    service_client = create_service_client()
     print("✓ Service client initialized")
 
     # Create LoRA training client
@@ -190,23 +207,16 @@ def train_student_model(config_path="training_config.yaml"):
 
     # Load tokenizer
     print(f"\nLoading tokenizer...")
-    try:
-        # Try to load model's own tokenizer
-        tokenizer = AutoTokenizer.from_pretrained(base_model)
-        print(f"✓ Tokenizer loaded for {base_model}")
-    except:
-        # Fallback to Qwen (not gated) as it's compatible
-        print(f"Note: {base_model} tokenizer unavailable (gated), using Qwen/Qwen2.5-7B tokenizer")
-        tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen2.5-7B")
-        print("✓ Qwen tokenizer loaded")
+    tokenizer = get_tokenizer(base_model)
+    print(f"✓ Tokenizer loaded for {base_model} ({resolve_tokenizer_name(base_model)})")
 
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
 
     # Load training data
     print("\nLoading training data...")
-    train_data = load_jsonl_data(config['data']['train_file'])
-    val_data = load_jsonl_data(config['data']['val_file'])
+    train_data = load_jsonl_data(train_file)
+    val_data = load_jsonl_data(val_file)
     print(f"✓ Train examples: {len(train_data)}")
     print(f"✓ Val examples: {len(val_data)}")
 
@@ -242,7 +252,7 @@ def train_student_model(config_path="training_config.yaml"):
         with timed("submit_ops", step_metrics):
             fwdbwd_future = training_client.forward_backward(batch, "cross_entropy")
             optim_future = training_client.optim_step(
-                types.AdamParams(
+                adam_params(
                     learning_rate=learning_rate,
                     beta1=config['training']['beta1'],
                     beta2=config['training']['beta2'],
@@ -279,20 +289,23 @@ def train_student_model(config_path="training_config.yaml"):
         # Save checkpoint
         if step % save_every == 0 and step > 0:
             print(f"  → Saving checkpoint at step {step}...")
-            checkpoint_name = f"beethoven_step_{step}"
+            checkpoint_name = f"{step_prefix}_step_{step}"
             training_client.save_state(name=checkpoint_name)
             print(f"  ✓ Checkpoint saved as '{checkpoint_name}'")
 
     # Save final checkpoint and weights for sampling
     print(f"\nSaving final checkpoint...")
-    final_checkpoint_name = f"{config['metadata']['experiment_name']}_final_checkpoint"
+    final_checkpoint_name = f"{experiment_name}_final_checkpoint"
     training_client.save_state(name=final_checkpoint_name)
     print(f"✓ Final checkpoint saved as '{final_checkpoint_name}'")
 
     print(f"\nSaving final model weights for sampling...")
-    final_model_name = f"{config['metadata']['experiment_name']}_final"
+    final_model_name = f"{experiment_name}_final"
     sampling_client = training_client.save_weights_and_get_sampling_client(name=final_model_name)
     print(f"✓ Final model saved as '{final_model_name}'")
+    # Evaluation / demo / export reuse these weights instead of saving them again
+    register_sampler(final_checkpoint_name, getattr(sampling_client, "model_path", None),
+                     final_model_name, base_model, lora_rank)
 
     # Training summary
     total_duration = time.time() - total_start
@@ -307,6 +320,13 @@ def train_student_model(config_path="training_config.yaml"):
     print(f"✓ Checkpoints saved to: {checkpoint_dir}")
     print(f"✓ Logs saved to: {log_dir}")
     print(f"\n✓ Step 12-13 complete! Ready for Step 14 (evaluation)")
+    return final_checkpoint_name
 
 if __name__ == "__main__":
-    train_student_model()
+    parser = argparse.ArgumentParser(description="Train the student LoRA on the prepared data")
+    parser.add_argument("--config", default="training_config.yaml", help="Training config (YAML)")
+    parser.add_argument("--character", default=None, help="Character from config/characters.yaml")
+    parser.add_argument("--train-file", default=None, help="Override the config's data.train_file")
+    parser.add_argument("--val-file", default=None, help="Override the config's data.val_file")
+    args = parser.parse_args()
+    train_student_model(args.config, args.character, args.train_file, args.val_file)
@@ -1,90 +1,305 @@
 #!/usr/bin/env python3
 """Step 14: Evaluate student vs teacher on held-out set"""
 
+import os
 import json
-import tinker
-from transformers import AutoTokenizer
-from character_prompts import get_character_prompt
-from difflib import SequenceMatcher
+import time
+import asyncio
+import argparse
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from tokenizers_cache import get_tokenizer
+from character_registry import get_character
+from teacher_cache import question_id, load_teacher_responses
+from similarity import score_batch
+from stats_utils import mean_ci, variance_report
+from tinker_backend import create_service_client, model_input, sampling_params
+from sampler_registry import get_sampling_client
 
 
-def evaluate_models(checkpoint_name, num_samples=100):
-    """Compare student (no prompt) vs teacher (with prompt)"""
+def load_completed(output_file, run_config=None):
+    """
+    Load already-evaluated records from a partial JSONL run, keyed by val index.
+
+    Only a file written with the same run_config (checkpoint, k, teacher source,
+    character) is resumed; records from another configuration would mix into the
+    averages here and in 08_calculate_metrics.py, so they raise instead. A truncated
+    last line (interrupted write) is cut off, so records appended afterwards start
+    on a fresh line.
+    """
+    completed = {}
+    if not os.path.exists(output_file):
+        return completed
+
+    mismatched = 0
+    complete_bytes = 0
+    with open(output_file, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            complete_bytes += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if run_config is not None and record.get('run_config') != run_config:
+                mismatched += 1
+                continue
+            completed[record['index']] = record
+
+    if mismatched:
+        raise ValueError(f"{output_file} has {mismatched} records from a different run configuration "
+                         f"(checkpoint, k, teacher source or character); remove it or pass another --output")
+    if complete_bytes < os.path.getsize(output_file):
+        print(f"Dropping a truncated last line from {output_file}")
+        with open(output_file, 'r+b') as f:
+            f.truncate(complete_bytes)
+    return completed
+
+
+async def evaluate_models_async(checkpoint_name, num_samples=100, concurrency=32,
+                                output_file="evaluation_results.jsonl",
+                                teacher_file="teacher_data_test.jsonl", fresh_teacher=False,
+                                samples_per_prompt=1, refresh_sampler=False, character="Beethoven"):
+    """
+    Compare student (no prompt) vs teacher (with prompt), sampling concurrently
+    across all questions.
+
+    By default the teacher side reuses the responses already stored in the
+    generated teacher dataset (joined by question ID), so only the student is
+    sampled. Pass fresh_teacher=True to re-sample the teacher, e.g. for
+    variance studies.
+
+    With samples_per_prompt=k > 1, each model gets a single request with
+    num_samples=k per question (the prompt is sent once, not k times), and
+    per-question means and confidence intervals are recorded.
+
+    Args:
+        checkpoint_name: Student checkpoint to load
+        num_samples: Number of validation questions to evaluate
+        concurrency: Max questions in flight at once
+        output_file: JSONL file written incrementally (one record per question)
+        teacher_file: Teacher data JSONL from 03_generate_teacher_data.py
+        fresh_teacher: Sample the teacher model instead of using stored responses
+        samples_per_prompt: Completions requested per prompt (k)
+        refresh_sampler: Save the student weights again instead of reusing the registered sampler
+        character: Character from config/characters.yaml (teacher prompt and speaker)
+    """
+    character = get_character(character)
 
     # Setup
-    client = tinker.ServiceClient()
-    tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen2.5-7B")
-
-    # Load student model from checkpoint
-    training_client = client.create_lora_training_client(
-        base_model="Qwen/Qwen3-4B-Instruct-2507",
-        rank=32
-    )
-    training_client.load_state(name=checkpoint_name)
-    student_client = training_client.save_weights_and_get_sampling_client(
-        name=f"{checkpoint_name}_eval"
-    )
-
-    # Load teacher model
-    teacher_client = client.create_sampling_client(base_model="Qwen/Qwen3-30B-A3B")
+    client = create_service_client()
+    tokenizer = get_tokenizer()
+
+    # Load student model from checkpoint (reusing already-saved sampler weights)
+    student_client, _ = get_sampling_client(client, checkpoint_name, refresh=refresh_sampler)
+
+    # Load teacher model (only needed when re-sampling) or stored responses
+    if fresh_teacher:
+        teacher_client = client.create_sampling_client(base_model="Qwen/Qwen3-30B-A3B")
+        stored_teacher = None
+    else:
+        teacher_client = None
+        stored_teacher = load_teacher_responses(teacher_file)
+        print(f"Loaded stored teacher responses for {len(stored_teacher)} questions from {teacher_file}")
 
     # Load eval questions
     with open('val.jsonl', 'r') as f:
         eval_data = [json.loads(line) for line in f][:num_samples]
 
-    character_prompt = get_character_prompt("Beethoven")
-    results = []
+    # Resume partial runs (only records from the same configuration)
+    run_config = {
+        "checkpoint": checkpoint_name,
+        "samples_per_prompt": samples_per_prompt,
+        "teacher_source": "sampled" if fresh_teacher else os.path.abspath(teacher_file),
+        "character": character.name,
+    }
+    completed = load_completed(output_file, run_config)
+    pending = [(i, ex) for i, ex in enumerate(eval_data) if i not in completed]
+
+    # Without fresh sampling, questions lacking a stored teacher response can't be scored
+    if stored_teacher is not None:
+        answerable = [(i, ex) for i, ex in pending
+                      if question_id(ex['messages'][0]['content']) in stored_teacher]
+        missing = len(pending) - len(answerable)
+        if missing:
+            print(f"Warning: {missing} questions have no stored teacher response and will be skipped "
+                  f"(use --fresh-teacher to sample them)")
+        pending = answerable
+
+    if completed:
+        print(f"Resuming: {len(completed)} already evaluated, {len(pending)} remaining")
+
+    character_prompt = character.prompt()
+    params = sampling_params(300)
+    semaphore = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+    done = len(completed)
+    failed = 0
+    start_time = time.time()
+    loop = asyncio.get_running_loop()
 
-    for i, example in enumerate(eval_data):
+    async def sample_texts(sampling_client, tokens):
+        result = await sampling_client.sample_async(
+            prompt=model_input(tokens),
+            sampling_params=params,
+            num_samples=samples_per_prompt
+        )
+        texts = [tokenizer.decode(seq.tokens, skip_special_tokens=True) for seq in result.sequences]
+        return texts, [len(seq.tokens) for seq in result.sequences]
+
+    async def evaluate_one(index, example, out):
+        nonlocal done, failed
         question = example['messages'][0]['content']
+        qid = question_id(question)
+        student_tokens = tokenizer.encode(f"<|user|>\n{question}\n<|assistant|>\n")
+        teacher_tokens = tokenizer.encode(character.teacher_prompt(character_prompt, question))
+
+        async with semaphore:
+            try:
+                if teacher_client is None:
+                    student_responses, student_counts = await sample_texts(student_client, student_tokens)
+                    teacher_responses = stored_teacher[qid][:samples_per_prompt]
+                    teacher_counts = [len(tokenizer.encode(t, add_special_tokens=False))
+                                      for t in teacher_responses]
+                else:
+                    # Student (no prompt) and teacher (with prompt) in parallel
+                    (student_responses, student_counts), (teacher_responses, teacher_counts) = \
+                        await asyncio.gather(
+                            sample_texts(student_client, student_tokens),
+                            sample_texts(teacher_client, teacher_tokens)
+                        )
+            except Exception as e:
+                failed += 1
+                print(f"Error on question {index}: {e}")
+                return
 
-        # Student (no prompt)
-        student_prompt = f"<|user|>\n{question}\n<|assistant|>\n"
-        student_tokens = tokenizer.encode(student_prompt)
-        student_input = tinker.types.ModelInput.from_ints(student_tokens)
-        student_result = student_client.sample(
-            prompt=student_input,
-            sampling_params=tinker.types.SamplingParams(max_tokens=300, temperature=0.7),
-            num_samples=1
-        ).result()
-        student_response = tokenizer.decode(student_result.sequences[0].tokens, skip_special_tokens=True)
-
-        # Teacher (with prompt)
-        teacher_prompt = f"{character_prompt}\n\nUser: {question}\nBeethoven:"
-        teacher_tokens = tokenizer.encode(teacher_prompt)
-        teacher_input = tinker.types.ModelInput.from_ints(teacher_tokens)
-        teacher_result = teacher_client.sample(
-            prompt=teacher_input,
-            sampling_params=tinker.types.SamplingParams(max_tokens=300, temperature=0.7),
-            num_samples=1
-        ).result()
-        teacher_response = tokenizer.decode(teacher_result.sequences[0].tokens, skip_special_tokens=True)
-
-        # Calculate similarity
-        similarity = SequenceMatcher(None, student_response, teacher_response).ratio()
-
-        results.append({
+        # Token-level similarity (ROUGE-L F1 is the headline number) for every
+        # student/teacher sample combination, scored in a worker process so the
+        # event loop keeps sampling meanwhile
+        pairs = [(s, t) for s in student_responses for t in teacher_responses]
+        pair_scores = await loop.run_in_executor(scorer, functools.partial(score_batch, pairs, processes=1))
+        scores = {name: sum(ps[name] for ps in pair_scores) / len(pair_scores) for name in pair_scores[0]}
+
+        record = {
+            "index": index,
+            "question_id": qid,
             "question": question,
-            "student_response": student_response,
-            "teacher_response": teacher_response,
-            "similarity": similarity,
+            "student_response": student_responses[0],
+            "teacher_response": teacher_responses[0],
+            "similarity": scores['rouge_l'],
+            "scores": scores,
             "student_tokens": len(student_tokens),
-            "teacher_tokens": len(teacher_tokens)
-        })
+            "teacher_tokens": len(teacher_tokens),
+            "student_completion_tokens": student_counts[0],
+            "teacher_completion_tokens": teacher_counts[0],
+            "teacher_source": "sampled" if teacher_client is not None else "stored",
+            "run_config": run_config
+        }
+
+        if samples_per_prompt > 1:
+            # One score per student sample (averaged over teacher samples) -> per-question CI
+            n_teacher = len(teacher_responses)
+            sample_similarities = [
+                sum(ps['rouge_l'] for ps in pair_scores[j * n_teacher:(j + 1) * n_teacher]) / n_teacher
+                for j in range(len(student_responses))
+            ]
+            ci = mean_ci(sample_similarities)
+            record.update({
+                "student_responses": student_responses,
+                "teacher_responses": teacher_responses,
+                "student_completion_token_counts": student_counts,
+                "teacher_completion_token_counts": teacher_counts,
+                "sample_similarities": sample_similarities,
+                "similarity_std": ci['std'],
+                "similarity_ci": [ci['ci_low'], ci['ci_high']]
+            })
 
-        if (i + 1) % 10 == 0:
-            print(f"Evaluated {i+1}/{num_samples}")
+        async with write_lock:
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            completed[index] = record
+            done += 1
+            if done % 10 == 0:
+                print(f"Evaluated {done}/{len(eval_data)}")
 
-    # Save results
+    with open(output_file, 'a') as out, ProcessPoolExecutor() as scorer:
+        await asyncio.gather(*(evaluate_one(i, ex, out) for i, ex in pending))
+
+    total_time = time.time() - start_time
+    results = [completed[i] for i in sorted(completed)]
+
+    # Consolidated snapshot consumed by 08_calculate_metrics.py
     with open('evaluation_results.json', 'w') as f:
         json.dump(results, f, indent=2)
 
+    if pending:
+        print(f"Sampled {len(pending) - failed} questions in {total_time:.1f}s "
+              f"({(len(pending) - failed) / max(total_time, 1e-9):.2f} questions/s)")
+    if failed:
+        print(f"Failed: {failed} (re-run to retry them)")
+
+    if not results:
+        return results
+
     avg_similarity = sum(r['similarity'] for r in results) / len(results)
     print(f"Avg similarity: {avg_similarity:.2%}")
+
+    multi = [r['sample_similarities'] for r in results if 'sample_similarities' in r]
+    if multi:
+        report = variance_report(multi)
+        print(f"Similarity over {report['questions']} questions: {report['mean']:.2%} "
+              f"(95% CI {report['ci_low']:.2%} - {report['ci_high']:.2%})")
+        print(f"  Within-question std: {report['within_question_std']:.4f}, "
+              f"between-question std: {report['between_question_std']:.4f}")
+        print(f"  Samples/question for +/-{report['question_half_width_target']:.0%} per-question CI: "
+              f"{report['samples_per_question_needed']}")
+        print(f"  Questions for +/-{report['overall_half_width_target']:.0%} overall CI: "
+              f"{report['questions_needed']}")
+
     print(f"Token savings: {results[0]['teacher_tokens'] - results[0]['student_tokens']} per query")
+    return results
+
+
+def evaluate_models(checkpoint_name, num_samples=100, concurrency=32,
+                    output_file="evaluation_results.jsonl",
+                    teacher_file="teacher_data_test.jsonl", fresh_teacher=False,
+                    samples_per_prompt=1, refresh_sampler=False, character="Beethoven"):
+    """Compare student (no prompt) vs teacher (with prompt)"""
+    return asyncio.run(evaluate_models_async(
+        checkpoint_name,
+        num_samples=num_samples,
+        concurrency=concurrency,
+        output_file=output_file,
+        teacher_file=teacher_file,
+        fresh_teacher=fresh_teacher,
+        samples_per_prompt=samples_per_prompt,
+        refresh_sampler=refresh_sampler,
+        character=character
+    ))
 
 
 if __name__ == "__main__":
-    import sys
-    checkpoint = sys.argv[1] if len(sys.argv) > 1 else "beethoven_prompt_distillation_final_checkpoint"
-    evaluate_models(checkpoint)
+    parser = argparse.ArgumentParser(description="Evaluate student vs teacher on held-out set")
+    parser.add_argument("checkpoint", nargs="?", default=None,
+                        help="Student checkpoint (default: <character>_prompt_distillation_final_checkpoint)")
+    parser.add_argument("--character", default="Beethoven", help="Character from config/characters.yaml")
+    parser.add_argument("--num-samples", type=int, default=100, help="Validation questions to evaluate")
+    parser.add_argument("--concurrency", type=int, default=32, help="Max questions in flight")
+    parser.add_argument("--output", default="evaluation_results.jsonl", help="Incremental JSONL results file")
+    parser.add_argument("--teacher-data", default="teacher_data_test.jsonl",
+                        help="Stored teacher responses to join against (by question ID)")
+    parser.add_argument("--fresh-teacher", action="store_true",
+                        help="Re-sample the 30B teacher instead of reusing stored responses")
+    parser.add_argument("--k", type=int, default=1,
+                        help="Samples per prompt (one request per model with num_samples=k)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Save the student weights again instead of reusing the registered sampler")
+    args = parser.parse_args()
+    checkpoint = args.checkpoint or f"{get_character(args.character).checkpoint_prefix}_final_checkpoint"
+    evaluate_models(checkpoint, args.num_samples, args.concurrency, args.output,
+                    teacher_file=args.teacher_data, fresh_teacher=args.fresh_teacher,
+                    samples_per_prompt=args.k, refresh_sampler=args.refresh, character=args.character)
@@ -1,44 +1,203 @@
 #!/usr/bin/env python3
 """Step 16: Calculate cost savings metrics"""
 
+import os
 import json
+import argparse
+import yaml
+from stats_utils import RunningStats, Histogram, VarianceAccumulator
 
+DEFAULT_COST_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "cost_model.yaml")
 
-def calculate_metrics():
-    """Analyze evaluation results for cost/quality metrics"""
+# Upper bound for token-count histograms (1-token bins, larger values land in the last bin)
+MAX_TOKENS = 32768
 
-    with open('evaluation_results.json', 'r') as f:
-        results = json.loads(f.read())
 
-    # Quality metrics
-    similarities = [r['similarity'] for r in results]
-    avg_sim = sum(similarities) / len(similarities)
-    min_sim = min(similarities)
+def iter_records(results_file):
+    """
+    Yield evaluation records one at a time.
 
-    # Token savings
-    token_savings = results[0]['teacher_tokens'] - results[0]['student_tokens']
-    reduction_pct = token_savings / results[0]['teacher_tokens'] * 100
+    JSONL and Arrow/Parquet inputs are streamed (constant memory); a legacy
+    .json array is loaded whole.
+    """
+    if results_file.endswith('.jsonl'):
+        with open(results_file, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif results_file.endswith(('.arrow', '.feather')):
+        import pyarrow as pa
+        with pa.memory_map(results_file, 'r') as source:
+            try:
+                reader = pa.ipc.open_file(source)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            except pa.ArrowInvalid:
+                source.seek(0)
+                batches = pa.ipc.open_stream(source)
+            for batch in batches:
+                yield from batch.to_pylist()
+    elif results_file.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(results_file).iter_batches():
+            yield from batch.to_pylist()
+    else:
+        with open(results_file, 'r') as f:
+            yield from json.load(f)
 
-    # Cost calculation (Qwen pricing: $0.06/1M input tokens)
-    teacher_cost_per_1m = (results[0]['teacher_tokens'] / 1000) * 0.06
-    student_cost_per_1m = (results[0]['student_tokens'] / 1000) * 0.06
+
+class TokenStats:
+    """Exact totals plus streaming distribution of one per-query token count"""
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.histogram = Histogram(0, MAX_TOKENS, 1)
+
+    def add(self, value):
+        self.stats.add(value)
+        self.histogram.add(value)
+
+    def summary(self):
+        if self.stats.n == 0:
+            return None
+        return {
+            "count": self.stats.n,
+            "total": int(self.stats.total),
+            "mean": round(self.stats.mean, 2),
+            "min": int(self.stats.min),
+            "max": int(self.stats.max),
+            "p50": self.histogram.percentile(50),
+            "p90": self.histogram.percentile(90),
+            "p99": self.histogram.percentile(99),
+            "histogram": {f"{low}-{high}": count for low, high, count in self.histogram.summary()},
+        }
+
+
+def load_cost_model(cost_model_file=DEFAULT_COST_MODEL):
+    """Per-tier USD prices per 1M prompt/completion tokens"""
+    with open(cost_model_file, 'r') as f:
+        return yaml.safe_load(f)['tiers']
+
+
+def tier_cost(tier, prompt, completion):
+    """Cost breakdown for a tier given its prompt/completion TokenStats"""
+    prompt_mean = prompt.stats.mean if prompt.stats.n else 0.0
+    completion_mean = completion.stats.mean if completion.stats.n else 0.0
+    per_query = (prompt_mean * tier['prompt_per_1m'] + completion_mean * tier['completion_per_1m']) / 1e6
+    evaluated = (prompt.stats.total * tier['prompt_per_1m']
+                 + completion.stats.total * tier['completion_per_1m']) / 1e6
+    return {
+        "model": tier.get('model'),
+        "cost_per_query": per_query,
+        "cost_per_1m_queries": per_query * 1e6,
+        "cost_of_evaluated_queries": evaluated,
+        "includes_completion_tokens": completion.stats.n > 0,
+    }
+
+
+def calculate_metrics(results_file="evaluation_results.jsonl", cost_model_file=DEFAULT_COST_MODEL,
+                      output_file="metrics_report.json"):
+    """
+    Analyze evaluation results for cost/quality metrics in a single streaming pass.
+
+    Args:
+        results_file: Evaluation records (.jsonl, .arrow/.feather, .parquet or legacy .json)
+        cost_model_file: YAML with per-tier token prices
+        output_file: Where to write the metrics report
+    """
+    cost_model = load_cost_model(cost_model_file)
+
+    similarity = RunningStats()
+    similarity_hist = Histogram(0.0, 1.0 + 1e-9, 0.001)
+    embedding = RunningStats()
+    style = RunningStats()
+    variance = VarianceAccumulator()
+    tokens = {
+        "student": {"prompt": TokenStats(), "completion": TokenStats()},
+        "teacher": {"prompt": TokenStats(), "completion": TokenStats()},
+    }
+    saved = RunningStats()
+
+    for r in iter_records(results_file):
+        # Quality metrics
+        similarity.add(r['similarity'])
+        similarity_hist.add(r['similarity'])
+        if 'embedding_similarity' in r:
+            embedding.add(r['embedding_similarity'])
+            style.add(r['style_similarity'])
+        if r.get('sample_similarities'):
+            variance.add(r['sample_similarities'])
+
+        # Per-query token accounting
+        tokens['student']['prompt'].add(r['student_tokens'])
+        tokens['teacher']['prompt'].add(r['teacher_tokens'])
+        saved.add(r['teacher_tokens'] - r['student_tokens'])
+        for side in ("student", "teacher"):
+            counts = r.get(f'{side}_completion_token_counts')
+            if counts is None and f'{side}_completion_tokens' in r:
+                counts = [r[f'{side}_completion_tokens']]
+            for count in counts or []:
+                tokens[side]['completion'].add(count)
+
+    if similarity.n == 0:
+        print(f"No evaluation records in {results_file}")
+        return None
+
+    # Token savings (exact, averaged over every query)
+    teacher_prompt_mean = tokens['teacher']['prompt'].stats.mean
+    reduction_pct = saved.mean / teacher_prompt_mean * 100 if teacher_prompt_mean else 0.0
+
+    # Cost per model tier
+    costs = {
+        side: tier_cost(cost_model[side], tokens[side]['prompt'], tokens[side]['completion'])
+        for side in ("student", "teacher")
+    }
+    teacher_cost_per_1m = costs['teacher']['cost_per_1m_queries']
+    student_cost_per_1m = costs['student']['cost_per_1m_queries']
     savings_per_1m = teacher_cost_per_1m - student_cost_per_1m
     cost_multiplier = teacher_cost_per_1m / student_cost_per_1m if student_cost_per_1m > 0 else float('inf')
 
+    sim_ci = similarity.ci()
     metrics = {
-        "quality_retention": f"{avg_sim:.1%}",
-        "min_similarity": f"{min_sim:.1%}",
-        "tokens_saved_per_query": token_savings,
+        "queries": similarity.n,
+        "quality_retention": f"{similarity.mean:.1%}",
+        "quality_retention_95ci": f"{sim_ci['ci_low']:.1%} - {sim_ci['ci_high']:.1%}",
+        "min_similarity": f"{similarity.min:.1%}",
+        "similarity_percentiles": {
+            f"p{q}": round(similarity_hist.percentile(q), 3) for q in (10, 50, 90)
+        },
+        "tokens_saved_per_query": round(saved.mean, 2),
         "token_reduction": f"{reduction_pct:.1f}%",
         "cost_savings_per_1m_queries": f"${savings_per_1m:.2f}",
-        "cost_multiplier": f"{cost_multiplier:.1f}x cheaper"
+        "cost_multiplier": f"{cost_multiplier:.1f}x cheaper",
+        "token_accounting": {
+            side: {kind: stats.summary() for kind, stats in kinds.items()}
+            for side, kinds in tokens.items()
+        },
+        "cost_by_tier": costs,
     }
 
-    with open('metrics_report.json', 'w') as f:
+    # Embedding-based style fidelity (added by embedding_similarity.py)
+    if embedding.n:
+        metrics["embedding_similarity"] = f"{embedding.mean:.1%}"
+        metrics["min_embedding_similarity"] = f"{embedding.min:.1%}"
+        metrics["style_similarity"] = f"{style.mean:.1%}"
+
+    # Multi-sample evaluation (07_evaluate_models.py --k > 1)
+    if variance.question_means.n:
+        metrics["sampling_variance"] = variance.report()
+
+    with open(output_file, 'w') as f:
         json.dump(metrics, f, indent=2)
 
     print(json.dumps(metrics, indent=2))
+    return metrics
 
 
 if __name__ == "__main__":
-    calculate_metrics()
+    parser = argparse.ArgumentParser(description="Calculate cost savings metrics")
+    parser.add_argument("results", nargs="?", default="evaluation_results.jsonl",
+                        help="Evaluation records (.jsonl, .arrow, .parquet or .json)")
+    parser.add_argument("--cost-model", default=DEFAULT_COST_MODEL, help="Per-tier token prices (YAML)")
+    parser.add_argument("--output", default="metrics_report.json")
+    args = parser.parse_args()
+    calculate_metrics(args.results, args.cost_model, args.output)
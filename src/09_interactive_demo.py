@@ -1,54 +1,164 @@
 #!/usr/bin/env python3
-"""Step 17: Interactive inference demo"""
+"""
+Step 17: Interactive inference demo
 
-import tinker
-from transformers import AutoTokenizer
+Replies are printed progressively: the backend returns whole completions, so
+each reply is generated as a small first chunk followed by larger continuation
+chunks (see chunked_sampling.py). Time-to-first-token and tokens/sec are shown
+after every turn.
 
+The conversation is multi-turn: history is kept as an incrementally extended
+token buffer (see chat_session.py) so only new text is tokenized each turn, and
+a window or summary policy keeps the prompt under --token-budget. Per-turn
+prompt tokens (new / reused / evicted) and prompt cost are reported; type
+/reset to start a new conversation.
 
-def interactive_demo(checkpoint_name):
-    """CLI for chatting with distilled student model"""
+Startup time (imports, tokenizer, sampler) is printed before the first prompt.
+"""
 
-    client = tinker.ServiceClient()
-    tokenizer = AutoTokenizer.from_pretrained("Qwen/Qwen2.5-7B")
+import time
+PROCESS_START = time.perf_counter()
 
-    # Load student
-    training_client = client.create_lora_training_client(
-        base_model="Qwen/Qwen3-4B-Instruct-2507",
-        rank=32
-    )
-    training_client.load_state(name=checkpoint_name)
-    student_client = training_client.save_weights_and_get_sampling_client(
-        name=f"{checkpoint_name}_demo"
-    )
+import os
+import yaml
+import asyncio
+import argparse
+import threading
+from tokenizers_cache import get_tokenizer
+from tinker_backend import create_service_client
+from chunked_sampling import stream_sample, IncrementalDecoder, TurnTimer
+from chat_session import ChatSession, POLICIES
+from sampler_registry import get_sampling_client
+from character_registry import get_character
 
-    print("Interactive Beethoven Demo (Ctrl+C to exit)")
-    print("=" * 60)
+DEFAULT_COST_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "cost_model.yaml")
+
+
+def student_prompt_price(cost_model_file=DEFAULT_COST_MODEL):
+    """Student-tier USD per 1M prompt tokens (None if the cost model is unavailable)"""
+    try:
+        with open(cost_model_file, 'r') as f:
+            return yaml.safe_load(f)['tiers']['student']['prompt_per_1m']
+    except (OSError, KeyError, TypeError):
+        return None
+
+
+def read_line(loop, prompt):
+    """
+    input() on a daemon thread, awaitable from the event loop.
 
-    while True:
+    A daemon thread (rather than the loop's default executor) lets Ctrl+C exit
+    immediately instead of waiting for the blocked input() call.
+    """
+    future = loop.create_future()
+
+    def target():
         try:
-            question = input("\nYou: ")
-            if not question.strip():
-                continue
+            result = input(prompt)
+            loop.call_soon_threadsafe(future.set_result, result)
+        except BaseException as e:
+            loop.call_soon_threadsafe(future.set_exception, e)
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+async def interactive_demo_async(checkpoint_name, max_tokens=200, first_chunk=16, max_chunk=64,
+                                 token_budget=2048, policy="window", refresh_sampler=False,
+                                 character="Beethoven"):
+    """
+    CLI for chatting with distilled student model
 
-            prompt = f"<|user|>\n{question}\n<|assistant|>\n"
-            tokens = tokenizer.encode(prompt)
-            model_input = tinker.types.ModelInput.from_ints(tokens)
+    Args:
+        checkpoint_name: Student checkpoint to load
+        max_tokens: Reply length limit
+        first_chunk: Tokens in the first request (lower = faster first token)
+        max_chunk: Largest continuation request
+        token_budget: Max prompt + reply tokens per turn
+        policy: History eviction policy ("window" or "summary")
+        refresh_sampler: Save the student weights again instead of reusing the registered sampler
+        character: Character from config/characters.yaml (reply label)
+    """
 
-            result = student_client.sample(
-                prompt=model_input,
-                sampling_params=tinker.types.SamplingParams(max_tokens=200, temperature=0.7),
-                num_samples=1
-            ).result()
+    character = get_character(character)
+    imported = time.perf_counter()
+    tokenizer = get_tokenizer()
+    tokenizer_ready = time.perf_counter()
+    client = create_service_client()
+    loop = asyncio.get_running_loop()
 
-            response = tokenizer.decode(result.sequences[0].tokens, skip_special_tokens=True)
-            print(f"Beethoven: {response}")
+    # Load student (reusing already-saved sampler weights)
+    student_client, _ = get_sampling_client(client, checkpoint_name, refresh=refresh_sampler)
+    stop_token_ids = {tokenizer.eos_token_id} if getattr(tokenizer, "eos_token_id", None) is not None else set()
 
-        except KeyboardInterrupt:
-            print("\nGoodbye!")
-            break
+    session = ChatSession(tokenizer, token_budget=token_budget, reserve_tokens=max_tokens,
+                          policy=policy, prompt_price_per_1m=student_prompt_price())
+
+    ready = time.perf_counter()
+    print(f"Ready in {ready - PROCESS_START:.2f}s (imports {imported - PROCESS_START:.2f}s, "
+          f"tokenizer {tokenizer_ready - imported:.2f}s, sampler {ready - tokenizer_ready:.2f}s)")
+    print(f"Interactive {character.name} Demo (Ctrl+C to exit, /reset for a new conversation)")
+    print("=" * 60)
+
+    async def reply(prompt_tokens):
+        """Stream one reply and append its tokens to the session"""
+        turn = session.turns[-1]
+        timer = TurnTimer()
+        decoder = IncrementalDecoder(tokenizer)
+        print(f"{character.speaker}: ", end="", flush=True)
+        async for chunk in stream_sample(student_client, prompt_tokens, max_tokens=max_tokens,
+                                         first_chunk=first_chunk, max_chunk=max_chunk,
+                                         stop_token_ids=stop_token_ids, timer=timer):
+            print(decoder.add(chunk), end="", flush=True)
+        session.add_assistant(decoder.tokens, decoder.text)
+
+        cost = f" | ${turn.prompt_cost:.6f}" if turn.prompt_cost is not None else ""
+        print(f"\n  [TTFT {timer.ttft:.2f}s | {timer.tokens} tokens in {timer.elapsed:.2f}s | "
+              f"{timer.tokens_per_sec:.1f} tok/s | {timer.requests} requests]")
+        print(f"  [prompt {turn.prompt_tokens} tokens: {turn.new_tokens_encoded} new, "
+              f"{turn.reused_tokens} reused, {turn.evicted_tokens} evicted{cost}]")
+
+    try:
+        while True:
+            question = await read_line(loop, "\nYou: ")
+            if not question.strip():
+                continue
+            if question.strip() == "/reset":
+                session.reset()
+                print("(conversation reset)")
+                continue
+            await reply(session.add_user(question))
+    finally:
+        if session.turns:
+            print(f"\nSession: {session.summary()}")
+
+
+def interactive_demo(checkpoint_name, max_tokens=200, first_chunk=16, max_chunk=64,
+                     token_budget=2048, policy="window", refresh_sampler=False, character="Beethoven"):
+    """CLI for chatting with distilled student model"""
+    try:
+        asyncio.run(interactive_demo_async(checkpoint_name, max_tokens, first_chunk, max_chunk,
+                                           token_budget, policy, refresh_sampler, character))
+    except (KeyboardInterrupt, EOFError):
+        print("\nGoodbye!")
 
 
 if __name__ == "__main__":
-    import sys
-    checkpoint = sys.argv[1] if len(sys.argv) > 1 else "beethoven_prompt_distillation_final_checkpoint"
-    interactive_demo(checkpoint)
+    parser = argparse.ArgumentParser(description="Chat with the distilled student model")
+    parser.add_argument("checkpoint", nargs="?", default=None,
+                        help="Student checkpoint (default: <character>_prompt_distillation_final_checkpoint)")
+    parser.add_argument("--character", default="Beethoven", help="Character from config/characters.yaml")
+    parser.add_argument("--max-tokens", type=int, default=200, help="Reply length limit")
+    parser.add_argument("--first-chunk", type=int, default=16,
+                        help="Tokens in the first request (lower = faster first token)")
+    parser.add_argument("--max-chunk", type=int, default=64, help="Largest continuation request")
+    parser.add_argument("--token-budget", type=int, default=2048,
+                        help="Max prompt + reply tokens per turn (history is evicted to fit)")
+    parser.add_argument("--policy", choices=POLICIES, default="window",
+                        help="History eviction: drop oldest turns or fold them into a summary")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Save the student weights again instead of reusing the registered sampler")
+    args = parser.parse_args()
+    checkpoint = args.checkpoint or f"{get_character(args.character).checkpoint_prefix}_final_checkpoint"
+    interactive_demo(checkpoint, args.max_tokens, args.first_chunk, args.max_chunk,
+                     args.token_budget, args.policy, args.refresh, args.character)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Step 18: Latency and throughput benchmark - distilled student vs prompted teacher
+
+Replays a query set against the student (no prompt) and the teacher (full
+character prompt) at several concurrency levels and records time-to-first-token,
+end-to-end latency and throughput. Use --backend fake (or TINKER_BACKEND=fake) to
+run offline against fake_tinker (deterministic, no API spend) for regression checks.
+
+Sampling is not streamed, so time-to-first-token is measured with a separate
+probe pass that requests max_tokens=1 for every query at the same concurrency.
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import platform
+import numpy as np
+from tokenizers_cache import get_tokenizer
+from character_registry import get_character
+from tinker_backend import create_service_client, backend_name, model_input, sampling_params
+from sampler_registry import get_sampling_client
+
+STUDENT_BASE_MODEL = "Qwen/Qwen3-4B-Instruct-2507"
+TEACHER_BASE_MODEL = "Qwen/Qwen3-30B-A3B"
+
+
+def load_questions(num_queries, val_file="val.jsonl"):
+    """First N validation questions (cycled if the file is shorter)"""
+    with open(val_file, 'r') as f:
+        questions = [json.loads(line)['messages'][0]['content'] for line in f if line.strip()]
+    return [questions[i % len(questions)] for i in range(num_queries)]
+
+
+def create_clients(checkpoint_name, refresh_sampler=False):
+    """Student and teacher sampling clients for the selected backend"""
+    client = create_service_client()
+    student_client, _ = get_sampling_client(client, checkpoint_name, STUDENT_BASE_MODEL, rank=32,
+                                            refresh=refresh_sampler)
+    teacher_client = client.create_sampling_client(base_model=TEACHER_BASE_MODEL)
+    return student_client, teacher_client
+
+
+async def replay(sampling_client, prompts, concurrency, max_tokens):
+    """
+    Send every prompt with at most `concurrency` in flight.
+
+    Returns:
+        (per-request latencies, per-request completion tokens, wall-clock seconds)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    params = sampling_params(max_tokens)
+    latencies = [0.0] * len(prompts)
+    completion_tokens = [0] * len(prompts)
+
+    async def one(i, prompt):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await sampling_client.sample_async(prompt=prompt, sampling_params=params, num_samples=1)
+            latencies[i] = time.perf_counter() - start
+            completion_tokens[i] = len(result.sequences[0].tokens)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i, p) for i, p in enumerate(prompts)))
+    return latencies, completion_tokens, time.perf_counter() - wall_start
+
+
+def summarize(latencies, ttfts, completion_tokens, wall_seconds, prompt_tokens):
+    latencies = np.array(latencies)
+    summary = {
+        "requests": len(latencies),
+        "prompt_tokens_mean": float(np.mean(prompt_tokens)),
+        "completion_tokens_mean": float(np.mean(completion_tokens)),
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_p90": float(np.percentile(latencies, 90)),
+        "latency_p99": float(np.percentile(latencies, 99)),
+        "requests_per_sec": len(latencies) / wall_seconds,
+        "output_tokens_per_sec": float(np.sum(completion_tokens)) / wall_seconds,
+        "wall_seconds": wall_seconds,
+    }
+    if ttfts is not None:
+        summary["ttft_p50"] = float(np.percentile(ttfts, 50))
+        summary["ttft_p90"] = float(np.percentile(ttfts, 90))
+    return summary
+
+
+async def run_benchmark(checkpoint_name, concurrency_levels=(1, 4, 16, 64),
+                        num_queries=64, max_tokens=200, measure_ttft=True,
+                        output_file="latency_report.json", refresh_sampler=False,
+                        character="Beethoven"):
+    """
+    Benchmark student vs teacher across concurrency levels.
+
+    Args:
+        checkpoint_name: Student checkpoint
+        concurrency_levels: In-flight request limits to sweep
+        num_queries: Queries replayed per model and level
+        max_tokens: Generation length per query
+        measure_ttft: Run the max_tokens=1 probe pass
+        output_file: JSON report path
+        refresh_sampler: Save the student weights again instead of reusing the registered sampler
+        character: Character from config/characters.yaml (teacher prompt and speaker)
+    """
+    character = get_character(character)
+    backend = backend_name()
+    print("=" * 80)
+    print(f"Latency benchmark ({backend} backend): {num_queries} queries, "
+          f"concurrency {list(concurrency_levels)}")
+    print("=" * 80)
+
+    tokenizer = get_tokenizer()
+    student_client, teacher_client = create_clients(checkpoint_name, refresh_sampler)
+
+    questions = load_questions(num_queries)
+    character_prompt = character.prompt()
+    prompt_tokens = {
+        "student": [tokenizer.encode(f"<|user|>\n{q}\n<|assistant|>\n") for q in questions],
+        "teacher": [tokenizer.encode(character.teacher_prompt(character_prompt, q)) for q in questions],
+    }
+    clients = {"student": student_client, "teacher": teacher_client}
+
+    report = {
+        "backend": backend,
+        "checkpoint": checkpoint_name,
+        "character": character.name,
+        "num_queries": num_queries,
+        "max_tokens": max_tokens,
+        "machine": {"platform": platform.platform(), "python": platform.python_version()},
+        "results": {"student": {}, "teacher": {}},
+    }
+
+    for model in ("student", "teacher"):
+        prompts = [model_input(t) for t in prompt_tokens[model]]
+        for level in concurrency_levels:
+            latencies, completion_tokens, wall = await replay(clients[model], prompts, level, max_tokens)
+            ttfts = None
+            if measure_ttft:
+                ttfts, _, _ = await replay(clients[model], prompts, level, 1)
+            summary = summarize(latencies, ttfts, completion_tokens, wall,
+                                [len(t) for t in prompt_tokens[model]])
+            report["results"][model][str(level)] = summary
+            print(f"{model:8s} c={level:<4d} p50={summary['latency_p50']:.3f}s "
+                  f"p90={summary['latency_p90']:.3f}s "
+                  f"ttft_p50={summary.get('ttft_p50', float('nan')):.3f}s "
+                  f"{summary['requests_per_sec']:.2f} req/s {summary['output_tokens_per_sec']:.0f} tok/s")
+
+    # Student vs teacher at each level
+    report["comparison"] = {}
+    for level in concurrency_levels:
+        s, t = report["results"]["student"][str(level)], report["results"]["teacher"][str(level)]
+        report["comparison"][str(level)] = {
+            "latency_p50_speedup": t["latency_p50"] / s["latency_p50"],
+            "throughput_ratio": s["requests_per_sec"] / t["requests_per_sec"],
+            "ttft_p50_speedup": (t["ttft_p50"] / s["ttft_p50"]) if measure_ttft else None,
+            "prompt_tokens_saved": t["prompt_tokens_mean"] - s["prompt_tokens_mean"],
+        }
+
+    print("\n" + "=" * 80)
+    print("STUDENT VS TEACHER")
+    print("=" * 80)
+    for level, c in report["comparison"].items():
+        ttft = f", TTFT {c['ttft_p50_speedup']:.2f}x faster" if c["ttft_p50_speedup"] else ""
+        print(f"c={level:<4s} latency {c['latency_p50_speedup']:.2f}x faster, "
+              f"throughput {c['throughput_ratio']:.2f}x{ttft}")
+
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Report saved to {output_file}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark: student vs teacher")
+    parser.add_argument("checkpoint", nargs="?", default=None,
+                        help="Student checkpoint (default: <character>_prompt_distillation_final_checkpoint)")
+    parser.add_argument("--character", default="Beethoven", help="Character from config/characters.yaml")
+    parser.add_argument("--backend", choices=["tinker", "fake"], default=backend_name(),
+                        help="Overrides TINKER_BACKEND")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--num-queries", type=int, default=64)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--no-ttft", action="store_true", help="Skip the max_tokens=1 probe pass")
+    parser.add_argument("--output", default="latency_report.json")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Save the student weights again instead of reusing the registered sampler")
+    args = parser.parse_args()
+    os.environ["TINKER_BACKEND"] = args.backend
+    asyncio.run(run_benchmark(
+        args.checkpoint or f"{get_character(args.character).checkpoint_prefix}_final_checkpoint",
+        concurrency_levels=[int(c) for c in args.concurrency.split(",")],
+        num_queries=args.num_queries,
+        max_tokens=args.max_tokens,
+        measure_ttft=not args.no_ttft,
+        output_file=args.output,
+        refresh_sampler=args.refresh,
+        character=args.character
+    ))
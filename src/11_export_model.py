@@ -1,47 +1,73 @@
 #!/usr/bin/env python3
 """Step 19: Export model with download"""
 
-import tinker
+import argparse
+from tinker_backend import create_service_client
+from sampler_registry import get_sampling_client
+from checkpoint_download import download_checkpoint
+from lora_artifacts import prepare_artifacts
+from character_registry import get_character
 
 
-def export_model(checkpoint_name, output_file="model-checkpoint.tar.gz"):
-    """Download final model checkpoint archive"""
+def export_model(checkpoint_name, output_file="model-checkpoint.tar.gz", refresh_sampler=False,
+                 expected_sha256=None, extract_dir=None, base_model=None, merged_dir=None):
+    """
+    Download final model checkpoint archive
 
-    client = tinker.ServiceClient()
+    Streams to <output_file>.part, resumes an interrupted download on rerun,
+    verifies size/checksum and renames into place only when complete.
+
+    Args:
+        checkpoint_name: Student checkpoint to export
+        output_file: Archive path
+        refresh_sampler: Save the student weights again instead of reusing the registered sampler
+        expected_sha256: Optional digest to verify the archive against
+        extract_dir: Also extract the adapter here (see lora_artifacts.py)
+        base_model: Also merge the adapter into this base model (directory or HF repo)
+        merged_dir: Output directory for the merged model
+    """
+
+    client = create_service_client()
 
     # Create REST client for downloading
     rest_client = client.create_rest_client()
 
-    # Load the checkpoint to get its path
-    training_client = client.create_lora_training_client(
-        base_model="Qwen/Qwen3-4B-Instruct-2507",
-        rank=32
-    )
-    training_client.load_state(name=checkpoint_name)
-
-    # Get sampling client to access model path
-    sampling_client = training_client.save_weights_and_get_sampling_client(
-        name=f"{checkpoint_name}_export"
-    )
+    # Sampler weights path for the checkpoint (reused from the registry when already saved)
+    _, model_path = get_sampling_client(client, checkpoint_name, refresh=refresh_sampler)
 
     # Download checkpoint archive
-    print(f"Downloading {sampling_client.model_path}...")
-    future = rest_client.download_checkpoint_archive_from_tinker_path(
-        sampling_client.model_path
-    )
-
-    with open(output_file, "wb") as f:
-        f.write(future.result())
+    print(f"Downloading {model_path}...")
+    result = download_checkpoint(rest_client, model_path, output_file, expected_sha256)
 
     print(f"Model saved to {output_file}")
+    print(f"Size: {result['bytes'] / (1024 * 1024):.1f} MB")
+    print(f"SHA-256: {result['sha256']}")
+    if result['mb_per_sec']:
+        print(f"Throughput: {result['mb_per_sec']:.2f} MB/s over {result['seconds']:.1f}s"
+              + (f" (resumed at {result['resumed_from'] / 1e6:.1f} MB)" if result['resumed_from'] else ""))
 
-    # Get file size
-    import os
-    size_mb = os.path.getsize(output_file) / (1024 * 1024)
-    print(f"Size: {size_mb:.1f} MB")
+    # Local artifacts: extracted adapter and, optionally, a merged model directory
+    if extract_dir or base_model:
+        result['artifacts'] = prepare_artifacts(output_file, extract_dir or "student_adapter",
+                                                base_model, merged_dir)
+    return result
 
 
 if __name__ == "__main__":
-    import sys
-    checkpoint = sys.argv[1] if len(sys.argv) > 1 else "beethoven_prompt_distillation_final"
-    export_model(checkpoint)
+    parser = argparse.ArgumentParser(description="Download the trained LoRA checkpoint archive")
+    parser.add_argument("checkpoint", nargs="?", default=None,
+                        help="Student checkpoint (default: <character>_prompt_distillation_final_checkpoint)")
+    parser.add_argument("--character", default="Beethoven", help="Character from config/characters.yaml")
+    parser.add_argument("--output", default="model-checkpoint.tar.gz")
+    parser.add_argument("--sha256", default=None, help="Expected archive digest")
+    parser.add_argument("--extract-dir", default=None, help="Extract the LoRA adapter into this directory")
+    parser.add_argument("--merge-base", default=None,
+                        help="Merge the adapter into this base model (directory or HF repo, e.g. "
+                             "Qwen/Qwen3-4B-Instruct-2507)")
+    parser.add_argument("--merged-dir", default="student_merged", help="Merged model output directory")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Save the student weights again instead of reusing the registered sampler")
+    args = parser.parse_args()
+    checkpoint = args.checkpoint or f"{get_character(args.character).checkpoint_prefix}_final_checkpoint"
+    export_model(checkpoint, args.output, args.refresh, args.sha256,
+                 args.extract_dir, args.merge_base, args.merged_dir)
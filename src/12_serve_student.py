@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Step 20: Local inference server for the distilled student
+
+OpenAI-compatible chat endpoint in front of the student sampling clients, with
+dynamic micro-batching (see micro_batching.py). Standard library only.
+
+The request's "model" picks the character: the default model (beethoven-student,
+served from the checkpoint argument), any --adapter NAME=CHECKPOINT, or any
+character in config/characters.yaml. Adapters are loaded on first use and kept
+in an LRU pool of --max-adapters, each with its own batcher (see lora_router.py).
+
+Endpoints:
+    POST /v1/chat/completions   {"model": "Newton", "messages": [...], "max_tokens": 200, "n": 1}
+    GET  /metrics               Per-adapter hit rate, warm-up, queue, batching and latency percentiles
+    GET  /health
+
+Overload returns 429 with Retry-After instead of queueing without bound.
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from tokenizers_cache import get_tokenizer
+from tinker_backend import create_service_client
+from micro_batching import QueueFull
+from lora_router import LoRARouter, UnknownAdapter
+
+MODEL_NAME = "beethoven-student"
+MAX_BODY_BYTES = 1 << 20
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, param=None):
+        super().__init__(message)
+        self.status = status
+        self.param = param
+
+
+def error_body(status, message, param=None):
+    """OpenAI-style error payload"""
+    error_type = {429: "rate_limit_error", 500: "server_error"}.get(status, "invalid_request_error")
+    return {"error": {"message": message, "type": error_type, "param": param, "code": None}}
+
+
+def request_number(request, name, default, low, high=None, integer=False):
+    """Numeric request field within [low, high] (default when absent); 400 otherwise"""
+    value = request.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int if integer else (int, float)):
+        raise HTTPError(400, f"'{name}' must be {'an integer' if integer else 'a number'}", param=name)
+    if value < low or (high is not None and value > high):
+        bounds = f"between {low} and {high}" if high is not None else f"at least {low}"
+        raise HTTPError(400, f"'{name}' must be {bounds}", param=name)
+    return value
+
+
+def format_messages(messages):
+    """Chat messages in the training prompt format, ending with the assistant header"""
+    if not isinstance(messages, list) or not messages:
+        raise HTTPError(400, "'messages' must be a non-empty list")
+    prompt = ""
+    for message in messages:
+        if not isinstance(message, dict) or 'content' not in message:
+            raise HTTPError(400, "each message needs 'role' and 'content'")
+        prompt += f"<|{message.get('role', 'user')}|>\n{message['content']}\n"
+    return prompt + "<|assistant|>\n"
+
+
+class StudentServer:
+    def __init__(self, router, tokenizer, default_max_tokens=200, default_model=MODEL_NAME):
+        self.router = router
+        self.tokenizer = tokenizer
+        self.default_max_tokens = default_max_tokens
+        self.default_model = default_model
+
+    async def chat_completions(self, body):
+        try:
+            request = json.loads(body or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise HTTPError(400, "invalid JSON body")
+        if not isinstance(request, dict):
+            raise HTTPError(400, "request body must be a JSON object")
+
+        model = request.get('model') or self.default_model
+        max_tokens = request_number(request, 'max_tokens', self.default_max_tokens, 1, integer=True)
+        temperature = float(request_number(request, 'temperature', 0.7, 0, 2))
+        n = request_number(request, 'n', 1, 1, 16, integer=True)
+        prompt_tokens = self.tokenizer.encode(format_messages(request.get('messages')))
+
+        # n identical requests are coalesced by the adapter's batcher into one num_samples=n call
+        try:
+            completions = await asyncio.gather(*(
+                self.router.submit(model, prompt_tokens, max_tokens, temperature) for _ in range(n)
+            ))
+        except UnknownAdapter:
+            raise HTTPError(404, f"unknown model '{model}'")
+
+        choices = []
+        for i, completion in enumerate(completions):
+            choices.append({
+                "index": i,
+                "message": {"role": "assistant",
+                            "content": self.tokenizer.decode(completion.tokens, skip_special_tokens=True)},
+                "finish_reason": "length" if completion.stop_reason == "length" else "stop",
+            })
+        completion_tokens = sum(len(c.tokens) for c in completions)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": len(prompt_tokens),
+                "completion_tokens": completion_tokens,
+                "total_tokens": len(prompt_tokens) + completion_tokens,
+            },
+            "timing": {
+                "queue_seconds": round(max(c.queue_seconds for c in completions), 4),
+                "service_seconds": round(max(c.service_seconds for c in completions), 4),
+                "batch_size": completions[0].batch_size,
+            },
+        }
+
+    async def route(self, method, path, body):
+        path = path.split("?", 1)[0]
+        if path == "/v1/chat/completions":
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            return 200, await self.chat_completions(body)
+        if path == "/metrics" and method == "GET":
+            return 200, self.router.metrics()
+        if path == "/health" and method == "GET":
+            return 200, {"status": "ok", "queued": self.router.queued()}
+        raise HTTPError(404, f"no route for {method} {path}")
+
+    async def handle_connection(self, reader, writer):
+        """Minimal HTTP/1.1 with keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = headers.get("content-length", "0")
+                extra_headers = {}
+                if not length.isdigit():
+                    # The body's extent is unknown, so the connection can't be reused
+                    status, payload = 400, error_body(400, "invalid Content-Length header")
+                    keep_alive = False
+                elif int(length) > MAX_BODY_BYTES:
+                    status, payload = 413, error_body(413, "request body too large")
+                    keep_alive = False
+                else:
+                    length = int(length)
+                    body = await reader.readexactly(length) if length else b""
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  and version == "HTTP/1.1")
+                    try:
+                        status, payload = await self.route(method, path, body)
+                    except HTTPError as e:
+                        status, payload = e.status, error_body(e.status, str(e), e.param)
+                    except QueueFull as e:
+                        status, payload = 429, error_body(429, f"server overloaded: {e}")
+                        extra_headers["Retry-After"] = "1"
+                    except Exception as e:
+                        status, payload = 500, error_body(500, f"{type(e).__name__}: {e}")
+
+                data = json.dumps(payload).encode("utf-8")
+                head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                        "Content-Type: application/json",
+                        f"Content-Length: {len(data)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{k}: {v}" for k, v in extra_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(checkpoint_name, host="127.0.0.1", port=8000, window_ms=10.0, max_batch=32,
+                max_queue=256, max_in_flight=64, max_tokens=200, refresh_sampler=False,
+                adapters=None, max_adapters=8, preload=()):
+    """
+    Serve the student over HTTP until interrupted.
+
+    Args:
+        checkpoint_name: Student checkpoint served as the default model
+        host: Bind address
+        port: Bind port
+        window_ms: Micro-batching collection window
+        max_batch: Max requests per batching window
+        max_queue: Queued requests before returning 429
+        max_in_flight: Max concurrent sampling calls
+        max_tokens: Default completion length
+        refresh_sampler: Save the student weights again instead of reusing the registered sampler
+        adapters: Dict model name -> checkpoint, in addition to the registry characters
+        max_adapters: Resident adapters (LRU) before idle ones are evicted
+        preload: Model names to load before accepting requests (default: the default model)
+    """
+    client = create_service_client()
+    tokenizer = get_tokenizer()
+    router = LoRARouter(client, {MODEL_NAME: checkpoint_name, **(adapters or {})}, max_adapters=max_adapters,
+                        refresh_samplers=refresh_sampler, window_ms=window_ms, max_batch=max_batch,
+                        max_queue=max_queue, max_in_flight=max_in_flight)
+    for name in preload or (MODEL_NAME,):
+        await router.warm(name)
+    app = StudentServer(router, tokenizer, default_max_tokens=max_tokens)
+
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print("=" * 80)
+    print(f"✓ Serving {MODEL_NAME} ({checkpoint_name}) on http://{host}:{port}/v1/chat/completions")
+    print(f"  other models: {', '.join(sorted(adapters)) + ' + ' if adapters else ''}"
+          f"characters in config/characters.yaml (up to {max_adapters} resident)")
+    print(f"  batching window {window_ms}ms, max batch {max_batch}, queue {max_queue}, "
+          f"in-flight {max_in_flight} per adapter")
+    print("=" * 80)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await router.close()
+
+
+def parse_adapter(value):
+    name, sep, checkpoint = value.partition("=")
+    if not sep or not name or not checkpoint:
+        raise argparse.ArgumentTypeError(f"expected NAME=CHECKPOINT, got '{value}'")
+    return name, checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible server for the distilled student")
+    parser.add_argument("checkpoint", nargs="?", default="beethoven_prompt_distillation_final_checkpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--window-ms", type=float, default=10.0, help="Micro-batching window")
+    parser.add_argument("--max-batch", type=int, default=32, help="Max requests per window")
+    parser.add_argument("--max-queue", type=int, default=256, help="Queued requests before 429")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Max concurrent sampling calls")
+    parser.add_argument("--max-tokens", type=int, default=200, help="Default completion length")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Save the student weights again instead of reusing the registered sampler")
+    parser.add_argument("--adapter", type=parse_adapter, action="append", default=[], metavar="NAME=CHECKPOINT",
+                        help="Serve a checkpoint under a model name (repeatable)")
+    parser.add_argument("--max-adapters", type=int, default=8, help="Resident adapters (LRU)")
+    parser.add_argument("--preload", action="append", default=[], metavar="NAME",
+                        help="Load a model at startup instead of on first request (repeatable)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.checkpoint, args.host, args.port, args.window_ms, args.max_batch,
+                          args.max_queue, args.max_in_flight, args.max_tokens, args.refresh,
+                          dict(args.adapter), args.max_adapters, args.preload))
+    except KeyboardInterrupt:
+        print("\nServer stopped")
@@ -0,0 +1,206 @@
+"""
+Parallel, cached per-character filtering of fnlp/character-llm-data.
+
+Rows are matched with a batched `Dataset.filter` (optionally across `num_proc`
+worker processes), looking only at the columns that identify the character
+(prompt / setting / name ...) instead of serializing whole rows to JSON. The
+matching subset is saved as Arrow with `save_to_disk`, keyed by the source
+files, character and columns, so later runs load it memory-mapped without
+touching the source corpus (`refresh=True` rebuilds it).
+"""
+
+import os
+import json
+import glob
+import time
+import shutil
+import hashlib
+import argparse
+from datasets import load_dataset, load_from_disk
+
+DATASET_NAME = "fnlp/character-llm-data"
+DATA_FILES = "prompted/prompted_agent_dialogue_*.jsonl"
+CACHE_ROOT = os.path.join("data", "character_subsets")
+
+# Columns that name or set up the character; long reply bodies are not scanned
+CHARACTER_COLUMNS = ("character", "name", "role", "source", "setting", "background", "prompt")
+
+ROWS_PER_PROC = 50_000
+
+
+def cache_root():
+    return os.environ.get("CHARACTER_SUBSET_CACHE", CACHE_ROOT)
+
+
+def search_columns(dataset, columns=None):
+    """Requested columns that exist, else the default character columns, else all string columns"""
+    names = dataset.column_names
+    if columns:
+        missing = [c for c in columns if c not in names]
+        if missing:
+            raise ValueError(f"Columns not in dataset: {missing} (available: {names})")
+        return list(columns)
+    selected = [c for c in CHARACTER_COLUMNS if c in names]
+    if selected:
+        return selected
+    return [name for name, feature in dataset.features.items()
+            if getattr(feature, "dtype", None) in ("string", "large_string")]
+
+
+def default_num_proc(num_rows):
+    """Worker processes worth starting for num_rows (process startup dominates small inputs)"""
+    return max(1, min(os.cpu_count() or 1, -(-num_rows // ROWS_PER_PROC)))
+
+
+def _matches(*columns, needle):
+    """Batched filter function: one bool per row, True if any column contains needle"""
+    keep = []
+    for values in zip(*columns):
+        keep.append(any(value is not None and needle in (value if isinstance(value, str) else str(value)).lower()
+                        for value in values))
+    return keep
+
+
+def filter_character(dataset, character, columns=None, num_proc=None, batch_size=1000):
+    """
+    Rows of dataset that mention character in the search columns.
+
+    Args:
+        dataset: datasets.Dataset
+        character: Name to match (case-insensitive substring)
+        columns: Columns to search (default: see search_columns)
+        num_proc: Worker processes (default: scaled to the dataset size and CPU count)
+        batch_size: Rows per filter batch
+
+    Returns:
+        Filtered datasets.Dataset
+    """
+    columns = search_columns(dataset, columns)
+    num_proc = num_proc or default_num_proc(len(dataset))
+    return dataset.filter(
+        _matches,
+        batched=True,
+        batch_size=batch_size,
+        input_columns=columns,
+        fn_kwargs={"needle": character.lower()},
+        num_proc=num_proc if num_proc > 1 else None,
+        desc=f"Filtering '{character}'",
+    )
+
+
+def load_corpus(data_files=DATA_FILES, data_dir=None, split="train"):
+    """One split of the character-llm corpus"""
+    if data_dir:
+        dataset = load_dataset(DATASET_NAME, data_dir=data_dir)
+    else:
+        dataset = load_dataset(DATASET_NAME, data_files=data_files)
+    return dataset[split] if split in dataset else dataset[list(dataset.keys())[0]]
+
+
+def stream_corpus(data_files=DATA_FILES, data_dir=None, local_dir=None, split="train"):
+    """
+    The corpus as an IterableDataset: shards are opened and read lazily, nothing is
+    downloaded or materialized up front.
+
+    Args:
+        data_files: Corpus file pattern (relative to the repo, or to local_dir)
+        data_dir: Corpus subdirectory instead of data_files
+        local_dir: Offline copy: a clone of the dataset repo or a save_to_disk directory
+        split: Split to stream
+    """
+    if local_dir is None:
+        if data_dir:
+            dataset = load_dataset(DATASET_NAME, data_dir=data_dir, streaming=True)
+        else:
+            dataset = load_dataset(DATASET_NAME, data_files=data_files, streaming=True)
+        return dataset[split] if split in dataset else dataset[list(dataset.keys())[0]]
+
+    if os.path.exists(os.path.join(local_dir, "dataset_info.json")) or \
+            os.path.exists(os.path.join(local_dir, "dataset_dict.json")):
+        dataset = load_from_disk(local_dir)
+        if hasattr(dataset, "keys"):
+            dataset = dataset[split] if split in dataset else dataset[list(dataset.keys())[0]]
+        return dataset.to_iterable_dataset()
+
+    pattern = os.path.join(local_dir, data_dir, "*.jsonl") if data_dir else os.path.join(local_dir, data_files)
+    files = sorted(glob.glob(pattern))
+    if not files:
+        raise FileNotFoundError(f"No corpus files match {pattern}")
+    return load_dataset("json", data_files=files, split="train", streaming=True)
+
+
+def subset_path(character, data_files=DATA_FILES, data_dir=None, columns=None, root=None):
+    """Cache directory for a (source, character, columns) combination"""
+    key = json.dumps([DATASET_NAME, data_files, data_dir, character.lower(), sorted(columns or [])])
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    slug = "".join(c if c.isalnum() else "_" for c in character.lower())
+    return os.path.join(root or cache_root(), f"{slug}-{digest}")
+
+
+def load_character_subset(character="beethoven", data_files=DATA_FILES, data_dir=None, dataset=None,
+                          columns=None, num_proc=None, refresh=False, root=None):
+    """
+    Cached per-character subset of the corpus.
+
+    Args:
+        character: Name to match
+        data_files: Corpus file pattern (ignored when data_dir is given)
+        data_dir: Corpus subdirectory to load instead of data_files
+        dataset: Already-loaded corpus split (skips load_dataset on a cache miss)
+        columns: Columns to search
+        num_proc: Filter worker processes
+        refresh: Rebuild even if a cached subset exists
+        root: Cache root directory (default: $CHARACTER_SUBSET_CACHE or data/character_subsets)
+
+    Returns:
+        (subset Dataset, info dict with source_rows, rows, columns, cached, seconds)
+    """
+    path = subset_path(character, data_files, data_dir, columns, root)
+    info_file = os.path.join(path, "subset_info.json")
+    start = time.time()
+
+    if not refresh and os.path.exists(info_file):
+        subset = load_from_disk(path)
+        with open(info_file, 'r') as f:
+            info = json.load(f)
+        info.update(cached=True, seconds=time.time() - start, path=path)
+        return subset, info
+
+    if dataset is None:
+        dataset = load_corpus(data_files, data_dir)
+    searched = search_columns(dataset, columns)
+    subset = filter_character(dataset, character, searched, num_proc)
+
+    # Write next to the final location and rename, so an interrupted save is never loaded
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    subset.save_to_disk(tmp_path)
+    info = {"character": character, "source_rows": len(dataset), "rows": len(subset), "columns": searched}
+    with open(os.path.join(tmp_path, "subset_info.json"), 'w') as f:
+        json.dump(info, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+    subset = load_from_disk(path)
+    info.update(cached=False, seconds=time.time() - start, path=path)
+    return subset, info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build (or load) the cached per-character subset")
+    parser.add_argument("character", nargs="?", default="beethoven")
+    parser.add_argument("--data-files", default=DATA_FILES)
+    parser.add_argument("--data-dir", default=None, help="Corpus subdirectory instead of --data-files")
+    parser.add_argument("--columns", default=None, help="Comma-separated columns to search")
+    parser.add_argument("--num-proc", type=int, default=None)
+    parser.add_argument("--refresh", action="store_true", help="Rebuild the cached subset")
+    args = parser.parse_args()
+
+    subset, info = load_character_subset(
+        args.character, args.data_files, args.data_dir,
+        columns=args.columns.split(",") if args.columns else None,
+        num_proc=args.num_proc, refresh=args.refresh,
+    )
+    source = "cache" if info['cached'] else f"{info['source_rows']} source rows"
+    print(f"✓ {info['rows']} '{args.character}' rows from {source} in {info['seconds']:.2f}s "
+          f"(columns: {', '.join(info['columns'])}) -> {info['path']}")
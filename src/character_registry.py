@@ -0,0 +1,123 @@
+"""
+Registry of distillable characters.
+
+Each character (config/characters.yaml) has a character prompt, the speaker
+label the teacher completes after, and a bank of question templates with
+(optionally weighted) slot values; question_generator.py expands them.
+03_generate_teacher_data.py, 06_train_student_model.py and multi_character.py
+look characters up here instead of hard-coding Beethoven.
+"""
+
+import os
+import re
+import string
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+import yaml
+
+DEFAULT_REGISTRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "characters.yaml")
+CHARACTER_DATA_ROOT = os.path.join("data", "characters")
+
+
+@dataclass
+class Character:
+    name: str
+    speaker: str
+    templates: List[str]
+    slots: Dict[str, List[str]] = field(default_factory=dict)
+    prompt_file: Optional[str] = None
+    template_weights: Optional[List[float]] = None
+    slot_weights: Optional[Dict[str, List[float]]] = None
+
+    def __post_init__(self):
+        if self.template_weights is None:
+            self.template_weights = [1.0] * len(self.templates)
+        if self.slot_weights is None:
+            self.slot_weights = {slot: [1.0] * len(values) for slot, values in self.slots.items()}
+        for template in self.templates:
+            missing = [name for name in template_slots(template) if name not in self.slots]
+            if missing:
+                raise ValueError(f"{self.name}: template {template!r} uses undefined slots {missing}")
+
+    @property
+    def slug(self):
+        return re.sub(r"[^a-z0-9]+", "_", self.name.lower()).strip("_")
+
+    @property
+    def checkpoint_prefix(self):
+        """Experiment / checkpoint name prefix, e.g. beethoven_prompt_distillation"""
+        return f"{self.slug}_prompt_distillation"
+
+    def prompt(self):
+        """Full character prompt the teacher is conditioned on"""
+        if self.prompt_file:
+            with open(self.prompt_file, 'r') as f:
+                return f.read().strip()
+        from character_prompts import get_character_prompt
+        return get_character_prompt(self.name)
+
+    def teacher_prompt(self, character_prompt, question):
+        return f"{character_prompt}\n\nUser: {question}\n{self.speaker}:"
+
+
+def template_slots(template):
+    """Slot names used by a template, in order of first use"""
+    return list(dict.fromkeys(name for _, name, _, _ in string.Formatter().parse(template) if name))
+
+
+def _weighted(spec, key):
+    """(values, weights) from a list (equal weights) or a {value: weight} mapping"""
+    if isinstance(spec, dict):
+        return list(spec), [float(weight) for weight in spec.values()]
+    values = [item[key] if isinstance(item, dict) else item for item in spec]
+    weights = [float(item.get('weight', 1)) if isinstance(item, dict) else 1.0 for item in spec]
+    return values, weights
+
+
+@lru_cache(maxsize=None)
+def load_characters(path=DEFAULT_REGISTRY):
+    """Characters by name, in registry order"""
+    with open(path, 'r') as f:
+        entries = yaml.safe_load(f) or {}
+    base_dir = os.path.dirname(os.path.abspath(path))
+    characters = {}
+    for name, entry in entries.items():
+        prompt_file = entry.get('prompt_file')
+        templates, template_weights = _weighted(entry['templates'], 'template')
+        slots, slot_weights = {}, {}
+        for slot, spec in (entry.get('slots') or {}).items():
+            slots[slot], slot_weights[slot] = _weighted(spec, 'value')
+        characters[name] = Character(
+            name=name,
+            speaker=entry.get('speaker', name),
+            templates=templates,
+            slots=slots,
+            prompt_file=os.path.join(base_dir, prompt_file) if prompt_file else None,
+            template_weights=template_weights,
+            slot_weights=slot_weights,
+        )
+    return characters
+
+
+def get_character(name, path=DEFAULT_REGISTRY):
+    """Look up a character by name or slug (case-insensitive)"""
+    characters = load_characters(path)
+    for character in characters.values():
+        if name.lower() in (character.name.lower(), character.slug):
+            return character
+    raise KeyError(f"Unknown character '{name}' (registered: {', '.join(characters)})")
+
+
+def character_paths(character, root=CHARACTER_DATA_ROOT):
+    """Per-character data files used by multi-character runs"""
+    directory = os.path.join(root, character.slug)
+    return {
+        "dir": directory,
+        "teacher": os.path.join(directory, "teacher_data.jsonl"),
+        "dedup": os.path.join(directory, "teacher_data_dedup.jsonl"),
+        "dedup_report": os.path.join(directory, "dedup_report.json"),
+        "train": os.path.join(directory, "train.jsonl"),
+        "val": os.path.join(directory, "val.jsonl"),
+        "train_log": os.path.join(directory, "train.log"),
+    }
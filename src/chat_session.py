@@ -0,0 +1,192 @@
+"""
+Multi-turn chat context with incremental token reuse.
+
+The conversation is kept as an already-tokenized buffer in the training format
+(`<|user|>\\n...\\n<|assistant|>\\n...\\n`). Each turn encodes only its new text:
+the user message is tokenized once when added, and the assistant reply is
+appended as the sampled token IDs themselves, so the transcript is never
+re-tokenized.
+
+When the buffer would exceed the token budget, old exchanges are evicted
+from the front:
+- window: drop the oldest exchanges
+- summary: fold the dropped exchanges into a short summary turn at the start
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Callable
+
+POLICIES = ("window", "summary")
+
+
+@dataclass
+class Segment:
+    """One tokenized span of the buffer"""
+    kind: str  # "user", "assistant" or "summary"
+    text: str
+    tokens: List[int] = field(default_factory=list)
+
+
+@dataclass
+class TurnCost:
+    """Prompt-token accounting for one turn"""
+    turn: int
+    prompt_tokens: int
+    new_tokens_encoded: int
+    reused_tokens: int
+    evicted_tokens: int
+    prompt_cost: float = None
+
+
+def extractive_summary(segments, max_chars=400):
+    """Default summarizer: the opening sentence of each dropped message"""
+    parts = []
+    for segment in segments:
+        first = segment.text.strip().split(". ")[0].strip()
+        if segment.kind == "summary":
+            parts.append(first)
+        else:
+            parts.append(f"{'User' if segment.kind == 'user' else 'You'}: {first[:120]}")
+    return "; ".join(parts)[-max_chars:]
+
+
+class ChatSession:
+    """
+    Token-level conversation buffer under a budget.
+
+    Args:
+        tokenizer: HuggingFace tokenizer used for the prompt format
+        token_budget: Max prompt tokens sent per turn (history + new message)
+        reserve_tokens: Headroom kept free for the reply
+        policy: "window" or "summary"
+        summarizer: fn(list of Segment) -> str, used by the summary policy
+        prompt_price_per_1m: Optional USD per 1M prompt tokens for cost reporting
+    """
+
+    def __init__(self, tokenizer, token_budget=2048, reserve_tokens=200, policy="window",
+                 summarizer: Callable = extractive_summary, prompt_price_per_1m=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}' (expected one of {POLICIES})")
+        if token_budget <= reserve_tokens:
+            raise ValueError(f"token_budget ({token_budget}) must be larger than reserve_tokens ({reserve_tokens})")
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+        self.reserve_tokens = reserve_tokens
+        self.policy = policy
+        self.summarizer = summarizer
+        self.prompt_price_per_1m = prompt_price_per_1m
+        self.newline = self._encode("\n")
+        self.reset()
+
+    def reset(self):
+        self.segments: List[Segment] = []
+        self.buffer: List[int] = []
+        self.turns: List[TurnCost] = []
+
+    def _encode(self, text):
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def _append(self, segment):
+        self.segments.append(segment)
+        self.buffer.extend(segment.tokens)
+
+    def add_user(self, text):
+        """
+        Encode and append a user message (ending with the assistant header).
+
+        Returns:
+            Prompt token IDs to sample the reply from
+        """
+        segment = Segment("user", text, self._encode(f"<|user|>\n{text}\n<|assistant|>\n"))
+        self._append(segment)
+        evicted, summary_encoded = self._fit()
+
+        prompt_tokens = len(self.buffer)
+        new_tokens = min(prompt_tokens, len(segment.tokens) + summary_encoded)
+        cost = prompt_tokens * self.prompt_price_per_1m / 1e6 if self.prompt_price_per_1m is not None else None
+        self.turns.append(TurnCost(len(self.turns) + 1, prompt_tokens, new_tokens,
+                                   prompt_tokens - new_tokens, evicted, cost))
+        return list(self.buffer)
+
+    def add_assistant(self, tokens, text=None):
+        """Append the sampled reply tokens as-is (plus the turn separator)"""
+        if text is None:
+            text = self.tokenizer.decode(tokens, skip_special_tokens=True)
+        self._append(Segment("assistant", text, list(tokens) + self.newline))
+
+    def _fit(self):
+        """
+        Evict old exchanges until the prompt fits the budget.
+
+        Returns:
+            (tokens evicted, tokens newly encoded for a summary)
+        """
+        limit = self.token_budget - self.reserve_tokens
+        if len(self.buffer) <= limit:
+            return 0, 0
+
+        carried = self.segments[0] if self.segments[0].kind == "summary" else None
+        history = self.segments[1:-1] if carried else self.segments[:-1]
+        current = self.segments[-1]
+
+        def total(head):
+            return sum(len(seg.tokens) for seg in head + history) + len(current.tokens)
+
+        def drop_exchange():
+            dropped.append(history.pop(0))
+            while history and history[0].kind == "assistant":
+                dropped.append(history.pop(0))
+
+        # Drop whole exchanges from the front, never the current message
+        dropped = []
+        head = [carried] if carried else []
+        while history and total(head) > limit:
+            drop_exchange()
+
+        summary_encoded = 0
+        if self.policy == "summary" and dropped:
+            # Fold the previous summary and the dropped turns into one summary turn,
+            # dropping further exchanges if the summary itself doesn't fit. A summary
+            # that can't fit at all falls back to the window result (kept history, no summary)
+            window_history = list(history)
+            while True:
+                text = self.summarizer([carried] + dropped if carried else dropped)
+                summary = Segment("summary", text,
+                                  self._encode(f"<|system|>\nEarlier in this conversation: {text}\n"))
+                if total([summary]) <= limit:
+                    head = [summary]
+                    summary_encoded = len(summary.tokens)
+                    break
+                if not history:
+                    history[:] = window_history
+                    break
+                drop_exchange()
+        if head and head[0] is carried and total(head) > limit:
+            head = []
+
+        before = len(self.buffer) - len(current.tokens)
+        self.segments = head + history + [current]
+        # A single message longer than the budget keeps its most recent tokens
+        if len(current.tokens) > limit:
+            current.tokens = current.tokens[-limit:]
+            self.segments = [current]
+        self.buffer = [t for seg in self.segments for t in seg.tokens]
+
+        kept_history = sum(len(seg.tokens) for seg in self.segments[:-1]) - summary_encoded
+        return before - kept_history, summary_encoded
+
+    def summary(self):
+        """Session totals for reporting"""
+        prompt = sum(t.prompt_tokens for t in self.turns)
+        encoded = sum(t.new_tokens_encoded for t in self.turns)
+        report = {
+            "turns": len(self.turns),
+            "context_tokens": len(self.buffer),
+            "prompt_tokens_sent": prompt,
+            "tokens_encoded": encoded,
+            "tokens_reused": sum(t.reused_tokens for t in self.turns),
+            "tokens_evicted": sum(t.evicted_tokens for t in self.turns),
+        }
+        if self.prompt_price_per_1m is not None:
+            report["prompt_cost"] = sum(t.prompt_cost for t in self.turns)
+        return report
@@ -0,0 +1,288 @@
+"""
+Streaming, resumable checkpoint archive download.
+
+The archive is written in fixed-size chunks to `<output>.part` (constant memory),
+hashed while it streams, verified, and only then atomically renamed to the
+final path. An interrupted download keeps its .part file: the next attempt
+resumes from that byte offset with an HTTP Range request (the existing bytes are
+re-hashed first so the checksum still covers the whole file). Servers that
+ignore Range get a clean restart.
+
+A <output>.part.source sidecar records which archive the .part belongs to (the
+Tinker path or URL, plus the server's ETag / Last-Modified). A .part from a
+different archive is discarded instead of resumed, and the validator is sent as
+If-Range so a server whose file changed answers with the full new archive. A 416
+(range not satisfiable) means the .part already holds every byte; it goes
+straight to verification.
+
+Checks:
+- size against Content-Length / Content-Range
+- SHA-256 against an expected digest when one is given
+- MD5 against a single-part ETag when the server provides one
+A <output>.sha256 sidecar is written next to the archive.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.client import IncompleteRead
+
+CHUNK_SIZE = 1 << 20
+
+
+class DownloadError(RuntimeError):
+    """Download failed verification or ran out of retries"""
+
+
+class Progress:
+    """Single-line progress with throughput and ETA, refreshed at most every 0.5s"""
+
+    def __init__(self, total, already=0, enabled=True):
+        self.total = total
+        self.done = already
+        self.resumed_from = already
+        self.start = time.time()
+        self.last = 0.0
+        self.enabled = enabled
+
+    def update(self, num_bytes, force=False):
+        self.done += num_bytes
+        now = time.time()
+        if not self.enabled or (not force and now - self.last < 0.5):
+            return
+        self.last = now
+        rate = (self.done - self.resumed_from) / max(now - self.start, 1e-9)
+        if self.total:
+            eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+            line = (f"  {self.done / 1e6:8.1f} / {self.total / 1e6:.1f} MB "
+                    f"({self.done / self.total:6.1%})  {rate / 1e6:6.2f} MB/s  ETA {eta:5.0f}s")
+        else:
+            line = f"  {self.done / 1e6:8.1f} MB  {rate / 1e6:6.2f} MB/s"
+        print("\r" + line, end="", file=sys.stderr, flush=True)
+
+    def finish(self):
+        self.update(0, force=True)
+        if self.enabled:
+            print(file=sys.stderr)
+        return self.done - self.resumed_from, time.time() - self.start
+
+
+def _hash_existing(path, hashers):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            for h in hashers:
+                h.update(chunk)
+
+
+def _read_source(part_file):
+    """What the .part sidecar says the partial download is ({source, validator}), or None"""
+    try:
+        with open(part_file + ".source", 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _discard(part_file):
+    for path in (part_file, part_file + ".source"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _open(url, offset, validator=None):
+    """
+    Open url starting at a byte offset.
+
+    Args:
+        validator: ETag / Last-Modified of the partial file, sent as If-Range
+
+    Returns:
+        (stream, total size or None, whether the offset was honoured, etag, validator)
+    """
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme == "file":
+        path = urllib.request.url2pathname(parsed.path)
+        f = open(path, 'rb')
+        f.seek(offset)
+        return f, os.path.getsize(path), True, None, None
+
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+        if validator:
+            request.add_header("If-Range", validator)
+    try:
+        response = urllib.request.urlopen(request, timeout=60)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        # Nothing past the offset: the .part is already complete (or longer than the archive)
+        total = e.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+        return io.BytesIO(), int(total) if total.isdigit() else offset, True, None, None
+    raw_etag = response.headers.get("ETag")
+    etag = (raw_etag or "").strip('"') or None
+    if raw_etag and not raw_etag.startswith("W/"):
+        validator = raw_etag
+    else:
+        validator = response.headers.get("Last-Modified")
+    if response.status == 206:
+        content_range = response.headers.get("Content-Range", "")
+        total = content_range.rsplit("/", 1)[-1]
+        return response, int(total) if total.isdigit() else None, True, etag, validator
+    length = response.headers.get("Content-Length")
+    return response, int(length) if length else None, offset == 0, etag, validator
+
+
+def download(url, output_file, expected_sha256=None, retries=5, chunk_size=CHUNK_SIZE, progress=True,
+             source=None):
+    """
+    Stream url to output_file with resume, verification and atomic rename.
+
+    Args:
+        url: http(s):// or file:// URL of the archive
+        output_file: Final path (written only after verification)
+        expected_sha256: Hex digest to verify against (optional)
+        retries: Attempts, each resuming from the bytes already on disk
+        chunk_size: Bytes read/written per chunk
+        progress: Print progress and throughput to stderr
+        source: Identity of the archive (e.g. its Tinker path) a .part must match to be
+            resumed; defaults to the URL (signed URLs change per request, so pass it)
+
+    Returns:
+        Dict with path, bytes, sha256, resumed_from, seconds and MB/s
+    """
+    part_file = output_file + ".part"
+    source = source or url
+    for attempt in range(1, retries + 1):
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        recorded = _read_source(part_file) if offset else None
+        if offset and (not recorded or recorded.get("source") != source):
+            print("Partial download belongs to a different archive; restarting from 0")
+            _discard(part_file)
+            offset, recorded = 0, None
+        try:
+            stream, total, resumed, etag, validator = _open(url, offset, recorded and recorded.get("validator"))
+        except (urllib.error.URLError, OSError) as e:
+            if attempt == retries:
+                raise DownloadError(f"could not open {url}: {e}") from e
+            time.sleep(min(2 ** attempt, 30))
+            continue
+
+        if offset and not resumed:
+            print("Server ignored the resume request; restarting from 0")
+            offset = 0
+        elif offset:
+            print(f"Resuming at {offset / 1e6:.1f} MB")
+
+        sha256, md5 = hashlib.sha256(), hashlib.md5()
+        if offset:
+            _hash_existing(part_file, (sha256, md5))
+        else:
+            with open(part_file + ".source", 'w') as f:
+                json.dump({"source": source, "validator": validator}, f)
+
+        meter = Progress(total, offset, progress)
+        try:
+            with stream, open(part_file, 'ab' if offset else 'wb') as out:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    sha256.update(chunk)
+                    md5.update(chunk)
+                    meter.update(len(chunk))
+        except (urllib.error.URLError, OSError, IncompleteRead) as e:
+            meter.finish()
+            if attempt == retries:
+                raise DownloadError(f"download interrupted after {retries} attempts: {e}") from e
+            print(f"Interrupted ({e}); retrying ({attempt}/{retries})")
+            time.sleep(min(2 ** attempt, 30))
+            continue
+
+        transferred, seconds = meter.finish()
+        size = os.path.getsize(part_file)
+        if total is not None and size != total:
+            if attempt == retries:
+                raise DownloadError(f"size mismatch: got {size} bytes, expected {total}")
+            if size > total:
+                _discard(part_file)  # Stale .part from a different archive
+            print(f"Size mismatch ({size}/{total} bytes); retrying ({attempt}/{retries})")
+            continue
+
+        digest = sha256.hexdigest()
+        if expected_sha256 and digest != expected_sha256.lower():
+            _discard(part_file)
+            raise DownloadError(f"SHA-256 mismatch: got {digest}, expected {expected_sha256}")
+        if etag and len(etag) == 32 and all(c in "0123456789abcdef" for c in etag.lower()) \
+                and md5.hexdigest() != etag.lower():
+            _discard(part_file)
+            raise DownloadError(f"MD5 mismatch against ETag {etag}")
+
+        os.replace(part_file, output_file)
+        _discard(part_file)
+        with open(output_file + ".sha256", 'w') as f:
+            f.write(f"{digest}  {os.path.basename(output_file)}\n")
+
+        return {
+            "path": output_file,
+            "bytes": size,
+            "sha256": digest,
+            "resumed_from": offset,
+            "seconds": seconds,
+            "mb_per_sec": transferred / 1e6 / seconds if seconds > 0 else None,
+        }
+
+    raise DownloadError(f"download failed after {retries} attempts")
+
+
+def write_bytes(data, output_file, expected_sha256=None, chunk_size=CHUNK_SIZE):
+    """
+    Fallback for transports that only return the whole archive in memory:
+    still written in chunks to a temp file, verified and atomically renamed.
+    """
+    part_file = output_file + ".part"
+    digest = hashlib.sha256(data).hexdigest()
+    if expected_sha256 and digest != expected_sha256.lower():
+        raise DownloadError(f"SHA-256 mismatch: got {digest}, expected {expected_sha256}")
+    start = time.time()
+    view = memoryview(data)
+    with open(part_file, 'wb') as out:
+        for i in range(0, len(view), chunk_size):
+            out.write(view[i:i + chunk_size])
+    os.replace(part_file, output_file)
+    with open(output_file + ".sha256", 'w') as f:
+        f.write(f"{digest}  {os.path.basename(output_file)}\n")
+    seconds = time.time() - start
+    return {"path": output_file, "bytes": len(data), "sha256": digest, "resumed_from": 0,
+            "seconds": seconds, "mb_per_sec": len(data) / 1e6 / seconds if seconds > 0 else None}
+
+
+def archive_url(rest_client, tinker_path):
+    """Signed download URL for a checkpoint archive, or None if the client can't provide one"""
+    get_url = getattr(rest_client, "get_checkpoint_archive_url_from_tinker_path", None)
+    if get_url is None:
+        return None
+    response = get_url(tinker_path)
+    if hasattr(response, "result"):
+        response = response.result()
+    return getattr(response, "url", response)
+
+
+def download_checkpoint(rest_client, tinker_path, output_file, expected_sha256=None, progress=True):
+    """Download a Tinker checkpoint archive, streaming from its URL when available"""
+    url = archive_url(rest_client, tinker_path)
+    if url:
+        return download(url, output_file, expected_sha256, progress=progress, source=tinker_path)
+    print("Archive URL unavailable; falling back to in-memory download")
+    data = rest_client.download_checkpoint_archive_from_tinker_path(tinker_path).result()
+    return write_bytes(data, output_file, expected_sha256)
@@ -0,0 +1,117 @@
+"""
+Progressive (chunked) generation for backends without token streaming.
+
+Tinker sampling returns a completion only once it is finished, so a 200-token
+reply shows nothing until all 200 tokens exist. Instead, generate the reply as
+a series of continuation requests: a small first chunk (low time-to-first-token),
+then geometrically larger chunks, each prompted with the original prompt plus
+everything generated so far. Sampling is autoregressive, so continuing from the
+generated prefix samples from the same distribution as one long request.
+"""
+
+import time
+from tinker_backend import model_input, sampling_params
+
+
+class TurnTimer:
+    """Time-to-first-token and decode rate for one generated reply"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.tokens = 0
+        self.requests = 0
+
+    def add(self, num_tokens):
+        self.requests += 1
+        if num_tokens and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += num_tokens
+
+    @property
+    def ttft(self):
+        return (self.first_token_at or time.perf_counter()) - self.start
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    @property
+    def tokens_per_sec(self):
+        return self.tokens / self.elapsed if self.elapsed > 0 else 0.0
+
+
+async def stream_sample(sampling_client, prompt_tokens, max_tokens=200, temperature=0.7,
+                        first_chunk=16, max_chunk=64, stop_token_ids=(), timer=None):
+    """
+    Yield generated tokens chunk by chunk.
+
+    Args:
+        sampling_client: Tinker sampling client
+        prompt_tokens: Prompt token IDs
+        max_tokens: Total tokens to generate
+        temperature: Sampling temperature
+        first_chunk: Size of the first request (keeps time-to-first-token low)
+        max_chunk: Chunk size cap; sizes double from first_chunk up to this
+        stop_token_ids: Token IDs that end the reply (e.g. EOS)
+        timer: Optional TurnTimer updated as chunks arrive
+
+    Yields:
+        List of new token IDs per chunk
+    """
+    generated = []
+    chunk = first_chunk
+    while len(generated) < max_tokens:
+        request = min(chunk, max_tokens - len(generated))
+        result = await sampling_client.sample_async(
+            prompt=model_input(list(prompt_tokens) + generated),
+            sampling_params=sampling_params(request, temperature),
+            num_samples=1
+        )
+        sequence = result.sequences[0]
+        tokens = list(sequence.tokens)
+
+        stopped = False
+        for i, token in enumerate(tokens):
+            if token in stop_token_ids:
+                tokens, stopped = tokens[:i], True
+                break
+
+        if timer is not None:
+            timer.add(len(tokens))
+        if tokens:
+            generated.extend(tokens)
+            yield tokens
+
+        # Fewer tokens than requested (or an explicit stop) means the model finished
+        if stopped or len(sequence.tokens) < request or getattr(sequence, "stop_reason", "length") != "length":
+            return
+        chunk = min(chunk * 2, max_chunk)
+
+
+class IncrementalDecoder:
+    """
+    Turn a growing token list into printable text deltas.
+
+    Decoding token by token can split multi-byte characters, so the whole reply
+    is re-decoded and only the new suffix is emitted; a trailing replacement
+    character is held back until the next chunk completes it.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.tokens = []
+        self.emitted = ""
+
+    def add(self, tokens):
+        self.tokens.extend(tokens)
+        text = self.tokenizer.decode(self.tokens, skip_special_tokens=True)
+        if text.endswith("�"):
+            text = text.rstrip("�")
+        delta = text[len(self.emitted):]
+        self.emitted = text
+        return delta
+
+    @property
+    def text(self):
+        return self.tokenizer.decode(self.tokens, skip_special_tokens=True)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Unified command line for the pipeline stages.
+
+    python src/distill.py gen 5000          # 03_generate_teacher_data.py
+    python src/distill.py dedup             # 04_dedup_teacher_data.py
+    python src/distill.py build teacher_data_dedup.jsonl   # 05_prepare_training_data.py
+    python src/distill.py train             # 06_train_student_model.py
+    python src/distill.py eval --k 4        # 07_evaluate_models.py
+    python src/distill.py metrics --help    # 08_calculate_metrics.py
+
+Each subcommand runs the numbered script's own command line (same arguments,
+same --help). Only the standard library is imported up front; a stage's
+script, and whatever it imports, is loaded only when that stage runs. Heavy
+dependencies (transformers, tinker) are imported inside the functions that use
+them, so --help and argument errors return immediately.
+"""
+
+import os
+import sys
+import runpy
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STAGES = {
+    "gen": ("03_generate_teacher_data.py", "Generate teacher responses with the full character prompt"),
+    "dedup": ("04_dedup_teacher_data.py", "Remove near-duplicate teacher responses (MinHash/LSH)"),
+    "build": ("05_prepare_training_data.py", "Build the student train/val split from teacher data"),
+    "train": ("06_train_student_model.py", "Train the student LoRA"),
+    "eval": ("07_evaluate_models.py", "Evaluate student vs teacher on the validation set"),
+    "metrics": ("08_calculate_metrics.py", "Token and cost metrics from evaluation results"),
+    "demo": ("09_interactive_demo.py", "Chat with the student"),
+    "bench": ("10_benchmark_latency.py", "Latency / throughput benchmark, student vs teacher"),
+    "export": ("11_export_model.py", "Download (and optionally merge) the trained checkpoint"),
+    "serve": ("12_serve_student.py", "OpenAI-compatible server for the students (multi-LoRA)"),
+    "multi": ("multi_character.py", "Generate and train several characters in parallel"),
+    "run": ("pipeline.py", "Run all out-of-date stages (incremental DAG)"),
+}
+
+
+def usage():
+    width = max(len(name) for name in STAGES)
+    lines = ["usage: distill <stage> [stage arguments]", "",
+             "Prompt distillation pipeline. Stage arguments are passed to the stage's script;",
+             "use 'distill <stage> --help' for them.", "", "stages:"]
+    lines += [f"  {name:<{width}}  {description} ({script})" for name, (script, description) in STAGES.items()]
+    return "\n".join(lines)
+
+
+def run_stage(stage, argv):
+    """Run a stage's script as __main__ with argv as its arguments"""
+    script, _ = STAGES[stage]
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+    saved_argv = sys.argv
+    sys.argv = [f"distill {stage}"] + list(argv)
+    try:
+        runpy.run_path(os.path.join(SRC_DIR, script), run_name="__main__")
+    finally:
+        sys.argv = saved_argv
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    if argv[0] not in STAGES:
+        print(f"distill: unknown stage '{argv[0]}'\n\n{usage()}", file=sys.stderr)
+        return 2
+    run_stage(argv[0], argv[1:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
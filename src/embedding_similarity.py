@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Step 15: Embedding similarity between student and teacher responses
+
+Offline scoring stage for 07_evaluate_models.py output. Embeds every response
+with a small CPU-friendly sentence encoder, caches embeddings on disk keyed by
+text hash, and adds cosine similarities to each evaluation record:
+
+- embedding_similarity: cosine(student response, teacher response)
+- style_similarity: cosine(student response, centroid of all teacher responses)
+
+08_calculate_metrics.py reports both when present.
+"""
+
+import os
+import json
+import time
+import glob
+import hashlib
+import argparse
+import numpy as np
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def text_key(text):
+    """Cache key for a text"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache: one directory per encoder, holding .npz shards of
+    (keys, vectors). Each run appends one shard with its newly computed vectors.
+    """
+
+    def __init__(self, cache_dir, model_name):
+        self.directory = os.path.join(cache_dir, model_name.replace("/", "__"))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors = {}
+        for shard in sorted(glob.glob(os.path.join(self.directory, "shard_*.npz"))):
+            data = np.load(shard)
+            for key, vector in zip(data["keys"], data["vectors"]):
+                self.vectors[key.decode("ascii")] = vector
+
+    def add(self, keys, vectors):
+        """Persist new vectors as a new shard"""
+        if not keys:
+            return
+        shard_id = len(glob.glob(os.path.join(self.directory, "shard_*.npz")))
+        path = os.path.join(self.directory, f"shard_{shard_id:05d}.npz")
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys, dtype="S40"), vectors=vectors.astype(np.float32))
+        os.replace(tmp_path, path)
+        self.vectors.update(zip(keys, vectors))
+
+
+class SentenceEncoder:
+    """Mean-pooled, L2-normalized transformer sentence embeddings on CPU"""
+
+    def __init__(self, model_name=DEFAULT_MODEL, max_length=256):
+        import torch
+        from transformers import AutoTokenizer, AutoModel
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self.max_length = max_length
+
+    def encode(self, texts, batch_size=256):
+        """Embed texts in batches; returns an (n, d) float32 array"""
+        torch = self.torch
+        # Sort by length so each batch pads to a similar size
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = [None] * len(texts)
+
+        with torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                idx = order[start:start + batch_size]
+                batch = self.tokenizer(
+                    [texts[i] for i in idx], padding=True, truncation=True,
+                    max_length=self.max_length, return_tensors="pt"
+                )
+                hidden = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                pooled = torch.nn.functional.normalize(pooled, dim=-1)
+                for i, vector in zip(idx, pooled.numpy()):
+                    out[i] = vector
+
+        return np.stack(out).astype(np.float32) if out else np.empty((0, 0), dtype=np.float32)
+
+
+def embed_texts(texts, model_name=DEFAULT_MODEL, cache_dir="embedding_cache", batch_size=256):
+    """Embed texts, computing only those not already in the on-disk cache"""
+    cache = EmbeddingCache(cache_dir, model_name)
+    keys = [text_key(t) for t in texts]
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cache.vectors and key not in missing:
+            missing[key] = text
+
+    print(f"Embeddings: {len(set(keys)) - len(missing)} cached, {len(missing)} to compute")
+    if missing:
+        start = time.time()
+        encoder = SentenceEncoder(model_name)
+        vectors = encoder.encode(list(missing.values()), batch_size=batch_size)
+        cache.add(list(missing.keys()), vectors)
+        print(f"Encoded {len(missing)} texts in {time.time() - start:.1f}s")
+
+    return np.stack([cache.vectors[k] for k in keys])
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def load_results(results_file):
+    with open(results_file, 'r') as f:
+        if results_file.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def save_results(results, results_file):
+    """Write results back in the same format, atomically"""
+    tmp_path = results_file + ".tmp"
+    with open(tmp_path, 'w') as f:
+        if results_file.endswith('.jsonl'):
+            for r in results:
+                f.write(json.dumps(r) + '\n')
+        else:
+            json.dump(results, f, indent=2)
+    os.replace(tmp_path, results_file)
+
+
+def score_results(results_file="evaluation_results.jsonl", model_name=DEFAULT_MODEL,
+                  cache_dir="embedding_cache", batch_size=256):
+    """
+    Add embedding_similarity and style_similarity to every evaluation record.
+
+    Args:
+        results_file: Evaluation results (.json or .jsonl) from 07_evaluate_models.py
+        model_name: HuggingFace sentence encoder
+        cache_dir: Directory for cached embeddings
+        batch_size: Encoder batch size
+    """
+    results = load_results(results_file)
+    if not results:
+        print(f"No records in {results_file}")
+        return results
+
+    start = time.time()
+    n = len(results)
+    texts = [r['student_response'] for r in results] + [r['teacher_response'] for r in results]
+    embeddings = normalize_rows(embed_texts(texts, model_name, cache_dir, batch_size))
+    student, teacher = embeddings[:n], embeddings[n:]
+
+    # Pairwise cosine (row-wise dot product) and similarity to the teacher style centroid
+    pair_similarity = np.einsum('ij,ij->i', student, teacher)
+    centroid = normalize_rows(teacher.mean(axis=0, keepdims=True))[0]
+    style_similarity = student @ centroid
+
+    for record, pair_sim, style_sim in zip(results, pair_similarity, style_similarity):
+        record['embedding_similarity'] = float(pair_sim)
+        record['style_similarity'] = float(style_sim)
+
+    save_results(results, results_file)
+
+    print(f"Scored {n} pairs in {time.time() - start:.1f}s")
+    print(f"Avg embedding similarity: {pair_similarity.mean():.2%}")
+    print(f"Avg style similarity: {style_similarity.mean():.2%}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding similarity for evaluation results")
+    parser.add_argument("results", nargs="?", default="evaluation_results.jsonl")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Sentence encoder")
+    parser.add_argument("--cache-dir", default="embedding_cache", help="Embedding cache directory")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+    score_results(args.results, args.model, args.cache_dir, args.batch_size)
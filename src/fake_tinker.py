@@ -0,0 +1,427 @@
+"""
+In-process stand-in for the Tinker service.
+
+Implements the subset of ServiceClient / SamplingClient / TrainingClient /
+RestClient used by the pipeline scripts, so throughput work can be tested and
+benchmarked offline, deterministically and without API spend. Select it with
+TINKER_BACKEND=fake (see tinker_backend.py).
+
+- Sampling returns random token IDs (deterministic per prompt and seed)
+- Latency = per-request overhead drawn from a configurable distribution
+  + prefill cost per prompt token + decode cost per generated token
+- Capacity is limited by concurrent slots and an optional requests/sec cap;
+  excess requests queue
+- A configurable fraction of requests fails with FakeTinkerError
+- Training reports a decreasing loss; checkpoints are tracked by name
+  (optionally persisted to a directory so separate processes share them)
+
+Environment variables (read by FakeServiceClient.from_env):
+    TINKER_FAKE_LATENCY          Overhead distribution, e.g. "lognormal:0.05:0.5"
+                                 (constant:S | uniform:LO:HI | normal:MEAN:STD |
+                                  lognormal:MEDIAN:SIGMA | exponential:MEAN)
+    TINKER_FAKE_ERROR_RATE       Fraction of requests that fail (default 0)
+    TINKER_FAKE_MAX_CONCURRENCY  Concurrent slots per client (default 64)
+    TINKER_FAKE_MAX_RPS          Requests/sec cap per client (default 0 = none)
+    TINKER_FAKE_SEED             Seed for tokens, latency and errors (default 0)
+    TINKER_FAKE_STATE_DIR        Directory persisting checkpoint names (default: memory only)
+    TINKER_FAKE_STRICT           1 = load_state of an unknown checkpoint fails
+"""
+
+import io
+import os
+import re
+import json
+import math
+import time
+import heapq
+import random
+import struct
+import asyncio
+import tarfile
+import hashlib
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+from typing import List, Dict, Any
+
+
+class FakeTinkerError(RuntimeError):
+    """Injected failure (stands in for API / network errors)"""
+
+
+def _stable_seed(*key):
+    """RNG seed from a key, identical across processes (hash() of str is salted per process)"""
+    return int.from_bytes(hashlib.sha256(repr(key).encode("utf-8")).digest()[:8], "big")
+
+
+@dataclass
+class SampledSequence:
+    tokens: List[int]
+    stop_reason: str = "length"
+
+
+@dataclass
+class SampleResponse:
+    sequences: List[SampledSequence] = field(default_factory=list)
+
+
+@dataclass
+class FakeTensorData:
+    data: List[float]
+    dtype: str = "float32"
+    shape: List[int] = field(default_factory=list)
+
+
+@dataclass
+class ForwardBackwardOutput:
+    loss_fn_outputs: List[Dict[str, FakeTensorData]]
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class OptimStepResponse:
+    step: int
+
+
+@dataclass
+class ArchiveUrlResponse:
+    url: str
+    expires: float = None
+
+
+def prompt_length(prompt):
+    """Token count of a tinker ModelInput (or any object exposing to_ints / length)"""
+    length = getattr(prompt, "length", None)
+    if isinstance(length, int):
+        return length
+    if hasattr(prompt, "to_ints"):
+        return len(prompt.to_ints())
+    return len(prompt)
+
+
+class LatencyModel:
+    """Per-request overhead distribution"""
+
+    KINDS = ("constant", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, kind="constant", *params):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}' (expected one of {self.KINDS})")
+        self.kind = kind
+        self.params = [float(p) for p in params] or [0.02]
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse "kind:p1:p2", e.g. "lognormal:0.05:0.5" or "0.02" (constant)"""
+        parts = spec.split(":")
+        if len(parts) == 1:
+            return cls("constant", parts[0])
+        return cls(parts[0], *parts[1:])
+
+    def draw(self, rng):
+        p = self.params
+        if self.kind == "constant":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = p[0] * math.exp(rng.gauss(0.0, p[1] if len(p) > 1 else 0.5))
+        else:
+            value = rng.expovariate(1.0 / p[0])
+        return max(0.0, value)
+
+
+class _Capacity:
+    """
+    Simulated server capacity: at most `slots` requests in service at once and
+    at most `max_rps` request starts per second; later arrivals queue.
+    Thread-safe and event-loop agnostic, so sync and async callers share it.
+    """
+
+    def __init__(self, slots, max_rps=0.0):
+        self._free_at = [0.0] * slots
+        self._min_gap = 1.0 / max_rps if max_rps else 0.0
+        self._last_start = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, service_seconds):
+        """Book a slot; returns the absolute (monotonic) completion time"""
+        with self._lock:
+            start = max(time.monotonic(), heapq.heappop(self._free_at), self._last_start + self._min_gap)
+            self._last_start = start
+            finish = start + service_seconds
+            heapq.heappush(self._free_at, finish)
+            return finish
+
+
+@dataclass
+class FakeConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0
+    max_concurrency: int = 64
+    max_rps: float = 0.0
+    seed: int = 0
+    state_dir: str = None
+    strict: bool = False
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            latency=LatencyModel.parse(env.get("TINKER_FAKE_LATENCY", "constant:0.02")),
+            error_rate=float(env.get("TINKER_FAKE_ERROR_RATE", "0")),
+            max_concurrency=int(env.get("TINKER_FAKE_MAX_CONCURRENCY", "64")),
+            max_rps=float(env.get("TINKER_FAKE_MAX_RPS", "0")),
+            seed=int(env.get("TINKER_FAKE_SEED", "0")),
+            state_dir=env.get("TINKER_FAKE_STATE_DIR") or None,
+            strict=env.get("TINKER_FAKE_STRICT", "0") == "1",
+        )
+
+
+def model_size_billions(model_name):
+    """Parameter count parsed from names like Qwen3-4B or Qwen3-30B-A3B (default 4)"""
+    match = re.search(r"(\d+(?:\.\d+)?)B", model_name or "")
+    return float(match.group(1)) if match else 4.0
+
+
+class _FakeClientBase:
+    """Shared latency / capacity / error machinery"""
+
+    def __init__(self, config, model_name):
+        self.config = config
+        size = model_size_billions(model_name)
+        # Bigger models are slower per token (roughly sqrt of size)
+        self.prefill_seconds_per_token = 0.00001 * math.sqrt(size)
+        self.decode_seconds_per_token = 0.0002 * math.sqrt(size)
+        self._rng = random.Random(config.seed)
+        self._rng_lock = threading.Lock()
+        self._capacity = _Capacity(config.max_concurrency, config.max_rps)
+        self._executor = ThreadPoolExecutor(max_workers=config.max_concurrency)
+
+    def _schedule(self, prefill_tokens, decode_tokens):
+        """Returns (finish time, injected error or None)"""
+        with self._rng_lock:
+            overhead = self.config.latency.draw(self._rng)
+            failed = self._rng.random() < self.config.error_rate
+        service = (overhead + prefill_tokens * self.prefill_seconds_per_token
+                   + decode_tokens * self.decode_seconds_per_token)
+        error = FakeTinkerError("injected failure") if failed else None
+        return self._capacity.reserve(service), error
+
+    def _future(self, finish, error, value):
+        def wait():
+            time.sleep(max(0.0, finish - time.monotonic()))
+            if error is not None:
+                raise error
+            return value
+        return self._executor.submit(wait)
+
+    async def _await(self, finish, error, value):
+        await asyncio.sleep(max(0.0, finish - time.monotonic()))
+        if error is not None:
+            raise error
+        return value
+
+
+class FakeSamplingClient(_FakeClientBase):
+    """Drop-in for tinker SamplingClient.sample / sample_async"""
+
+    def __init__(self, model_path=None, base_model=None, config=None, vocab_size=32000):
+        super().__init__(config or FakeConfig(), base_model or model_path)
+        self.model_path = model_path or f"tinker://fake/base/{base_model}"
+        self.base_model = base_model
+        self.vocab_size = vocab_size
+
+    def _generate(self, prompt, sampling_params, num_samples):
+        max_tokens = getattr(sampling_params, "max_tokens", None) or 128
+        ints = prompt.to_ints() if hasattr(prompt, "to_ints") else list(prompt)
+        rng = random.Random(_stable_seed(self.config.seed, self.model_path, tuple(ints)))
+
+        sequences = []
+        for _ in range(num_samples):
+            length = rng.randint(max(1, max_tokens // 2), max_tokens)
+            tokens = [rng.randrange(100, self.vocab_size) for _ in range(length)]
+            sequences.append(SampledSequence(tokens, "length" if length == max_tokens else "stop"))
+
+        # Prompt is processed once, samples decode in parallel (longest one dominates)
+        longest = max((len(s.tokens) for s in sequences), default=0)
+        finish, error = self._schedule(prompt_length(prompt), longest)
+        return finish, error, SampleResponse(sequences)
+
+    async def sample_async(self, prompt, sampling_params, num_samples=1):
+        return await self._await(*self._generate(prompt, sampling_params, num_samples))
+
+    def sample(self, prompt, sampling_params, num_samples=1):
+        """Returns a concurrent.futures.Future, like the real client"""
+        return self._future(*self._generate(prompt, sampling_params, num_samples))
+
+
+class FakeTrainingClient(_FakeClientBase):
+    """Drop-in for the LoRA TrainingClient calls used by the pipeline"""
+
+    def __init__(self, service, base_model, rank=32):
+        super().__init__(service.config, base_model)
+        self.service = service
+        self.base_model = base_model
+        self.rank = rank
+        self.step = 0
+        self._lock = threading.Lock()
+
+    def _done(self, value):
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def forward_backward(self, batch, loss_fn="cross_entropy"):
+        """Per-datum logprobs that improve as optimizer steps accumulate"""
+        outputs = []
+        total_tokens = 0
+        mean_logprob = -2.4 * math.exp(-self.step / 30.0) - 0.003
+        for datum in batch:
+            n = len(datum.loss_fn_inputs['target_tokens'].data)
+            total_tokens += n
+            outputs.append({'logprobs': FakeTensorData([mean_logprob] * n, "float32", [n])})
+        # Forward + backward ~ 3x a prefill over the batch
+        finish, error = self._schedule(3 * total_tokens, 0)
+        return self._future(finish, error, ForwardBackwardOutput(outputs, {"loss_fn": loss_fn}))
+
+    def optim_step(self, adam_params):
+        finish, error = self._schedule(0, 0)
+        # A failed step leaves the weights (and step count) unchanged
+        with self._lock:
+            if error is None:
+                self.step += 1
+            step = self.step
+        return self._future(finish, error, OptimStepResponse(step))
+
+    def save_state(self, name):
+        self.service._save_checkpoint(name, {"base_model": self.base_model, "rank": self.rank, "step": self.step})
+        return self._done(f"tinker://fake/state/{name}")
+
+    def load_state(self, name):
+        state = self.service._load_checkpoint(name)
+        self.step = state.get("step", 0)
+        return self._done(None)
+
+    def save_weights_and_get_sampling_client(self, name):
+        model_path = f"tinker://fake/sampler_weights/{name}"
+        self.service._save_checkpoint(name, {"base_model": self.base_model, "rank": self.rank,
+                                             "step": self.step, "model_path": model_path})
+        return FakeSamplingClient(model_path=model_path, base_model=self.base_model, config=self.config)
+
+
+def _safetensors_bytes(tensors):
+    """Serialize {name: (shape, float list)} as an F32 safetensors file (no dependency needed)"""
+    header, offset, payload = {}, 0, b""
+    for name, (shape, values) in tensors.items():
+        data = struct.pack(f"<{len(values)}f", *values)
+        header[name] = {"dtype": "F32", "shape": shape, "data_offsets": [offset, offset + len(data)]}
+        offset += len(data)
+        payload += data
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+    return struct.pack("<Q", len(header_bytes)) + header_bytes + payload
+
+
+class FakeRestClient:
+    """Checkpoint archive download for 11_export_model.py"""
+
+    def __init__(self, service):
+        self.service = service
+        self._executor = ThreadPoolExecutor(max_workers=4)
+
+    def build_archive(self, tinker_path, hidden=64, rank=8, layers=2):
+        """A small .tar.gz LoRA adapter (PEFT layout) for the given path"""
+        rng = random.Random(_stable_seed(self.service.config.seed, tinker_path))
+        tensors = {}
+        for layer in range(layers):
+            for proj in ("q_proj", "k_proj", "v_proj"):
+                prefix = f"base_model.model.model.layers.{layer}.self_attn.{proj}"
+                tensors[f"{prefix}.lora_A.weight"] = ([rank, hidden], [rng.gauss(0, 0.02) for _ in range(rank * hidden)])
+                tensors[f"{prefix}.lora_B.weight"] = ([hidden, rank], [rng.gauss(0, 0.02) for _ in range(hidden * rank)])
+        files = {
+            "adapter_config.json": json.dumps({
+                "peft_type": "LORA", "r": rank, "lora_alpha": 2 * rank,
+                "target_modules": ["q_proj", "k_proj", "v_proj"], "base_model_name_or_path": "fake",
+            }, indent=2).encode("utf-8"),
+            "adapter_model.safetensors": _safetensors_bytes(tensors),
+        }
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for name, data in files.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def download_checkpoint_archive_from_tinker_path(self, tinker_path):
+        return self._executor.submit(self.build_archive, tinker_path)
+
+    def get_checkpoint_archive_url_from_tinker_path(self, tinker_path):
+        """file:// URL of the archive (written under the state dir or a temp dir)"""
+        def write():
+            directory = self.service.config.state_dir or tempfile.gettempdir()
+            name = hashlib.sha1(tinker_path.encode("utf-8")).hexdigest()[:16]
+            path = os.path.join(os.path.abspath(directory), f"fake_archive_{name}.tar.gz")
+            if not os.path.exists(path):
+                with open(path + ".tmp", 'wb') as f:
+                    f.write(self.build_archive(tinker_path))
+                os.replace(path + ".tmp", path)
+            return ArchiveUrlResponse(urllib.parse.urljoin("file:", urllib.request.pathname2url(path)),
+                                      time.time() + 3600)
+        return self._executor.submit(write)
+
+
+class FakeServiceClient:
+    """Drop-in for tinker.ServiceClient"""
+
+    def __init__(self, config=None):
+        self.config = config or FakeConfig()
+        self._checkpoints = {}
+        self._lock = threading.Lock()
+        if self.config.state_dir:
+            os.makedirs(self.config.state_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(FakeConfig.from_env())
+
+    def _state_file(self):
+        return os.path.join(self.config.state_dir, "checkpoints.json")
+
+    def _save_checkpoint(self, name, state):
+        with self._lock:
+            self._checkpoints[name] = state
+            if self.config.state_dir:
+                existing = {}
+                if os.path.exists(self._state_file()):
+                    with open(self._state_file(), 'r') as f:
+                        existing = json.load(f)
+                existing[name] = state
+                with open(self._state_file(), 'w') as f:
+                    json.dump(existing, f, indent=2)
+
+    def _load_checkpoint(self, name):
+        with self._lock:
+            if name not in self._checkpoints and self.config.state_dir and os.path.exists(self._state_file()):
+                with open(self._state_file(), 'r') as f:
+                    self._checkpoints.update(json.load(f))
+            if name in self._checkpoints:
+                return self._checkpoints[name]
+        if self.config.strict:
+            raise FakeTinkerError(f"Unknown checkpoint '{name}'")
+        return {}
+
+    def create_sampling_client(self, base_model=None, model_path=None):
+        return FakeSamplingClient(model_path=model_path, base_model=base_model, config=self.config)
+
+    def create_lora_training_client(self, base_model, rank=32):
+        return FakeTrainingClient(self, base_model, rank)
+
+    def create_rest_client(self):
+        return FakeRestClient(self)
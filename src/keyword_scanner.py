@@ -0,0 +1,165 @@
+"""
+Single-pass multi-pattern keyword scanning.
+
+All keywords and character names go into one scanner, which reports every
+label present in a document at once:
+- pyahocorasick (in requirements.txt) when installed: one Aho-Corasick
+  automaton, a single pass over the text regardless of how many patterns there are
+- otherwise substring tests against the once-lowercased document. A combined
+  regex alternation was measured 3-4x slower than that in CPython's `re` at
+  every pattern count tried (20-400), so it is not used.
+
+Matching is case-insensitive substring matching, the same as the `kw in
+text.lower()` checks it replaces. Scans run over `datasets` batches (optionally
+with num_proc workers) and produce a boolean presence table (rows x labels).
+Keyword counts, "any keyword" rates and the character inventory are all read
+from that table.
+"""
+
+from dataclasses import dataclass
+from typing import List
+import numpy as np
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Characters in fnlp/character-llm-data, with the names they are referred to by
+CHARACTERS = {
+    "Beethoven": ["beethoven"],
+    "Caesar": ["caesar"],
+    "Cleopatra": ["cleopatra"],
+    "Hermione": ["hermione"],
+    "Martin Luther King": ["martin luther king"],
+    "Newton": ["newton"],
+    "Socrates": ["socrates"],
+    "Spartacus": ["spartacus"],
+    "Voldemort": ["voldemort"],
+}
+
+
+class KeywordScanner:
+    """
+    Args:
+        terms: List of keywords (each is its own label), or dict label -> list of patterns
+        backend: "aho-corasick", "substring" or None (Aho-Corasick if pyahocorasick is installed)
+    """
+
+    def __init__(self, terms, backend=None):
+        if not isinstance(terms, dict):
+            terms = {term: [term] for term in terms}
+        self.labels = list(terms)
+        self.patterns = []
+        pattern_labels = {}
+        for index, label in enumerate(self.labels):
+            for pattern in terms[label]:
+                pattern = pattern.lower()
+                if pattern not in pattern_labels:
+                    self.patterns.append(pattern)
+                    pattern_labels[pattern] = set()
+                pattern_labels[pattern].add(index)
+        if not self.patterns:
+            raise ValueError("KeywordScanner needs at least one pattern")
+
+        if backend is None:
+            backend = "aho-corasick" if ahocorasick is not None else "substring"
+        if backend == "aho-corasick" and ahocorasick is None:
+            raise ImportError("pyahocorasick is not installed (pip install pyahocorasick)")
+        if backend not in ("aho-corasick", "substring"):
+            raise ValueError(f"Unknown backend '{backend}'")
+        self.backend = backend
+
+        if backend == "aho-corasick":
+            self._automaton = ahocorasick.Automaton()
+            for pattern in self.patterns:
+                self._automaton.add_word(pattern, tuple(sorted(pattern_labels[pattern])))
+            self._automaton.make_automaton()
+        else:
+            self._substrings = [(pattern, tuple(sorted(pattern_labels[pattern]))) for pattern in self.patterns]
+
+    def scan(self, text):
+        """Indices of the labels present in text"""
+        text = text.lower()
+        found = set()
+        if self.backend == "aho-corasick":
+            for _, label_indices in self._automaton.iter(text):
+                found.update(label_indices)
+        else:
+            for pattern, label_indices in self._substrings:
+                if pattern in text:
+                    found.update(label_indices)
+        return found
+
+    def presence(self, texts):
+        """Boolean matrix [len(texts), len(labels)]: label present in each text"""
+        matrix = np.zeros((len(texts), len(self.labels)), dtype=bool)
+        for row, text in enumerate(texts):
+            if text:
+                found = self.scan(text)
+                if found:
+                    matrix[row, list(found)] = True
+        return matrix
+
+    def _batch_presence(self, *columns):
+        """datasets.map function: joins a row's search columns and scans them once"""
+        texts = ["\n".join(value if isinstance(value, str) else str(value)
+                           for value in values if value is not None)
+                 for values in zip(*columns)]
+        return {"_presence": self.presence(texts).tolist()}
+
+
+@dataclass
+class PresenceTable:
+    labels: List[str]
+    matrix: np.ndarray
+
+    @property
+    def rows(self):
+        return self.matrix.shape[0]
+
+    def _indices(self, labels):
+        return [self.labels.index(label) for label in labels]
+
+    def counts(self, labels=None):
+        """Rows containing each label"""
+        labels = self.labels if labels is None else labels
+        totals = self.matrix[:, self._indices(labels)].sum(axis=0)
+        return {label: int(total) for label, total in zip(labels, totals)}
+
+    def any_of(self, labels=None):
+        """Rows containing at least one of labels"""
+        labels = self.labels if labels is None else labels
+        return int(self.matrix[:, self._indices(labels)].any(axis=1).sum())
+
+
+def scan_texts(scanner, texts):
+    """Presence table for an in-memory list of texts"""
+    return PresenceTable(scanner.labels, scanner.presence(texts))
+
+
+def scan_dataset(dataset, scanner, columns, batch_size=1000, num_proc=None):
+    """
+    Presence table over every row of a datasets.Dataset in one batched pass.
+
+    Args:
+        dataset: datasets.Dataset
+        scanner: KeywordScanner
+        columns: Columns whose text is scanned (joined per row)
+        batch_size: Rows per map batch
+        num_proc: Worker processes for the map (None: in-process)
+    """
+    if len(dataset) == 0:
+        return PresenceTable(scanner.labels, np.zeros((0, len(scanner.labels)), dtype=bool))
+    hits = dataset.map(
+        scanner._batch_presence,
+        batched=True,
+        batch_size=batch_size,
+        input_columns=list(columns),
+        remove_columns=dataset.column_names,
+        num_proc=num_proc if num_proc and num_proc > 1 else None,
+        desc="Scanning keywords",
+    )
+    column = hits.with_format("numpy")["_presence"]
+    matrix = np.vstack(column) if getattr(column, "dtype", object) == object else column
+    return PresenceTable(scanner.labels, matrix.astype(bool).reshape(len(dataset), len(scanner.labels)))
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Step 21: Use an exported LoRA checkpoint locally
+
+Turns the .tar.gz written by 11_export_model.py into something servable
+without the API:
+
+1. extract_archive: streaming extraction (tar "r|gz": one pass, no random access,
+   files copied in chunks) with path-traversal checks
+2. SafetensorsFile: memory-mapped safetensors reader (numpy.memmap, so tensors
+   are paged in on access; handles BF16, which numpy lacks natively)
+3. merge_lora: folds W += scale * B @ A into the base model shard by shard.
+   Each output tensor is written as soon as it is computed, so peak memory is
+   about one tensor (never more than one shard), plus the small adapter.
+
+The result is a standard HuggingFace model directory (config, tokenizer files,
+merged *.safetensors and index). Without a base model, the extracted PEFT
+adapter directory can be served as a LoRA adapter directly.
+"""
+
+import os
+import json
+import shutil
+import struct
+import tarfile
+import argparse
+import numpy as np
+
+CHUNK_SIZE = 1 << 20
+
+# safetensors dtype -> numpy storage dtype
+DTYPES = {
+    "F64": np.float64, "F32": np.float32, "F16": np.float16, "BF16": np.uint16,
+    "I64": np.int64, "I32": np.int32, "I16": np.int16, "I8": np.int8, "U8": np.uint8, "BOOL": np.bool_,
+}
+
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".gguf")
+
+
+def extract_archive(archive, output_dir):
+    """
+    Extract a .tar.gz in a single streaming pass.
+
+    Returns:
+        List of extracted file paths
+    """
+    root = os.path.realpath(output_dir)
+    os.makedirs(root, exist_ok=True)
+    extracted = []
+    with tarfile.open(archive, mode="r|gz") as tar:
+        for member in tar:
+            target = os.path.realpath(os.path.join(root, member.name))
+            if os.path.commonpath([root, target]) != root:
+                raise ValueError(f"Refusing to extract outside {output_dir}: {member.name}")
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if not member.isfile():
+                print(f"Skipping non-regular archive member {member.name}")
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            source = tar.extractfile(member)
+            with open(target + ".tmp", 'wb') as out:
+                shutil.copyfileobj(source, out, CHUNK_SIZE)
+            os.replace(target + ".tmp", target)
+            extracted.append(target)
+    return extracted
+
+
+def bf16_to_f32(raw):
+    return (raw.astype(np.uint32) << 16).view(np.float32)
+
+
+def f32_to_bf16(values):
+    """Round-to-nearest-even float32 -> bfloat16 bit pattern (uint16)"""
+    bits = np.ascontiguousarray(values, dtype=np.float32).view(np.uint32)
+    rounding = ((bits >> 16) & 1) + np.uint32(0x7FFF)
+    return ((bits + rounding) >> 16).astype(np.uint16)
+
+
+class SafetensorsFile:
+    """Memory-mapped safetensors reader"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size))
+        self.metadata = header.pop("__metadata__", None)
+        self.header = header
+        self.data_start = 8 + header_size
+        self._map = np.memmap(path, dtype=np.uint8, mode="r", offset=self.data_start) \
+            if os.path.getsize(path) > self.data_start else np.empty(0, dtype=np.uint8)
+
+    def keys(self):
+        return list(self.header)
+
+    def info(self, name):
+        return self.header[name]
+
+    def raw(self, name):
+        """Tensor in its stored dtype (BF16 as uint16), backed by the memory map"""
+        entry = self.header[name]
+        start, end = entry["data_offsets"]
+        return self._map[start:end].view(DTYPES[entry["dtype"]]).reshape(entry["shape"])
+
+    def get_tensor(self, name, dtype=None):
+        """Tensor as a numpy array (BF16 widened to float32)"""
+        array = self.raw(name)
+        if self.header[name]["dtype"] == "BF16":
+            array = bf16_to_f32(array)
+        return array.astype(dtype) if dtype is not None else array
+
+
+def write_safetensors(path, tensors, metadata=None):
+    """
+    Write safetensors from an iterable of (name, dtype string, shape, producer).
+
+    Offsets are computed up front from the shapes, so each producer() is called
+    and written one at a time; only one tensor is in memory at once.
+    """
+    tensors = list(tensors)
+    header, offset = {}, 0
+    for name, dtype, shape, _ in tensors:
+        size = int(np.prod(shape, dtype=np.int64)) * np.dtype(DTYPES[dtype]).itemsize
+        header[name] = {"dtype": dtype, "shape": list(shape), "data_offsets": [offset, offset + size]}
+        offset += size
+    if metadata:
+        header["__metadata__"] = metadata
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    with open(path + ".tmp", 'wb') as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, dtype, shape, producer in tensors:
+            array = np.ascontiguousarray(producer())
+            if array.shape != tuple(shape):
+                raise ValueError(f"{name}: produced shape {array.shape}, expected {tuple(shape)}")
+            f.write(array.tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def base_weight_name(adapter_key):
+    """
+    PEFT adapter tensor name -> (base weight name, "A" or "B"), or None.
+
+    base_model.model.model.layers.0.self_attn.q_proj.lora_A.weight
+        -> model.layers.0.self_attn.q_proj.weight, "A"
+    """
+    for part in ("A", "B"):
+        for marker in (f".lora_{part}.default.weight", f".lora_{part}.weight"):
+            if adapter_key.endswith(marker):
+                module = adapter_key[:-len(marker)]
+                if module.startswith("base_model.model."):
+                    module = module[len("base_model.model."):]
+                return module + ".weight", part
+    return None
+
+
+def load_adapter(adapter_dir):
+    """
+    Adapter config plus LoRA factor pairs, loaded as float32.
+
+    Returns:
+        (config dict, {base weight name: (A, B)}, scale)
+    """
+    with open(os.path.join(adapter_dir, "adapter_config.json"), 'r') as f:
+        config = json.load(f)
+    rank = config.get("r", 8)
+    alpha = config.get("lora_alpha", rank)
+    scale = alpha / np.sqrt(rank) if config.get("use_rslora") else alpha / rank
+
+    factors = {}
+    for filename in sorted(os.listdir(adapter_dir)):
+        if not filename.endswith(".safetensors"):
+            continue
+        weights = SafetensorsFile(os.path.join(adapter_dir, filename))
+        for key in weights.keys():
+            mapped = base_weight_name(key)
+            if mapped is None:
+                continue
+            name, part = mapped
+            factors.setdefault(name, {})[part] = weights.get_tensor(key, np.float32)
+
+    pairs = {}
+    for name, parts in factors.items():
+        if "A" not in parts or "B" not in parts:
+            raise ValueError(f"Incomplete LoRA pair for {name}")
+        pairs[name] = (parts["A"], parts["B"])
+    return config, pairs, scale
+
+
+def resolve_base_model(base_model):
+    """Local directory for a base model path or HuggingFace repo ID"""
+    if os.path.isdir(base_model):
+        return base_model
+    from huggingface_hub import snapshot_download
+    return snapshot_download(base_model, allow_patterns=["*.json", "*.safetensors", "*.txt", "*.model",
+                                                         "*.tiktoken", "merges.txt", "vocab*"])
+
+
+def base_shards(base_dir):
+    """Ordered safetensors shard filenames of a base model directory"""
+    index_file = os.path.join(base_dir, "model.safetensors.index.json")
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as f:
+            return sorted(set(json.load(f)["weight_map"].values()))
+    shards = sorted(f for f in os.listdir(base_dir) if f.endswith(".safetensors"))
+    if not shards:
+        raise FileNotFoundError(f"No .safetensors weights in {base_dir}")
+    return shards
+
+
+def merge_lora(adapter_dir, base_model, output_dir):
+    """
+    Merge a LoRA adapter into base weights, one shard (and one tensor) at a time.
+
+    Args:
+        adapter_dir: Extracted PEFT adapter directory
+        base_model: Base model directory or HuggingFace repo ID
+        output_dir: Destination model directory
+
+    Returns:
+        Summary dict (merged / unmatched modules, shards written)
+    """
+    config, pairs, scale = load_adapter(adapter_dir)
+    base_dir = resolve_base_model(base_model)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Adapter: {len(pairs)} LoRA modules, r={config.get('r')}, scale={scale:.3f}")
+
+    # Config / tokenizer / generation files are copied as-is
+    for filename in os.listdir(base_dir):
+        source = os.path.join(base_dir, filename)
+        if os.path.isfile(source) and not filename.endswith(WEIGHT_SUFFIXES) \
+                and filename != "model.safetensors.index.json":
+            shutil.copy2(source, os.path.join(output_dir, filename))
+
+    merged = set()
+    weight_map = {}
+    total_size = 0
+    for shard in base_shards(base_dir):
+        source = SafetensorsFile(os.path.join(base_dir, shard))
+        tensors = []
+        for name in source.keys():
+            info = source.info(name)
+            weight_map[name] = shard
+            start, end = info["data_offsets"]
+            total_size += end - start
+
+            def produce(name=name, dtype=info["dtype"]):
+                if name not in pairs:
+                    return source.raw(name)
+                lora_a, lora_b = pairs[name]
+                weight = source.get_tensor(name, np.float32)
+                weight = weight + scale * (lora_b @ lora_a)
+                merged.add(name)
+                if dtype == "BF16":
+                    return f32_to_bf16(weight)
+                return weight.astype(DTYPES[dtype])
+
+            tensors.append((name, info["dtype"], info["shape"], produce))
+        write_safetensors(os.path.join(output_dir, shard), tensors, source.metadata)
+        print(f"  ✓ {shard}: {sum(1 for t in tensors if t[0] in pairs)} tensors merged")
+
+    index = {"metadata": {"total_size": total_size}, "weight_map": weight_map}
+    with open(os.path.join(output_dir, "model.safetensors.index.json"), 'w') as f:
+        json.dump(index, f, indent=2)
+
+    unmatched = sorted(set(pairs) - merged)
+    if unmatched:
+        print(f"Warning: {len(unmatched)} adapter modules have no matching base weight, "
+              f"e.g. {unmatched[0]}")
+    print(f"✓ Merged model written to {output_dir}")
+    return {"merged": len(merged), "unmatched": unmatched, "shards": len(set(weight_map.values()))}
+
+
+def find_adapter_dir(root):
+    """Directory containing adapter_config.json within an extracted archive"""
+    for directory, _, files in os.walk(root):
+        if "adapter_config.json" in files:
+            return directory
+    raise FileNotFoundError(f"No adapter_config.json under {root}")
+
+
+def prepare_artifacts(archive, extract_dir, base_model=None, output_dir=None):
+    """Extract an exported archive and optionally merge it into a base model"""
+    files = extract_archive(archive, extract_dir)
+    adapter_dir = find_adapter_dir(extract_dir)
+    print(f"✓ Extracted {len(files)} files; adapter at {adapter_dir}")
+    if base_model:
+        return merge_lora(adapter_dir, base_model, output_dir or f"{extract_dir}_merged")
+    return {"adapter_dir": adapter_dir}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract and optionally merge an exported LoRA checkpoint")
+    parser.add_argument("archive", nargs="?", default="model-checkpoint.tar.gz")
+    parser.add_argument("--extract-dir", default="student_adapter")
+    parser.add_argument("--base-model", default=None,
+                        help="Base model directory or HF repo to merge into (omit to only extract)")
+    parser.add_argument("--output-dir", default="student_merged")
+    args = parser.parse_args()
+    prepare_artifacts(args.archive, args.extract_dir, args.base_model, args.output_dir)
@@ -0,0 +1,256 @@
+"""
+Multi-LoRA routing for serving many distilled characters from one process.
+
+Requests are routed by model / character name to a LoRA adapter:
+- explicit adapters (name -> training checkpoint) given to the router
+- otherwise any character in config/characters.yaml, served from its
+  <slug>_prompt_distillation_final_checkpoint
+
+Adapters are loaded lazily: the first request for one resolves its sampling
+client through the sampler registry (reusing saved weights when registered)
+in a worker thread, while concurrent requests for the same adapter wait on the
+same load. Each resident adapter gets its own MicroBatcher, so concurrent
+requests for one character are batched together and never mixed with another
+adapter's. Resident adapters are keyed by adapter (model) path, so two names
+pointing at the same weights share one client and batcher.
+
+At most `max_adapters` stay resident; the least recently used idle adapter is
+evicted (its batcher stopped) to make room. Adapters with requests queued, in
+flight or still waiting on their load are pinned and never evicted, so the pool
+can exceed the limit during a burst; it is trimmed back as soon as adapters go
+idle.
+
+Per-adapter metrics: requests, hit rate (requests that did not have to start a
+load), loads, evictions, warm-up time, end-to-end latency, and the resident
+batcher's queue / batching stats.
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from sampler_registry import get_sampling_client, STUDENT_BASE_MODEL
+from character_registry import get_character
+from micro_batching import MicroBatcher, LatencyStats
+
+
+class UnknownAdapter(KeyError):
+    """No adapter or registered character under that name"""
+
+
+@dataclass
+class _Resident:
+    model_path: str
+    batcher: MicroBatcher
+    names: set = field(default_factory=set)
+    pending: int = 0
+
+
+class AdapterStats:
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.failed = 0
+        self.warmup = LatencyStats()
+        self.latency = LatencyStats()
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "hit_rate": round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else None,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "failed": self.failed,
+            "warmup": self.warmup.summary(),
+            "latency": self.latency.summary(),
+        }
+
+
+class LoRARouter:
+    """
+    Args:
+        service_client: Tinker (or fake) ServiceClient
+        adapters: Dict name -> training checkpoint, served in addition to the registry characters
+        max_adapters: Resident adapters before the least recently used idle one is evicted
+        base_model: Base model of the LoRA checkpoints
+        rank: LoRA rank
+        refresh_samplers: Save weights again instead of reusing registered samplers
+        **batcher_kwargs: MicroBatcher settings (window_ms, max_batch, max_queue, max_in_flight)
+    """
+
+    def __init__(self, service_client, adapters=None, max_adapters=8, base_model=STUDENT_BASE_MODEL, rank=32,
+                 refresh_samplers=False, **batcher_kwargs):
+        self.service_client = service_client
+        self.adapters = dict(adapters or {})
+        self.max_adapters = max_adapters
+        self.base_model = base_model
+        self.rank = rank
+        self.refresh_samplers = refresh_samplers
+        self.batcher_kwargs = batcher_kwargs
+        self.started_at = time.time()
+
+        self._resident = OrderedDict()   # model path -> _Resident, least recently used first
+        self._paths = {}                 # name -> model path while resident
+        self._loading = {}               # name -> Future of the model path
+        self._waiting = {}               # name -> requests waiting on its load (pinned when it lands)
+        self._tasks = set()              # background evictions
+        self._stats = {}                 # name -> AdapterStats (kept across evictions)
+
+    def checkpoint_for(self, name):
+        """Training checkpoint served under `name`; raises UnknownAdapter"""
+        if name in self.adapters:
+            return self.adapters[name]
+        try:
+            return f"{get_character(name).checkpoint_prefix}_final_checkpoint"
+        except KeyError as e:
+            raise UnknownAdapter(name) from e
+
+    def stats(self, name):
+        return self._stats.setdefault(name, AdapterStats())
+
+    async def submit(self, name, prompt_tokens, max_tokens=200, temperature=0.7):
+        """Route one completion request to `name`'s adapter; raises UnknownAdapter / QueueFull"""
+        if name not in self._paths:
+            self.checkpoint_for(name)  # unknown names fail here, before they get a metrics entry
+        stats = self.stats(name)
+        stats.requests += 1
+        start = time.perf_counter()
+        try:
+            resident = await self._acquire(name, stats)
+            try:
+                completion = await resident.batcher.submit(prompt_tokens, max_tokens, temperature)
+            finally:
+                self._release(resident)
+        except Exception:
+            stats.failed += 1
+            raise
+        stats.latency.add(time.perf_counter() - start)
+        return completion
+
+    async def warm(self, name):
+        """Load `name`'s adapter ahead of its first request"""
+        self._release(await self._acquire(name, self.stats(name), count=False))
+
+    async def _acquire(self, name, stats, count=True):
+        """
+        Resident adapter for `name`, pinned (pending += 1) until _release().
+        A request that has to start a load is a miss; requests served by a
+        resident adapter or joining a load already in progress are hits.
+        """
+        model_path = self._paths.get(name)
+        if model_path in self._resident:
+            resident = self._resident[model_path]
+            self._resident.move_to_end(model_path)
+            resident.pending += 1
+            if count:
+                stats.hits += 1
+            return resident
+
+        loading = self._loading.get(name)
+        if loading is None:
+            loading = self._loading[name] = asyncio.ensure_future(self._load(name, stats))
+            loading.add_done_callback(lambda _: self._loading.pop(name, None))
+            if count:
+                stats.misses += 1
+        elif count:
+            stats.hits += 1
+        # Waiters are counted now and pinned by _load the moment the adapter becomes
+        # resident, so no other load can evict it before they resume
+        self._waiting[name] = self._waiting.get(name, 0) + 1
+        try:
+            model_path = await asyncio.shield(loading)
+        except asyncio.CancelledError:
+            if not loading.done():
+                self._waiting[name] -= 1
+            elif not loading.cancelled() and loading.exception() is None:
+                self._release(self._resident[loading.result()])
+            raise
+        resident = self._resident[model_path]
+        self._resident.move_to_end(model_path)
+        return resident
+
+    def _release(self, resident):
+        """Unpin; once an adapter goes idle, bring the pool back within max_adapters"""
+        resident.pending -= 1
+        if resident.pending == 0 and len(self._resident) > self.max_adapters:
+            task = asyncio.ensure_future(self._evict())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, name, stats):
+        start = time.perf_counter()
+        try:
+            checkpoint = self.checkpoint_for(name)
+            # Saving weights for an unregistered checkpoint blocks for seconds; keep the event loop serving
+            sampling_client, model_path = await asyncio.to_thread(
+                get_sampling_client, self.service_client, checkpoint, self.base_model, self.rank,
+                self.refresh_samplers)
+        except BaseException:
+            self._waiting.pop(name, None)
+            raise
+        model_path = model_path or checkpoint
+
+        resident = self._resident.get(model_path)
+        created = resident is None
+        if created:
+            batcher = MicroBatcher(sampling_client, **self.batcher_kwargs)
+            batcher.start()
+            resident = self._resident[model_path] = _Resident(model_path, batcher)
+            stats.loads += 1
+            stats.warmup.add(time.perf_counter() - start)
+        resident.pending += self._waiting.pop(name, 0)
+        resident.names.add(name)
+        self._paths[name] = model_path
+        if created:
+            await self._evict()
+        return model_path
+
+    async def _evict(self):
+        """Evict least recently used idle adapters while over max_adapters"""
+        while len(self._resident) > self.max_adapters:
+            victim = next((path for path, r in self._resident.items() if r.pending == 0), None)
+            if victim is None:
+                return
+            resident = self._resident.pop(victim)
+            for name in resident.names:
+                self._paths.pop(name, None)
+                self.stats(name).evictions += 1
+            await resident.batcher.stop()
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for resident in self._resident.values():
+            await resident.batcher.stop()
+        self._resident.clear()
+        self._paths.clear()
+
+    def queued(self):
+        return sum(r.batcher.queue.qsize() for r in self._resident.values())
+
+    def metrics(self):
+        hits = sum(s.hits for s in self._stats.values())
+        misses = sum(s.misses for s in self._stats.values())
+        adapters = {}
+        for name, stats in self._stats.items():
+            entry = stats.summary()
+            model_path = self._paths.get(name)
+            entry["resident"] = model_path in self._resident
+            if entry["resident"]:
+                entry["model_path"] = model_path
+                entry["batcher"] = self._resident[model_path].batcher.metrics()
+            adapters[name] = entry
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "resident_adapters": len(self._resident),
+            "max_adapters": self.max_adapters,
+            "requests": sum(s.requests for s in self._stats.values()),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            "loads": sum(s.loads for s in self._stats.values()),
+            "evictions": sum(s.evictions for s in self._stats.values()),
+            "queued": self.queued(),
+            "adapters": adapters,
+        }
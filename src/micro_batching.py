@@ -0,0 +1,217 @@
+"""
+Dynamic micro-batching in front of a Tinker sampling client.
+
+Requests are queued and collected for up to `window_ms` (or until `max_batch`
+requests arrive). Within a window, requests with the same prompt and sampling
+parameters are coalesced into one sample_async call with num_samples=n. The
+resulting calls are dispatched concurrently, with at most `max_in_flight` calls
+outstanding. When the queue is full, submit() raises QueueFull so callers can
+shed load (HTTP 429) instead of building unbounded latency.
+
+Per-request queue wait, service time and total latency are tracked for the
+metrics endpoint.
+"""
+
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Tuple, List
+from stats_utils import RunningStats, Histogram
+from tinker_backend import model_input, sampling_params
+
+
+class QueueFull(Exception):
+    """The batcher queue is at capacity"""
+
+
+@dataclass
+class Completion:
+    tokens: List[int]
+    stop_reason: str
+    queue_seconds: float
+    service_seconds: float
+    batch_size: int
+
+
+@dataclass
+class _Pending:
+    prompt_tokens: Tuple[int, ...]
+    max_tokens: int
+    temperature: float
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def key(self):
+        return (self.prompt_tokens, self.max_tokens, self.temperature)
+
+
+class LatencyStats:
+    """Running mean plus millisecond-resolution percentiles (up to 120s)"""
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.histogram = Histogram(0.0, 120.0, 0.001)
+
+    def add(self, seconds):
+        self.stats.add(seconds)
+        self.histogram.add(seconds)
+
+    def summary(self):
+        if self.stats.n == 0:
+            return None
+        return {
+            "count": self.stats.n,
+            "mean": round(self.stats.mean, 4),
+            "p50": round(self.histogram.percentile(50), 4),
+            "p90": round(self.histogram.percentile(90), 4),
+            "p99": round(self.histogram.percentile(99), 4),
+            "max": round(self.stats.max, 4),
+        }
+
+
+class MicroBatcher:
+    """
+    Args:
+        sampling_client: Tinker sampling client (anything with sample_async)
+        window_ms: How long to wait for more requests after the first one
+        max_batch: Max requests collected per window
+        max_queue: Queued requests before submit() raises QueueFull
+        max_in_flight: Max concurrent sample_async calls
+    """
+
+    def __init__(self, sampling_client, window_ms=10.0, max_batch=32, max_queue=256, max_in_flight=64):
+        self.sampling_client = sampling_client
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._collector = None
+        self._tasks = set()
+        self.started_at = time.time()
+
+        self.requests = 0
+        self.rejected = 0
+        self.failed = 0
+        self.calls = 0
+        self.in_flight = 0
+        self.completion_tokens = 0
+        self.batch_sizes = RunningStats()
+        self.coalesced = 0
+        self.queue_latency = LatencyStats()
+        self.service_latency = LatencyStats()
+        self.total_latency = LatencyStats()
+
+    def start(self):
+        if self._collector is None:
+            self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._collector is not None:
+            self._collector.cancel()
+            await asyncio.gather(self._collector, return_exceptions=True)
+            self._collector = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, prompt_tokens, max_tokens=200, temperature=0.7):
+        """Queue one completion request and wait for it; raises QueueFull under overload"""
+        pending = _Pending(tuple(prompt_tokens), max_tokens, temperature,
+                           asyncio.get_running_loop().create_future())
+        try:
+            self.queue.put_nowait(pending)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFull(f"queue full ({self.queue.maxsize} pending)")
+        self.requests += 1
+        return await pending.future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batch_sizes.add(len(batch))
+            groups = {}
+            for pending in batch:
+                groups.setdefault(pending.key, []).append(pending)
+            self.coalesced += len(batch) - len(groups)
+
+            for group in groups.values():
+                # Waiting for a free slot here stops collection, so overload backs up
+                # into the bounded queue (and turns into QueueFull) rather than memory
+                await self._slots.acquire()
+                self.in_flight += 1
+                task = asyncio.create_task(self._dispatch(group, len(batch)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, group, batch_size):
+        first = group[0]
+        start = time.perf_counter()
+        try:
+            self.calls += 1
+            result = await self.sampling_client.sample_async(
+                prompt=model_input(first.prompt_tokens),
+                sampling_params=sampling_params(first.max_tokens, first.temperature),
+                num_samples=len(group)
+            )
+        except Exception as e:
+            self.failed += len(group)
+            for pending in group:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+        end = time.perf_counter()
+        service = end - start
+        for pending, sequence in zip(group, result.sequences):
+            tokens = list(sequence.tokens)
+            self.completion_tokens += len(tokens)
+            self.queue_latency.add(start - pending.enqueued_at)
+            self.service_latency.add(service)
+            self.total_latency.add(end - pending.enqueued_at)
+            if not pending.future.done():
+                pending.future.set_result(Completion(
+                    tokens, getattr(sequence, "stop_reason", "length"),
+                    start - pending.enqueued_at, service, batch_size
+                ))
+        for pending in group[len(result.sequences):]:
+            self.failed += 1
+            pending.future.set_exception(RuntimeError("sampler returned fewer sequences than requested"))
+
+    def metrics(self):
+        uptime = time.time() - self.started_at
+        completed = self.total_latency.stats.n
+        return {
+            "uptime_seconds": round(uptime, 1),
+            "requests": self.requests,
+            "completed": completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "queued": self.queue.qsize(),
+            "in_flight_calls": self.in_flight,
+            "sampling_calls": self.calls,
+            "coalesced_requests": self.coalesced,
+            "mean_batch_size": round(self.batch_sizes.mean, 2) if self.batch_sizes.n else None,
+            "requests_per_sec": round(completed / uptime, 3) if uptime > 0 else None,
+            "completion_tokens_per_sec": round(self.completion_tokens / uptime, 1) if uptime > 0 else None,
+            "latency": {
+                "queue": self.queue_latency.summary(),
+                "service": self.service_latency.summary(),
+                "total": self.total_latency.summary(),
+            },
+        }
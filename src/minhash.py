@@ -0,0 +1,301 @@
+"""
+MinHash signatures and LSH banding for near-duplicate detection.
+
+Texts are normalized (lowercase, punctuation stripped) and split into word
+k-shingles. Each shingle is hashed to 32 bits (crc32), and a signature is the
+minimum over the shingles of `num_perm` universal hashes (a*x + b) mod (2^31 - 1).
+Signatures for a batch of texts are computed in one NumPy pass: the shingle
+hashes of all texts are concatenated, permuted as one matrix, and
+np.minimum.reduceat takes the per-text minima. The only Python loop is the
+shingling itself.
+
+The fraction of equal signature positions estimates Jaccard similarity. LSH
+splits a signature into `bands` bands of `rows` values each. Texts sharing a
+band are candidates, and candidates are checked against the full signatures
+before they count as near-duplicates. cluster_signatures() groups a whole
+collection at once (LSH buckets + union-find; all pairs in small buckets, head
+and neighbour in large ones).
+"""
+
+import re
+import zlib
+import hashlib
+from collections import defaultdict
+import numpy as np
+
+MERSENNE_PRIME = (1 << 31) - 1
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize(text):
+    """Lowercase, punctuation stripped, whitespace collapsed"""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def shingles(text, k=3):
+    """Set of word k-grams (the whole text as one shingle when it is shorter than k words)"""
+    words = normalize(text).split()
+    if len(words) <= k:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def jaccard(signature_a, signature_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(signature_a == signature_b))
+
+
+class MinHasher:
+    """
+    Args:
+        num_perm: Signature length (more = lower estimation error, ~1/sqrt(num_perm))
+        shingle_size: Words per shingle
+        seed: Hash family seed (signatures are only comparable with the same seed)
+        max_block: Max shingles permuted at once (bounds the num_perm x shingles matrix)
+    """
+
+    def __init__(self, num_perm=128, shingle_size=3, seed=1, max_block=1 << 15):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_block = max_block
+        self.a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, text):
+        return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)),
+                           dtype=np.uint64)
+
+    def signatures(self, texts):
+        """(len(texts), num_perm) uint32 signature matrix"""
+        hashes = [self.shingle_hashes(text) for text in texts]
+        out = np.empty((len(hashes), self.num_perm), dtype=np.uint32)
+        start = 0
+        while start < len(hashes):
+            end, total = start + 1, len(hashes[start])
+            while end < len(hashes) and total + len(hashes[end]) <= self.max_block:
+                total += len(hashes[end])
+                end += 1
+            block = hashes[start:end]
+            x = np.concatenate(block) % MERSENNE_PRIME
+            offsets = np.cumsum([0] + [len(h) for h in block[:-1]])
+            # a, x < 2^31 so a*x + b fits in uint64 without overflow
+            permuted = (np.outer(x, self.a) + self.b) % MERSENNE_PRIME
+            out[start:end] = np.minimum.reduceat(permuted, offsets, axis=0)
+            start = end
+        return out
+
+    def signature(self, text):
+        return self.signatures([text])[0]
+
+
+def lsh_params(threshold, num_perm, false_negative_weight=0.8):
+    """
+    (bands, rows) minimizing the weighted false positive / false negative areas
+    under the LSH S-curve 1 - (1 - s^rows)^bands around `threshold`.
+    Candidates are verified against full signatures, so a false positive only
+    costs a comparison and missed pairs are weighted more heavily by default.
+    """
+    step = 0.005
+    grid = np.arange(step / 2, 1.0, step)
+    below = grid < threshold
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        candidate = 1.0 - (1.0 - grid ** rows) ** bands
+        false_positive = candidate[below].sum() * step
+        false_negative = (1.0 - candidate[~below]).sum() * step
+        error = (1 - false_negative_weight) * false_positive + false_negative_weight * false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def band_keys(signatures, bands, rows):
+    """(n, bands) uint64 bucket keys: a multiplicative hash of each band's rows"""
+    signatures = np.atleast_2d(signatures)
+    multipliers = (np.arange(1, rows + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)) | np.uint64(1)
+    banded = signatures[:, :bands * rows].astype(np.uint64).reshape(len(signatures), bands, rows)
+    with np.errstate(over="ignore"):
+        return (banded * multipliers).sum(axis=2, dtype=np.uint64)
+
+
+class LSHIndex:
+    """
+    Incremental LSH index over MinHash signatures.
+
+    Args:
+        threshold: Estimated Jaccard similarity at which two texts are near-duplicates
+        num_perm: Signature length
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self._buckets = [defaultdict(list) for _ in range(self.bands)]
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.size = 0
+
+    def query(self, signature, keys=None):
+        """Ids of indexed signatures with estimated Jaccard >= threshold"""
+        keys = band_keys(signature, self.bands, self.rows)[0] if keys is None else keys
+        candidates = set()
+        for buckets, key in zip(self._buckets, keys.tolist()):
+            candidates.update(buckets.get(key, ()))
+        if not candidates:
+            return []
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self._signatures[ids] == signature).mean(axis=1)
+        return ids[similarity >= self.threshold].tolist()
+
+    def insert(self, signature, keys=None):
+        """Index a signature; returns its id"""
+        keys = band_keys(signature, self.bands, self.rows)[0] if keys is None else keys
+        if self.size == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        item = self.size
+        self._signatures[item] = signature
+        self.size += 1
+        for buckets, key in zip(self._buckets, keys.tolist()):
+            buckets[key].append(item)
+        return item
+
+
+class NearDuplicateFilter:
+    """
+    Streaming filter: add(texts) keeps the texts that are neither an exact
+    repeat (normalized) nor a near-duplicate of anything added before, including
+    earlier texts of the same batch. Only 64-bit hashes and signatures are kept.
+
+    Args:
+        threshold: Estimated Jaccard similarity at which texts are near-duplicates
+        num_perm: Signature length
+        shingle_size: Words per shingle
+        seed: MinHash seed
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=3, seed=1):
+        self.hasher = MinHasher(num_perm, shingle_size, seed)
+        self.index = LSHIndex(threshold, num_perm)
+        self._exact = set()
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def add(self, texts):
+        """Boolean list: True where the text is new (and now indexed)"""
+        keep = [False] * len(texts)
+        fresh = []
+        for i, text in enumerate(texts):
+            digest = hashlib.blake2b(normalize(text).encode("utf-8"), digest_size=8).digest()
+            if digest in self._exact:
+                self.exact_duplicates += 1
+                continue
+            self._exact.add(digest)
+            fresh.append(i)
+        if not fresh:
+            return keep
+
+        signatures = self.hasher.signatures([texts[i] for i in fresh])
+        keys = band_keys(signatures, self.index.bands, self.index.rows)
+        for i, signature, key in zip(fresh, signatures, keys):
+            if self.index.query(signature, key):
+                self.near_duplicates += 1
+                continue
+            self.index.insert(signature, key)
+            keep[i] = True
+        return keep
+
+    def __len__(self):
+        return self.index.size
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1; a set's root is its smallest member"""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def labels(self):
+        return np.array([self.find(i) for i in range(len(self.parent))], dtype=np.int64)
+
+
+def cluster_signatures(signatures, threshold=0.8, max_pairs=1 << 16, all_pairs_bucket=8):
+    """
+    Near-duplicate clusters in roughly linear time.
+
+    For each LSH band, items are sorted by bucket key. Buckets of up to
+    `all_pairs_bucket` items have every pair verified. In larger buckets each
+    member is verified against the bucket's first (lowest-index) member and
+    the member just before it, so the work per band stays O(n log n) for the
+    sort plus O(n) signature comparisons, never all pairs of a large bucket.
+    Verified pairs are merged with union-find, so chains of near-duplicates
+    join one cluster.
+
+    Recall trade-off: in a large bucket, two members that match each other but
+    neither the head nor their neighbours are only joined through another band
+    they share (or a chain of verified pairs); raise all_pairs_bucket to trade
+    time for recall.
+
+    Args:
+        signatures: (n, num_perm) MinHash signatures
+        threshold: Estimated Jaccard similarity at which items are near-duplicates
+        max_pairs: Pairs compared per NumPy pass
+        all_pairs_bucket: Largest bucket whose pairs are all verified
+
+    Returns:
+        (n,) int64 labels: each item's cluster representative (its lowest index)
+    """
+    n, num_perm = signatures.shape
+    uf = UnionFind(n)
+    if n < 2:
+        return uf.labels()
+    bands, rows = lsh_params(threshold, num_perm)
+    keys = band_keys(signatures, bands, rows)
+    for band in range(bands):
+        order = np.argsort(keys[:, band], kind="stable")
+        sorted_keys = keys[order, band]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        firsts, seconds = [], []
+
+        # Small buckets: every pair
+        for size in range(2, all_pairs_bucket + 1):
+            bucket_starts = starts[sizes == size]
+            if len(bucket_starts):
+                i, j = np.triu_indices(size, 1)
+                firsts.append(order[(bucket_starts[:, None] + i).ravel()])
+                seconds.append(order[(bucket_starts[:, None] + j).ravel()])
+
+        # Large buckets: each member against the head and its predecessor
+        large = np.repeat(sizes > all_pairs_bucket, sizes)
+        heads = np.repeat(order[starts], sizes)
+        position = np.arange(n) - np.repeat(starts, sizes)
+        members = large & (position > 0)
+        firsts.append(heads[members])
+        seconds.append(order[members])
+        previous = large & (position > 1)
+        firsts.append(order[np.flatnonzero(previous) - 1])
+        seconds.append(order[previous])
+
+        a_all, b_all = np.concatenate(firsts), np.concatenate(seconds)
+        for start in range(0, len(a_all), max_pairs):
+            a, b = a_all[start:start + max_pairs], b_all[start:start + max_pairs]
+            similar = (signatures[a] == signatures[b]).mean(axis=1) >= threshold
+            for x, y in zip(a[similar].tolist(), b[similar].tolist()):
+                uf.union(x, y)
+    return uf.labels()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Multi-character distillation: generate teacher data for many characters at
+once, then train one student LoRA per character in parallel.
+
+    python src/multi_character.py                           # every character in config/characters.yaml
+    python src/multi_character.py Beethoven Newton -n 500   # a subset
+    python src/multi_character.py --concurrency 64 --max-parallel 8
+
+Generation runs all characters in one event loop against a single teacher
+sampling client; one semaphore bounds the requests in flight across all of
+them, so adding characters shares the budget instead of multiplying it. Each
+character's teacher data is deduplicated (04_dedup_teacher_data.py) and split
+into train/val under data/characters/<slug>/.
+Training launches 06_train_student_model.py --character <name> per character
+(each with its own LoRA training client), at most --max-parallel at a time,
+logging to data/characters/<slug>/train.log. Checkpoints are named
+<slug>_prompt_distillation_final.
+"""
+
+import os
+import sys
+import time
+import runpy
+import asyncio
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from character_registry import load_characters, get_character, character_paths, CHARACTER_DATA_ROOT
+from tinker_backend import create_service_client, using_fake_backend
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAIN_SCRIPT = os.path.join(SRC_DIR, "06_train_student_model.py")
+
+
+def load_stage(script):
+    """Globals of a numbered stage script (loaded without running its __main__ block)"""
+    return runpy.run_path(os.path.join(SRC_DIR, script))
+
+
+async def generate_all(characters, num_examples=100, concurrency=32, root=CHARACTER_DATA_ROOT,
+                       checkpoint_every=100):
+    """
+    Generate teacher data for every character concurrently
+
+    Args:
+        characters: List of Character
+        num_examples: Examples per character
+        concurrency: Max teacher requests in flight across all characters
+        root: Per-character data directory root
+        checkpoint_every: Save progress every N examples (per character)
+
+    Returns:
+        Dict character name -> summary from generate_teacher_data (None on failure or error)
+    """
+    stage = load_stage("03_generate_teacher_data.py")
+    generate_teacher_data, teacher_model = stage["generate_teacher_data"], stage["TEACHER_MODEL"]
+
+    if not using_fake_backend() and not os.environ.get("TINKER_API_KEY"):
+        raise ValueError("TINKER_API_KEY environment variable not set")
+    service_client = create_service_client()
+    sampling_client = service_client.create_sampling_client(base_model=teacher_model)
+    semaphore = asyncio.Semaphore(concurrency)
+    print(f"✓ Teacher sampling client for {teacher_model} shared by {len(characters)} characters "
+          f"({concurrency} requests in flight)")
+
+    async def generate(character):
+        paths = character_paths(character, root)
+        os.makedirs(paths["dir"], exist_ok=True)
+        return await generate_teacher_data(num_examples, paths["teacher"], checkpoint_every, character.name,
+                                           sampling_client=sampling_client, semaphore=semaphore)
+
+    results = await asyncio.gather(*(generate(c) for c in characters), return_exceptions=True)
+    summaries = {}
+    for character, result in zip(characters, results):
+        if isinstance(result, Exception) or result.get("error"):
+            error = result if isinstance(result, Exception) else result["error"]
+            print(f"✗ {character.name}: generation failed: {error}")
+            result = None
+        summaries[character.name] = result
+    return summaries
+
+
+def build_all(characters, root=CHARACTER_DATA_ROOT, val_fraction=0.1, seed=42):
+    """Per-character dedup (04_dedup_teacher_data.py) and train/val splits (05_prepare_training_data.py)"""
+    dedup_teacher_data = load_stage("04_dedup_teacher_data.py")["dedup_teacher_data"]
+    prepare_training_data = load_stage("05_prepare_training_data.py")["prepare_training_data"]
+    splits = {}
+    for character in characters:
+        paths = character_paths(character, root)
+        if not os.path.exists(paths["teacher"]) or not dedup_teacher_data(paths["teacher"], paths["dedup"],
+                                                                          paths["dedup_report"]):
+            splits[character.name] = None
+            continue
+        splits[character.name] = prepare_training_data(paths["dedup"], paths["train"], paths["val"],
+                                                       val_fraction, seed)
+    return splits
+
+
+def train_one(character, config_path="training_config.yaml", root=CHARACTER_DATA_ROOT):
+    """Train one character's student in a subprocess; returns (returncode, seconds, log file)"""
+    paths = character_paths(character, root)
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.time()
+    with open(paths["train_log"], 'w') as log:
+        returncode = subprocess.call([sys.executable, TRAIN_SCRIPT, "--config", config_path,
+                                      "--character", character.name,
+                                      "--train-file", paths["train"], "--val-file", paths["val"]],
+                                     stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, env=env)
+    return returncode, time.time() - start, paths["train_log"]
+
+
+def train_all(characters, config_path="training_config.yaml", max_parallel=4, root=CHARACTER_DATA_ROOT):
+    """
+    Train one LoRA per character, up to max_parallel at a time
+
+    Returns:
+        Dict character name -> (returncode, seconds, log file)
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        futures = {c.name: pool.submit(train_one, c, config_path, root) for c in characters}
+        for name, future in futures.items():
+            results[name] = future.result()
+            returncode, seconds, log_file = results[name]
+            status = "✓" if returncode == 0 else "✗"
+            print(f"{status} {name}: training {'finished' if returncode == 0 else 'failed'} "
+                  f"in {seconds:.1f}s ({log_file})")
+    return results
+
+
+def run(characters, num_examples=100, concurrency=32, max_parallel=4, config_path="training_config.yaml",
+        root=CHARACTER_DATA_ROOT, skip_train=False):
+    """Generate, split and train every character; returns per-character status"""
+    print("=" * 80)
+    print(f"MULTI-CHARACTER DISTILLATION: {', '.join(c.name for c in characters)}")
+    print("=" * 80)
+
+    start = time.time()
+    generated = asyncio.run(generate_all(characters, num_examples, concurrency, root))
+    generation_time = time.time() - start
+    ready = [c for c in characters if generated.get(c.name)]
+
+    splits = build_all(ready, root)
+    trainable = [c for c in ready if splits.get(c.name) and splits[c.name]["train"] > 0]
+
+    trained = {}
+    if trainable and not skip_train:
+        print(f"\nTraining {len(trainable)} students ({max_parallel} in parallel)...")
+        trained = train_all(trainable, config_path, max_parallel, root)
+
+    print("\n" + "=" * 80)
+    print("SUMMARY")
+    print("=" * 80)
+    print(f"✓ Teacher generation: {generation_time:.1f}s for {len(characters)} characters")
+    status = {}
+    for character in characters:
+        summary = generated.get(character.name)
+        split = splits.get(character.name)
+        if summary is None:
+            status[character.name] = "generation failed"
+        elif not split or split["train"] == 0:
+            status[character.name] = "no training data"
+        elif skip_train:
+            status[character.name] = "data ready"
+        elif trained[character.name][0] == 0:
+            status[character.name] = f"trained -> {character.checkpoint_prefix}_final"
+        else:
+            status[character.name] = f"training failed ({trained[character.name][2]})"
+        total = summary["total"] if summary else 0
+        print(f"  {character.name:<16} {total:>6} examples  {status[character.name]}")
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and train students for many characters in parallel")
+    parser.add_argument("characters", nargs="*", help="Characters from config/characters.yaml (default: all)")
+    parser.add_argument("-n", "--num-examples", type=int, default=100, help="Teacher examples per character")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="Teacher requests in flight, shared by all characters")
+    parser.add_argument("--max-parallel", type=int, default=4, help="Training runs at once")
+    parser.add_argument("--config", default="training_config.yaml", help="Training config (YAML)")
+    parser.add_argument("--root", default=CHARACTER_DATA_ROOT, help="Per-character data directory")
+    parser.add_argument("--skip-train", action="store_true", help="Only generate teacher data and splits")
+    args = parser.parse_args()
+
+    selected = [get_character(name) for name in args.characters] or list(load_characters().values())
+    status = run(selected, args.num_examples, args.concurrency, args.max_parallel, args.config, args.root,
+                 args.skip_train)
+    sys.exit(0 if all(s.startswith(("trained", "data ready")) for s in status.values()) else 1)
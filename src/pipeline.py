@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Incremental DAG runner for the pipeline stages.
+
+    explore -> validate -> gen -> dedup -> build -> train -> eval -> metrics
+                                                      \\-> export
+
+Each stage is fingerprinted from:
+- its arguments and the Tinker backend
+- the content of its input files
+- its code: the stage script plus the local modules it imports (transitively)
+- what it depends on: the output file hashes of upstream stages, or their run
+  ID for stages whose result lives remotely (a training checkpoint). Upstream
+  stages with neither (explore, validate: checks that only print) order the
+  DAG but don't feed the fingerprint, so re-running them doesn't invalidate
+  generation and everything after it
+
+A stage whose fingerprint matches its last successful run (and whose outputs
+still exist) is skipped, so editing 07_evaluate_models.py re-runs eval and
+metrics but not generation or training. Stages whose dependencies are satisfied
+run in parallel (export alongside eval / metrics). State and per-stage logs live
+in .pipeline/.
+
+If a stage previously succeeded with a different fingerprint (or is forced), its
+declared outputs are removed before it re-runs, so resumable scripts (03, 07)
+don't append to stale results. Outputs of a crashed run are kept so they can
+resume.
+
+    python src/pipeline.py                  # run everything that is out of date
+    python src/pipeline.py --dry-run        # show what would run
+    python src/pipeline.py --until train    # train and its dependencies only
+    python src/pipeline.py --force eval     # re-run eval even if unchanged
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import subprocess
+from dataclasses import dataclass, field
+from typing import List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tinker_backend import backend_name
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SRC_DIR)
+STATE_DIR = ".pipeline"
+CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    args: List[str] = field(default_factory=list)
+    deps: List[str] = field(default_factory=list)
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    remote: bool = False  # result lives outside the working directory (dependents key on its run ID)
+
+
+def build_stages(num_examples=5000, checkpoint="beethoven_prompt_distillation_final_checkpoint",
+                 training_config=None, cost_model=None, num_eval=100):
+    """The pipeline DAG (paths are relative to the working directory, like the scripts)"""
+    training_config = training_config or os.path.join(REPO_DIR, "config", "training_config.yaml")
+    cost_model = cost_model or os.path.join(REPO_DIR, "config", "cost_model.yaml")
+    return [
+        Stage("explore", "01_explore_dataset.py"),
+        Stage("validate", "02_validate_character_data.py", deps=["explore"]),
+        Stage("gen", "03_generate_teacher_data.py", [str(num_examples)], deps=["validate"],
+              outputs=["teacher_data_test.jsonl"]),
+        Stage("dedup", "04_dedup_teacher_data.py", ["teacher_data_test.jsonl"], deps=["gen"],
+              inputs=["teacher_data_test.jsonl"], outputs=["teacher_data_dedup.jsonl", "dedup_report.json"]),
+        Stage("build", "05_prepare_training_data.py", ["teacher_data_dedup.jsonl"], deps=["dedup"],
+              inputs=["teacher_data_dedup.jsonl"], outputs=["train.jsonl", "val.jsonl"]),
+        Stage("train", "06_train_student_model.py", ["--config", training_config], deps=["build"],
+              inputs=["train.jsonl", "val.jsonl", training_config], remote=True),
+        Stage("eval", "07_evaluate_models.py", [checkpoint, "--num-samples", str(num_eval)],
+              deps=["train", "build", "gen"], inputs=["val.jsonl", "teacher_data_test.jsonl"],
+              outputs=["evaluation_results.jsonl"]),
+        Stage("metrics", "08_calculate_metrics.py", ["evaluation_results.jsonl", "--cost-model", cost_model],
+              deps=["eval"], inputs=["evaluation_results.jsonl", cost_model], outputs=["metrics_report.json"]),
+        Stage("export", "11_export_model.py", [checkpoint], deps=["train"], outputs=["model-checkpoint.tar.gz"]),
+    ]
+
+
+class FileHasher:
+    """SHA-256 of files, cached by (size, mtime) in the pipeline state so unchanged files aren't re-read"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def digest(self, path):
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        cached = self.cache.get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        self.cache[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256.hexdigest()}
+        return self.cache[key]["sha256"]
+
+
+def code_files(script):
+    """A stage script plus the src/ modules it imports, transitively"""
+    seen = []
+    queue = [os.path.join(SRC_DIR, script)]
+    while queue:
+        path = queue.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.append(path)
+        with open(path, 'r') as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            names = []
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            for name in names:
+                module = os.path.join(SRC_DIR, name.split(".")[0] + ".py")
+                if os.path.exists(module):
+                    queue.append(module)
+    return sorted(seen)
+
+
+def load_state(state_dir=STATE_DIR):
+    path = os.path.join(state_dir, "state.json")
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_state(state, state_dir=STATE_DIR):
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, "state.json")
+    with open(path + ".tmp", 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def feeds_fingerprint(stage):
+    """Whether dependents' fingerprints see this stage's result (False: ordering only)"""
+    return bool(stage.outputs) or stage.remote
+
+
+def upstream_marker(stage, record, hasher):
+    """What downstream fingerprints see of a finished stage"""
+    if stage.outputs:
+        return {path: hasher.digest(path) for path in stage.outputs}
+    if stage.remote:
+        return record.get("run_id")
+    return None  # ordering-only dependency
+
+
+def fingerprint(stage, stages, state, hasher):
+    """Hash of everything a stage's result depends on"""
+    deps = {}
+    for dep in stage.deps:
+        marker = upstream_marker(stages[dep], state["stages"].get(dep, {}), hasher)
+        if marker is not None:
+            deps[dep] = marker
+    parts = {
+        "args": stage.args,
+        "backend": backend_name(),
+        "inputs": {path: hasher.digest(path) for path in stage.inputs},
+        "code": {os.path.relpath(path, SRC_DIR): hasher.digest(path) for path in code_files(stage.script)},
+        "deps": deps,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def up_to_date(stage, fp, state):
+    record = state["stages"].get(stage.name)
+    return bool(record and record.get("fingerprint") == fp and all(os.path.exists(p) for p in stage.outputs))
+
+
+def with_dependencies(stages, targets):
+    selected = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(stages[name].deps)
+    return selected
+
+
+def run_stage(stage, state_dir=STATE_DIR):
+    """Run one stage script in a subprocess, logging to .pipeline/logs/<stage>.log"""
+    log_dir = os.path.join(state_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, f"{stage.name}.log")
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    start = time.time()
+    with open(log_file, 'w') as log:
+        returncode = subprocess.call([sys.executable, os.path.join(SRC_DIR, stage.script), *stage.args],
+                                     stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, env=env)
+    return returncode, time.time() - start, log_file
+
+
+def tail(path, lines=15):
+    with open(path, 'r', errors="replace") as f:
+        return "".join(f.readlines()[-lines:])
+
+
+def run_pipeline(stages, targets=None, force=(), jobs=4, dry_run=False, state_dir=STATE_DIR):
+    """
+    Run out-of-date stages in dependency order, independent stages in parallel.
+
+    Args:
+        stages: List of Stage
+        targets: Stage names to bring up to date (with their dependencies); default all
+        force: Stage names to re-run even if up to date
+        jobs: Max stages running at once
+        dry_run: Only report what would run
+        state_dir: Pipeline state / log directory
+
+    Returns:
+        Dict stage name -> "skipped" | "ran" | "failed" | "blocked" | "would run"
+    """
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [name for name in list(targets or []) + list(force) if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stages: {unknown} (available: {list(by_name)})")
+    selected = with_dependencies(by_name, targets) if targets else set(by_name)
+    order = [stage.name for stage in stages if stage.name in selected]
+
+    state = load_state(state_dir)
+    hasher = FileHasher(state.setdefault("files", {}))
+    status = {}
+    running = {}
+
+    def ready(name):
+        return all(status.get(dep) in ("skipped", "ran", "would run") for dep in by_name[name].deps
+                   if dep in selected)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while len(status) < len(order):
+            for name in order:
+                if name in status or name in running:
+                    continue
+                stage = by_name[name]
+                if any(status.get(dep) in ("failed", "blocked") for dep in stage.deps):
+                    status[name] = "blocked"
+                    print(f"⊘ {name}: blocked by a failed dependency")
+                    continue
+                # A dependency that would re-run changes this stage's fingerprint, unless it is ordering-only
+                if any(status.get(dep) == "would run" and feeds_fingerprint(by_name[dep]) for dep in stage.deps):
+                    status[name] = "would run"
+                    print(f"· {name}: would run (upstream changes)")
+                    continue
+                if not ready(name):
+                    continue
+                fp = fingerprint(stage, by_name, state, hasher)
+                if name not in force and up_to_date(stage, fp, state):
+                    status[name] = "skipped"
+                    print(f"↷ {name}: up to date")
+                    continue
+                if dry_run:
+                    status[name] = "would run"
+                    print(f"· {name}: would run ({stage.script} {' '.join(stage.args)})".rstrip())
+                    continue
+
+                previous = state["stages"].get(name)
+                if name in force or (previous and previous.get("fingerprint") != fp):
+                    for path in stage.outputs:
+                        if os.path.exists(path):
+                            os.remove(path)
+                print(f"▶ {name}: {stage.script} {' '.join(stage.args)}".rstrip())
+                running[name] = (pool.submit(run_stage, stage, state_dir), fp)
+
+            if not running:
+                continue
+            finished, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name in [n for n, (future, _) in running.items() if future in finished]:
+                future, fp = running.pop(name)
+                returncode, seconds, log_file = future.result()
+                if returncode == 0:
+                    status[name] = "ran"
+                    state["stages"][name] = {"fingerprint": fp, "run_id": uuid.uuid4().hex,
+                                             "finished_at": time.time(), "seconds": round(seconds, 2)}
+                    print(f"✓ {name}: {seconds:.1f}s (log: {log_file})")
+                else:
+                    status[name] = "failed"
+                    print(f"✗ {name}: exit {returncode} after {seconds:.1f}s (log: {log_file})\n{tail(log_file)}")
+                save_state(state, state_dir)
+
+    if not dry_run:
+        save_state(state, state_dir)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run out-of-date pipeline stages (incremental, parallel)")
+    parser.add_argument("targets", nargs="*", help="Stages to bring up to date (default: all)")
+    parser.add_argument("--until", default=None, help="Same as giving a single target")
+    parser.add_argument("--force", action="append", default=[], help="Re-run this stage even if up to date")
+    parser.add_argument("--jobs", type=int, default=4, help="Max stages running at once")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would run")
+    parser.add_argument("--num-examples", type=int, default=5000, help="Teacher examples to generate")
+    parser.add_argument("--num-eval", type=int, default=100, help="Validation questions to evaluate")
+    parser.add_argument("--checkpoint", default="beethoven_prompt_distillation_final_checkpoint")
+    parser.add_argument("--training-config", default=None)
+    parser.add_argument("--state-dir", default=STATE_DIR)
+    args = parser.parse_args()
+
+    stages = build_stages(args.num_examples, args.checkpoint, args.training_config, num_eval=args.num_eval)
+    targets = args.targets + ([args.until] if args.until else [])
+    result = run_pipeline(stages, targets or None, set(args.force), args.jobs, args.dry_run, args.state_dir)
+    sys.exit(1 if any(s in ("failed", "blocked") for s in result.values()) else 0)
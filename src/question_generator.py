@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Lazy, deduplicated question generation from a character's template bank.
+
+A template may use several slots, e.g. "How did {person} react to the
+{composition}?", and its questions are every combination of the slot values.
+Templates and slot values can be weighted in config/characters.yaml:
+
+    templates:
+      - "What do you think about {person}'s music?"
+      - {template: "How did {person} react to the {composition}?", weight: 2}
+    slots:
+      composition: {"Ninth Symphony": 3, "Fidelio": 1}
+      person: ["Joseph Haydn", "Goethe"]          # equal weights
+
+QuestionGenerator.generate() draws a template with probability proportional to
+weight x number of combinations, so by default every combination is equally
+likely. It then draws each slot value by its weight. Questions are drawn in
+batches and skipped when they are an exact repeat or a near-duplicate
+(MinHash/LSH, see minhash.py) of any question already produced. Only hashes
+and signatures are kept, never the questions. Generation stops after
+`max_rejects` consecutive skips, i.e. once the space is effectively exhausted.
+
+QuestionGenerator.enumerate() walks the whole combinatorial space in template
+order without materializing it (no sampling, no dedup).
+
+    python src/question_generator.py Beethoven -n 20
+    python src/question_generator.py Newton --stats
+"""
+
+import math
+import random
+import argparse
+import itertools
+from character_registry import get_character, template_slots
+from minhash import NearDuplicateFilter
+
+
+class QuestionGenerator:
+    """
+    Args:
+        character: Character (or its name) from config/characters.yaml
+        seed: Sampling seed (same seed, same question stream)
+        threshold: Estimated Jaccard similarity at which two questions are near-duplicates
+        num_perm: MinHash signature length
+        shingle_size: Words per shingle
+        batch_size: Questions drawn and signed per NumPy pass
+        max_rejects: Consecutive duplicates after which the space counts as exhausted
+    """
+
+    def __init__(self, character, seed=42, threshold=0.8, num_perm=128, shingle_size=3, batch_size=256,
+                 max_rejects=2000):
+        self.character = get_character(character) if isinstance(character, str) else character
+        self.seed = seed
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.batch_size = batch_size
+        self.max_rejects = max_rejects
+
+        self._templates = []
+        for template, weight in zip(self.character.templates, self.character.template_weights):
+            names = template_slots(template)
+            size = math.prod(len(self.character.slots[name]) for name in names)
+            if size and weight > 0:
+                self._templates.append((template, names, weight * size))
+        if not self._templates:
+            raise ValueError(f"{self.character.name}: no templates with slot values to expand")
+        self._cum_template_weights = list(itertools.accumulate(w for _, _, w in self._templates))
+        self._cum_slot_weights = {slot: list(itertools.accumulate(weights))
+                                  for slot, weights in self.character.slot_weights.items()}
+        self.stats = {"drawn": 0, "emitted": 0, "exact_duplicates": 0, "near_duplicates": 0}
+
+    def space_size(self):
+        """Number of template/slot combinations (an upper bound on distinct questions)"""
+        return sum(math.prod(len(self.character.slots[name]) for name in names)
+                   for template, names, _ in self._templates)
+
+    def enumerate(self):
+        """Every combination in template order, lazily"""
+        for template, names, _ in self._templates:
+            for values in itertools.product(*(self.character.slots[name] for name in names)):
+                yield template.format(**dict(zip(names, values)))
+
+    def _draw(self, rng):
+        template, names, _ = rng.choices(self._templates, cum_weights=self._cum_template_weights)[0]
+        values = {name: rng.choices(self.character.slots[name], cum_weights=self._cum_slot_weights[name])[0]
+                  for name in names}
+        return template.format(**values)
+
+    def generate(self, n=None, exclude=()):
+        """
+        Yield up to n distinct questions (unbounded if n is None)
+
+        Args:
+            n: Number of questions
+            exclude: Questions already used (e.g. when resuming); they and their
+                near-duplicates are not produced again
+        """
+        rng = random.Random(self.seed)
+        seen = NearDuplicateFilter(self.threshold, self.num_perm, self.shingle_size)
+        exclude = list(exclude)
+        for start in range(0, len(exclude), self.batch_size):
+            seen.add(exclude[start:start + self.batch_size])
+
+        emitted, rejects = 0, 0
+        while n is None or emitted < n:
+            batch = [self._draw(rng) for _ in range(self.batch_size)]
+            self.stats["drawn"] += len(batch)
+            for question, is_new in zip(batch, seen.add(batch)):
+                if not is_new:
+                    rejects += 1
+                    if rejects >= self.max_rejects:
+                        self._count(seen, emitted)
+                        return
+                    continue
+                rejects = 0
+                emitted += 1
+                yield question
+                if n is not None and emitted >= n:
+                    break
+            self._count(seen, emitted)
+
+    def _count(self, seen, emitted):
+        self.stats.update(emitted=emitted, exact_duplicates=seen.exact_duplicates,
+                          near_duplicates=seen.near_duplicates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate distinct questions from a character's template bank")
+    parser.add_argument("character", nargs="?", default="Beethoven")
+    parser.add_argument("-n", "--num-questions", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threshold", type=float, default=0.8, help="Near-duplicate Jaccard threshold")
+    parser.add_argument("--stats", action="store_true", help="Only report space size and distinct yield")
+    args = parser.parse_args()
+
+    generator = QuestionGenerator(args.character, seed=args.seed, threshold=args.threshold)
+    if args.stats:
+        count = sum(1 for _ in generator.generate())
+        print(f"✓ {generator.character.name}: {len(generator.character.templates)} templates, "
+              f"{generator.space_size()} combinations, {count} distinct questions")
+        print(f"  drawn {generator.stats['drawn']}, exact repeats {generator.stats['exact_duplicates']}, "
+              f"near-duplicates {generator.stats['near_duplicates']}")
+    else:
+        for question in generator.generate(args.num_questions):
+            print(question)
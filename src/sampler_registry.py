@@ -0,0 +1,145 @@
+"""
+Local registry of saved sampler weights.
+
+Getting a sampling client for a training checkpoint normally means creating a
+LoRA training client, load_state(), and save_weights_and_get_sampling_client(),
+which takes seconds to minutes and stores a new copy of the weights on every
+run. The registry records the model path of weights already saved for a
+checkpoint, so later runs create the sampling client straight from that path.
+
+Entries are keyed by backend, base model, LoRA rank and checkpoint name, and
+stored as JSON (sampler_registry.json in the working directory, or
+$TINKER_SAMPLER_REGISTRY). Updates are read-modify-write under a lock file
+(<registry>.lock, flock where available), so concurrent writers - router worker
+threads, parallel training processes - don't lose each other's entries. Use
+refresh=True (--refresh in the scripts) to force a new save, e.g. after
+retraining under the same checkpoint name.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from tinker_backend import backend_name
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; the thread lock still covers one process
+    fcntl = None
+
+DEFAULT_REGISTRY = "sampler_registry.json"
+STUDENT_BASE_MODEL = "Qwen/Qwen3-4B-Instruct-2507"
+
+_THREAD_LOCK = threading.Lock()
+
+
+def registry_path():
+    return os.environ.get("TINKER_SAMPLER_REGISTRY", DEFAULT_REGISTRY)
+
+
+def registry_key(checkpoint_name, base_model=STUDENT_BASE_MODEL, rank=32):
+    return f"{backend_name()}|{base_model}|{rank}|{checkpoint_name}"
+
+
+def load_registry(path=None):
+    path = path or registry_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            print(f"Warning: ignoring unreadable sampler registry {path}")
+            return {}
+
+
+@contextmanager
+def _locked(path):
+    """Exclusive access to the registry file across threads and processes"""
+    with _THREAD_LOCK, open(path + ".lock", 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_registry(registry, path):
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(registry, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def register_sampler(checkpoint_name, model_path, sampler_name=None, base_model=STUDENT_BASE_MODEL,
+                     rank=32, path=None):
+    """Record the saved sampler weights for a checkpoint"""
+    if not model_path:
+        return
+    path = path or registry_path()
+    with _locked(path):
+        registry = load_registry(path)
+        registry[registry_key(checkpoint_name, base_model, rank)] = {
+            "checkpoint": checkpoint_name,
+            "base_model": base_model,
+            "rank": rank,
+            "model_path": model_path,
+            "sampler_name": sampler_name,
+            "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        _write_registry(registry, path)
+
+
+def forget_sampler(checkpoint_name, base_model=STUDENT_BASE_MODEL, rank=32, path=None):
+    """Drop a checkpoint's entry (its saved weights no longer match the checkpoint)"""
+    path = path or registry_path()
+    with _locked(path):
+        registry = load_registry(path)
+        if registry.pop(registry_key(checkpoint_name, base_model, rank), None) is not None:
+            _write_registry(registry, path)
+
+
+def get_sampling_client(service_client, checkpoint_name, base_model=STUDENT_BASE_MODEL, rank=32,
+                        refresh=False, path=None):
+    """
+    Sampling client for a training checkpoint, reusing saved weights when registered.
+
+    Args:
+        service_client: Tinker (or fake) ServiceClient
+        checkpoint_name: Training state saved with save_state()
+        base_model: Base model of the LoRA checkpoint
+        rank: LoRA rank
+        refresh: Ignore the registry and save the weights again
+        path: Registry file (default: sampler_registry.json or $TINKER_SAMPLER_REGISTRY)
+
+    Returns:
+        (sampling client, model path)
+    """
+    entry = None if refresh else load_registry(path).get(registry_key(checkpoint_name, base_model, rank))
+    if entry:
+        try:
+            sampling_client = service_client.create_sampling_client(model_path=entry["model_path"])
+            print(f"✓ Reusing saved sampler weights {entry['model_path']}")
+            return sampling_client, entry["model_path"]
+        except Exception as e:
+            print(f"Warning: saved sampler {entry['model_path']} unavailable ({e}); saving weights again")
+
+    start = time.time()
+    training_client = service_client.create_lora_training_client(base_model=base_model, rank=rank)
+    training_client.load_state(name=checkpoint_name)
+    sampler_name = f"{checkpoint_name}_sampler"
+    sampling_client = training_client.save_weights_and_get_sampling_client(name=sampler_name)
+    model_path = getattr(sampling_client, "model_path", None)
+    register_sampler(checkpoint_name, model_path, sampler_name, base_model, rank, path)
+    print(f"✓ Saved sampler weights for {checkpoint_name} in {time.time() - start:.1f}s")
+    return sampling_client, model_path
@@ -0,0 +1,189 @@
+"""
+Small statistics helpers shared by evaluation and metrics scripts.
+
+Only the standard library and NumPy are used (no SciPy dependency).
+"""
+
+import math
+import numpy as np
+
+# Two-sided 95% Student-t critical values for df = 1..30
+_T_95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+_Z = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+
+def t_critical(df, confidence=0.95):
+    """Two-sided critical value; exact t for 95% and df <= 30, normal approximation otherwise"""
+    if confidence == 0.95 and 1 <= df <= len(_T_95):
+        return _T_95[df - 1]
+    return _Z.get(confidence, 1.960)
+
+
+def mean_ci(values, confidence=0.95):
+    """
+    Mean and confidence interval of a sample.
+
+    Returns:
+        Dict with mean, std, n, ci_low, ci_high and half_width (0 for n < 2)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return {"mean": float("nan"), "std": float("nan"), "n": 0,
+                "ci_low": float("nan"), "ci_high": float("nan"), "half_width": float("nan")}
+
+    mean = float(values.mean())
+    std = float(values.std(ddof=1)) if n > 1 else 0.0
+    half_width = t_critical(n - 1, confidence) * std / math.sqrt(n) if n > 1 else 0.0
+    return {"mean": mean, "std": std, "n": n,
+            "ci_low": mean - half_width, "ci_high": mean + half_width, "half_width": half_width}
+
+
+def samples_needed(std, half_width, confidence=0.95):
+    """Sample size for a confidence interval of +/- half_width given a standard deviation"""
+    if half_width <= 0:
+        raise ValueError("half_width must be positive")
+    if not np.isfinite(std) or std == 0:
+        return 1
+    z = _Z.get(confidence, 1.960)
+    return max(1, math.ceil((z * std / half_width) ** 2))
+
+
+class RunningStats:
+    """Single-pass mean / variance / min / max (Welford), constant memory"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.total = 0.0
+
+    def add(self, value):
+        value = float(value)
+        self.n += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def ci(self, confidence=0.95):
+        """Same fields as mean_ci(), computed from the running moments"""
+        if self.n == 0:
+            return mean_ci([], confidence)
+        half_width = t_critical(self.n - 1, confidence) * self.std / math.sqrt(self.n) if self.n > 1 else 0.0
+        return {"mean": self.mean, "std": self.std, "n": self.n,
+                "ci_low": self.mean - half_width, "ci_high": self.mean + half_width, "half_width": half_width}
+
+
+class Histogram:
+    """
+    Fixed-bin histogram for streaming percentiles, constant memory.
+
+    Integer data (token counts) should use bin_width=1 for exact percentiles;
+    values outside [low, high) are clamped into the first / last bin.
+    """
+
+    def __init__(self, low, high, bin_width):
+        self.low = low
+        self.bin_width = bin_width
+        self.counts = np.zeros(int(math.ceil((high - low) / bin_width)), dtype=np.int64)
+        self.n = 0
+
+    def add(self, value):
+        index = int((value - self.low) // self.bin_width)
+        self.counts[min(max(index, 0), len(self.counts) - 1)] += 1
+        self.n += 1
+
+    def percentile(self, q):
+        """Lower edge of the bin containing the q-th percentile (0 <= q <= 100)"""
+        if self.n == 0:
+            return float("nan")
+        rank = max(1, math.ceil(q / 100 * self.n))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return self.low + index * self.bin_width
+
+    def summary(self, num_buckets=10):
+        """Coarse histogram for reports: list of [bucket_low, bucket_high, count]"""
+        nonzero = np.nonzero(self.counts)[0]
+        if len(nonzero) == 0:
+            return []
+        first, last = int(nonzero[0]), int(nonzero[-1]) + 1
+        step = max(1, math.ceil((last - first) / num_buckets))
+        return [
+            [self.low + i * self.bin_width, self.low + min(i + step, last) * self.bin_width,
+             int(self.counts[i:i + step].sum())]
+            for i in range(first, last, step)
+        ]
+
+
+class VarianceAccumulator:
+    """Streaming form of variance_report(): feed one question's sample scores at a time"""
+
+    def __init__(self):
+        self.question_means = RunningStats()
+        self._ss = 0.0
+        self._dof = 0
+
+    def add(self, scores):
+        if len(scores) == 0:
+            return
+        scores = np.asarray(scores, dtype=np.float64)
+        self.question_means.add(scores.mean())
+        if len(scores) > 1:
+            self._ss += float(((scores - scores.mean()) ** 2).sum())
+            self._dof += len(scores) - 1
+
+    def report(self, question_half_width=0.05, overall_half_width=0.01, confidence=0.95):
+        overall = self.question_means.ci(confidence)
+        within_std = math.sqrt(self._ss / self._dof) if self._dof > 0 else float("nan")
+        return {
+            "questions": overall["n"],
+            "mean": overall["mean"],
+            "ci_low": overall["ci_low"],
+            "ci_high": overall["ci_high"],
+            "between_question_std": overall["std"],
+            "within_question_std": within_std,
+            "samples_per_question_needed": (
+                samples_needed(within_std, question_half_width, confidence) if self._dof > 0 else None
+            ),
+            "questions_needed": (
+                samples_needed(overall["std"], overall_half_width, confidence) if overall["n"] > 1 else None
+            ),
+            "confidence": confidence,
+            "question_half_width_target": question_half_width,
+            "overall_half_width_target": overall_half_width,
+        }
+
+
+def variance_report(per_question_scores, question_half_width=0.05, overall_half_width=0.01,
+                    confidence=0.95):
+    """
+    Summarize repeated-sample similarity scores.
+
+    Args:
+        per_question_scores: One list of scores per question (one score per sample)
+        question_half_width: Target CI half-width for a single question's mean
+        overall_half_width: Target CI half-width for the overall mean
+        confidence: Confidence level
+
+    Returns:
+        Dict with the overall mean/CI (across question means), the pooled
+        within-question std, and how many samples per question / questions
+        are needed to reach the target half-widths.
+    """
+    accumulator = VarianceAccumulator()
+    for scores in per_question_scores:
+        accumulator.add(scores)
+    return accumulator.report(question_half_width, overall_half_width, confidence)
@@ -0,0 +1,37 @@
+"""
+Lookup of stored teacher responses by question ID.
+
+Teacher responses produced by 03_generate_teacher_data.py are the most expensive
+artifact in the pipeline, so evaluation reuses them instead of re-sampling the
+teacher for questions that already have a response.
+"""
+
+import json
+import hashlib
+
+
+def question_id(question):
+    """Stable ID for a question (whitespace-normalized SHA-1 prefix)"""
+    normalized = " ".join(question.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def load_teacher_responses(teacher_file):
+    """
+    Index a teacher data JSONL file by question ID.
+
+    Questions can repeat in the generated data, so every stored response is kept.
+
+    Returns:
+        Dict mapping question ID -> list of teacher response strings
+    """
+    responses = {}
+    with open(teacher_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            qid = record.get('question_id') or question_id(record['question'])
+            responses.setdefault(qid, []).append(record['teacher_response'])
+    return responses
@@ -0,0 +1,103 @@
+"""
+Backend selection for Tinker clients.
+
+TINKER_BACKEND=fake swaps the real service for the in-process stand-in in
+fake_tinker.py (offline, deterministic, no API spend); anything else, or
+unset, uses tinker.ServiceClient. model_input(), sampling_params(), datum(),
+tensor_data() and adam_params() build request arguments for whichever backend
+is active, so the fake backend runs without the tinker package installed.
+"""
+
+import os
+
+
+def backend_name():
+    return os.environ.get("TINKER_BACKEND", "tinker").strip().lower()
+
+
+def using_fake_backend():
+    return backend_name() == "fake"
+
+
+def create_service_client():
+    """tinker.ServiceClient, or fake_tinker.FakeServiceClient when TINKER_BACKEND=fake"""
+    if using_fake_backend():
+        from fake_tinker import FakeServiceClient
+        return FakeServiceClient.from_env()
+
+    import tinker
+    return tinker.ServiceClient()
+
+
+class FakeModelInput(list):
+    """Prompt stand-in exposing to_ints(), so the fake backend works without tinker installed"""
+
+    def to_ints(self):
+        return list(self)
+
+
+class FakeSamplingParams:
+    def __init__(self, max_tokens, temperature):
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+
+def model_input(tokens):
+    """tinker.types.ModelInput from token IDs (a plain stand-in on the fake backend)"""
+    if using_fake_backend():
+        return FakeModelInput(tokens)
+
+    import tinker
+    return tinker.types.ModelInput.from_ints(list(tokens))
+
+
+def sampling_params(max_tokens, temperature=0.7):
+    """tinker.types.SamplingParams (a plain stand-in on the fake backend)"""
+    if using_fake_backend():
+        return FakeSamplingParams(max_tokens, temperature)
+
+    import tinker
+    return tinker.types.SamplingParams(max_tokens=max_tokens, temperature=temperature)
+
+
+class FakeDatum:
+    def __init__(self, model_input, loss_fn_inputs):
+        self.model_input = model_input
+        self.loss_fn_inputs = loss_fn_inputs
+
+
+class FakeAdamParams:
+    def __init__(self, learning_rate, beta1, beta2, eps):
+        self.learning_rate = learning_rate
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+
+
+def tensor_data(data, dtype):
+    """1-D tinker.types.TensorData (fake_tinker.FakeTensorData on the fake backend)"""
+    if using_fake_backend():
+        from fake_tinker import FakeTensorData
+        return FakeTensorData(list(data), dtype, [len(data)])
+
+    import tinker
+    return tinker.types.TensorData(data=data, dtype=dtype, shape=[len(data)])
+
+
+def datum(input_tokens, loss_fn_inputs):
+    """tinker.types.Datum: model input token IDs plus loss function inputs (TensorData by name)"""
+    if using_fake_backend():
+        return FakeDatum(FakeModelInput(input_tokens), loss_fn_inputs)
+
+    import tinker
+    return tinker.types.Datum(model_input=tinker.types.ModelInput.from_ints(list(input_tokens)),
+                              loss_fn_inputs=loss_fn_inputs)
+
+
+def adam_params(learning_rate, beta1=0.9, beta2=0.95, eps=1e-8):
+    """tinker.types.AdamParams (a plain stand-in on the fake backend)"""
+    if using_fake_backend():
+        return FakeAdamParams(learning_rate, beta1, beta2, eps)
+
+    import tinker
+    return tinker.types.AdamParams(learning_rate=learning_rate, beta1=beta1, beta2=beta2, eps=eps)
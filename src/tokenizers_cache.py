@@ -0,0 +1,61 @@
+"""
+Shared, offline-first tokenizer loading.
+
+Scripts used to call AutoTokenizer.from_pretrained directly, some of them trying
+the gated meta-llama repo first and only falling back to Qwen after the
+network round trip failed. Here:
+- the tokenizer repo for each model comes from a local mapping (gated repos
+  map straight to their stand-in, so nothing is probed)
+- the local HuggingFace cache is tried first (local_files_only=True); the
+  network is used only on a cache miss, and never when HF_HUB_OFFLINE is set
+- loaded tokenizers are memoized per process, and transformers itself is only
+  imported on first use
+A failed load raises instead of silently trying other repos.
+"""
+
+import os
+from functools import lru_cache
+
+DEFAULT_TOKENIZER = "Qwen/Qwen2.5-7B"
+
+# Model -> tokenizer repo. Gated models use the (compatible) Qwen tokenizer, as before.
+TOKENIZER_FOR_MODEL = {
+    "meta-llama/Llama-3.1-70B-Instruct": DEFAULT_TOKENIZER,
+    "meta-llama/Llama-3.1-8B-Instruct": DEFAULT_TOKENIZER,
+    "Qwen/Qwen3-30B-A3B": DEFAULT_TOKENIZER,
+    "Qwen/Qwen3-4B-Instruct-2507": "Qwen/Qwen3-4B-Instruct-2507",
+}
+
+
+def resolve_tokenizer_name(model=None):
+    """Tokenizer repo for a model name (the model's own repo when unmapped)"""
+    model = model or DEFAULT_TOKENIZER
+    return TOKENIZER_FOR_MODEL.get(model, model)
+
+
+def _offline():
+    return os.environ.get("HF_HUB_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(name):
+    """Load one tokenizer repo: local cache first, network only on a miss"""
+    from transformers import AutoTokenizer
+
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(name, local_files_only=True)
+    except OSError:
+        if _offline():
+            raise OSError(f"Tokenizer {name} is not in the local HuggingFace cache and HF_HUB_OFFLINE is set")
+        tokenizer = AutoTokenizer.from_pretrained(name)
+    return tokenizer
+
+
+def get_tokenizer(model=None):
+    """
+    Memoized tokenizer for a model.
+
+    Args:
+        model: Model or tokenizer repo name (default: Qwen/Qwen2.5-7B)
+    """
+    return load_tokenizer(resolve_tokenizer_name(model))